@@ -1,5 +1,5 @@
 from pydantic import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 from pathlib import Path
 from functools import lru_cache
 import json
@@ -21,26 +21,149 @@ class Settings(BaseSettings):
     RESULTS_DIR: Path = BASE_DIR / "results"
     TEMP_DIR: Path = BASE_DIR / "temp"
     LOG_FILE: Path = BASE_DIR / "logs" / "api.log"
+    # Nivel por defecto y por módulo, p. ej. LOG_MODULE_LEVELS='{"services.exam_detector": "DEBUG"}'
+    LOG_LEVEL: str = "INFO"
+    LOG_MODULE_LEVELS: Dict[str, str] = {}
+    # Escritura del log en un hilo aparte (no bloquea el event loop ni el pool)
+    LOG_ENQUEUE: bool = True
+    # Una línea JSON por mensaje en vez de texto
+    LOG_SERIALIZE: bool = False
+    # Fracción de documentos (0-1) que vuelcan su texto completo a nivel DEBUG
+    LOG_TEXT_SAMPLE_RATE: float = 0.0
     
     ALLOWED_ORIGINS: List[str] = ["http://localhost:3000"]
     MAX_FILE_SIZE: int = 10 * 1024 * 1024
+    # Documentos máximos por petición a /classify-exams/batch
+    BATCH_MAX_ITEMS: int = 1000
     PROCESS_TIMEOUT: int = 300
     
     RATE_LIMIT_PER_MINUTE: int = 100
     RATE_LIMIT_PER_IP: int = 1000
     RATE_LIMIT_WINDOW: int = 3600
     MAX_CONCURRENT_REQUESTS: int = 50
+    # "shared": contadores en memoria compartida (mmap) entre los workers del host
+    # "memory": contadores propios de cada worker
+    RATE_LIMIT_BACKEND: str = "shared"
+    # Por defecto TEMP_DIR/rate_limit.shm (ver `rate_limit_shm_path`)
+    RATE_LIMIT_SHM_PATH: Optional[Path] = None
+    RATE_LIMIT_SHM_SLOTS: int = 4096
     
+    # Tope para el RSS propio del worker más la memoria reservada por las
+    # solicitudes en curso (el RSS de los procesos del pool no cuenta)
     MAX_MEMORY_USAGE: int = 1024 * 1024 * 1024
+    # Costo estimado por solicitud para la admisión: base + bytes del cuerpo * factor
+    # (copias del PDF en el worker, en el pool y estructuras de PyPDF2)
+    MEMORY_COST_BASE: int = 8 * 1024 * 1024
+    MEMORY_COST_PER_BYTE: float = 6.0
+    # Segundos entre muestras de RSS, CPU y retraso del event loop
+    RESOURCE_SAMPLE_INTERVAL: float = 1.0
     CLEANUP_INTERVAL: int = 300
     
+    # Pipeline PDF -> texto -> detección -> extracción en procesos aparte
+    # 0 = automático (CPUs disponibles repartidas entre SERVER_WORKERS)
+    PIPELINE_WORKERS: int = 0
+    # Segundos que una petición espera un cupo antes de responder 503
+    PIPELINE_QUEUE_TIMEOUT: int = 30
+    # PDFs sobre este tamaño (bytes) se vuelcan a TEMP_DIR en vez de enviarse
+    # en memoria al pool; 0 = siempre en memoria
+    PDF_SPILL_THRESHOLD: int = 0
+    # PDFs con más páginas que PDF_SHARD_THRESHOLD (0 = nunca) extraen su texto
+    # en paralelo, por tramos de PDF_SHARD_PAGES páginas en procesos del pool
+    PDF_SHARD_THRESHOLD: int = 40
+    PDF_SHARD_PAGES: int = 16
+    # Un documento sin indicadores médicos tras MEDICAL_CHECK_PAGES páginas con
+    # texto se descarta sin leer el resto (0 = se verifica el documento completo)
+    MEDICAL_CHECK_PAGES: int = 2
+    # Verificación previa de los bytes (cabecera, fin de archivo y
+    # páginas declaradas) antes de abrir el PDF; 0 = sin límite de páginas
+    PDF_MAX_PAGES: int = 1000
+
+    # OCR de las páginas sin capa de texto (PDFs escaneados), una tarea por página
+    # en el pool. OCR_ENGINE: "tesseract" (pytesseract + Wand) o "" = desactivado
+    OCR_ENGINE: str = "tesseract"
+    OCR_LANGUAGE: str = "spa"
+    # Resolución del renderizado de cada página
+    OCR_DPI: int = 300
+    # Imágenes y textos por huella de página en RESULTS_DIR/ocr
+    OCR_CACHE: bool = True
+
+    # Artefacto JSON con los patrones de exam_types ya derivados (textos de los
+    # autómatas, aliases, unidades), versionado por hash de contenido: se genera
+    # al desplegar con `python -m utils.pattern_artifact`; si falta o está
+    # desactualizado, cada worker compila al iniciar y, solo con
+    # PATTERN_ARTIFACT_WRITE, lo guarda. Por defecto en RESULTS_DIR/patterns
+    PATTERN_ARTIFACT: Optional[Path] = None
+    PATTERN_ARTIFACT_WRITE: bool = False
+
+    # Texto del documento en las respuestas: "full", "once", "section" o "none"
+    # (ver models.schemas.TEXT_MODES); se puede cambiar por solicitud con ?text_mode=
+    RESPONSE_TEXT_MODE: str = "full"
+    
+    # Caché de respuestas por hash del PDF + versión de patrones
+    # RESULT_CACHE_SIZE = entradas en memoria por worker (0 = sin nivel en memoria)
+    # RESULT_CACHE_BYTES = tamaño aproximado máximo de esas entradas (0 = sin límite)
+    RESULT_CACHE_SIZE: int = 256
+    RESULT_CACHE_BYTES: int = 64 * 1024 * 1024
+    # Guarda además cada respuesta en RESULTS_DIR/cache (compartido entre workers)
+    RESULT_CACHE_DISK: bool = False
+    
+    # Persistencia de resultados en RESULTS_DIR/records: segmentos JSONL de solo
+    # anexado más un índice SQLite por RUT, tipo de examen y fecha. Se escribe
+    # en segundo plano por lotes (un fsync por lote)
+    RESULT_WRITE_QUEUE_SIZE: int = 1000
+    RESULT_WRITE_BATCH: int = 64
+    RESULT_FSYNC: bool = True
+    # Bytes máximos por segmento antes de rotar
+    RESULT_SEGMENT_SIZE: int = 64 * 1024 * 1024
+    # Segundos entre compactaciones de los segmentos cerrados (0 = nunca)
+    RESULT_COMPACT_INTERVAL: int = 3600
+    
+    # Métricas Prometheus con varios workers (uvicorn --workers N): directorio
+    # compartido del modo multiproceso; debe vaciarse antes de cada arranque
+    PROMETHEUS_MULTIPROC_DIR: Optional[Path] = None
+    
+    # Perfilado por solicitud (cProfile del pipeline y tiempo por entrada de
+    # EXAM_PATTERNS/COMPONENT_ALIASES) guardado en RESULTS_DIR/profiles.
+    # Se activa con la cabecera PROFILE_HEADER ("" = no se acepta), por muestreo
+    # (PROFILE_SAMPLE_RATE, 0-1) o, tras responder, reprocesando las solicitudes
+    # que tardan más de PROFILE_SLOW_THRESHOLD segundos (0 = desactivado)
+    PROFILE_HEADER: str = "X-Profile"
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_SLOW_THRESHOLD: float = 0.0
+    
+    # Trabajos asíncronos (POST /jobs, GET /jobs/{id})
+    # JOB_STORE: "sqlite" (compartido entre workers) o "memory" (un solo worker)
+    JOB_STORE: str = "sqlite"
+    # Por defecto RESULTS_DIR/jobs.sqlite3 (ver `job_db_path`)
+    JOB_DB_PATH: Optional[Path] = None
+    JOB_QUEUE_SIZE: int = 100
+    JOB_WORKERS: int = 2
+    # Segundos que se conserva un trabajo terminado (0 = sin límite); la
+    # limpieza corre cada CLEANUP_INTERVAL segundos
+    JOB_RETENTION: int = 24 * 3600
+    
+    # Rutas derivadas de TEMP_DIR/RESULTS_DIR: se resuelven con los valores de
+    # esta instancia (variables de entorno incluidas), no con los de la clase
+
+    @property
+    def pattern_artifact_path(self) -> Path:
+        return self.PATTERN_ARTIFACT or self.RESULTS_DIR / "patterns" / "compiled_patterns.json"
+
+    @property
+    def rate_limit_shm_path(self) -> Path:
+        return self.RATE_LIMIT_SHM_PATH or self.TEMP_DIR / "rate_limit.shm"
+
+    @property
+    def job_db_path(self) -> Path:
+        return self.JOB_DB_PATH or self.RESULTS_DIR / "jobs.sqlite3"
+
     class Config:
         env_file = ".env"
         case_sensitive = True
 
         @classmethod
         def parse_env_var(cls, field_name: str, raw_val: str):
-            if field_name == "ALLOWED_ORIGINS":
+            if field_name in ("ALLOWED_ORIGINS", "LOG_MODULE_LEVELS"):
                 return json.loads(raw_val)
             return raw_val
 
@@ -2,7 +2,7 @@
 from .exam_patterns import EXAM_PATTERNS
 from .component_aliases import COMPONENT_ALIASES
 from .units_config import COMMON_UNITS
-from .result_patterns import RESULT_PATTERNS, REFERENCE_PATTERNS, TABLE_FORMATS, SKIP_PATTERNS, SECTION_BREAKS
+from .result_patterns import RESULT_PATTERNS, REFERENCE_PATTERNS, TABLE_FORMATS, TABLE_COLUMNS, SKIP_PATTERNS, SECTION_BREAKS
 from .methods_config import ANALYSIS_METHODS
 
 __all__ = [
@@ -12,6 +12,7 @@ __all__ = [
     'RESULT_PATTERNS',
     'REFERENCE_PATTERNS',
     'TABLE_FORMATS', 
+    'TABLE_COLUMNS',
     'SKIP_PATTERNS', 
     'SECTION_BREAKS',  
     'ANALYSIS_METHODS'
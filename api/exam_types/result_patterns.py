@@ -25,6 +25,15 @@ TABLE_FORMATS = {
     "mixed": r"[\t|,;]|\s{2,}"   
 }
 
+# Títulos de columna en la fila de encabezado de una tabla, por rol
+TABLE_COLUMNS = {
+    "componente": ["PARAMETRO", "PARÁMETRO", "EXAMEN", "ANALITO", "PRUEBA", "COMPONENTE", "DETERMINACION", "DETERMINACIÓN"],
+    "valor": ["RESULTADO", "VALOR"],
+    "unidad": ["UNIDAD", "UNIDADES", "UNID."],
+    "referencia": ["REFERENCIA", "VALORES DE REFERENCIA", "VALOR DE REFERENCIA", "RANGO", "VALORES NORMALES"],
+    "metodo": ["METODO", "MÉTODO", "TECNICA", "TÉCNICA"]
+}
+
 # Patrones para saltar líneas
 SKIP_PATTERNS = [
     "PARÁMETRO", "FECHA[: ]", "TECNOLOGÍA[: ]", "INFORME",
@@ -3,35 +3,37 @@ import os
 import json
 import tempfile
 import multiprocessing
-import psutil
 import time
-import base64
-import io
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Body, Depends, Request
+import asyncio
+import hashlib
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response, StreamingResponse
+from starlette.requests import ClientDisconnect
 import uvicorn
 from loguru import logger
-from typing import Optional, List, Set
+from pydantic import ValidationError
+from typing import Optional, List, Set, Union
 from pathlib import Path
 
 from config import get_settings
 settings = get_settings()
 
-from middleware.rate_limiter import MemoryRateLimiter
-from models.schemas import ExamResponse, PDFContent, SingleExam, ExamRequest
-from services.exam_detector import MedicalExamDetector
-from services.result_extractor import ResultExtractor
-from utils.text_extractors import extract_text_from_pdf, extract_patient_data
-from exam_types import (
-   EXAM_PATTERNS,
-   COMPONENT_ALIASES,
-   COMMON_UNITS,
-   ANALYSIS_METHODS
-)
+from middleware.rate_limiter import RateLimiter
+from models.schemas import ExamResponse, PDFContent, SingleExam, ExamRequest, TEXT_MODE_PATTERN
+from services.pipeline import ExamPipeline
+from services.result_cache import ResultCache
+from services.result_store import ResultStore, ResultWriter, normalize_date, normalize_rut
+from services.jobs import JobRunner, create_job_store
+from services.resource_monitor import ResourceMonitor
+from services.profile_store import ProfileStore
+from services import metrics
+from utils.pattern_artifact import get_patterns
+from utils.log_config import configure_logging, sample_text_dump
+from utils.pdf_upload import read_json_pdf_request, read_json_batch, read_pdf_upload, check_pdf_structure
 
-RESULTS_DIR = Path("results")
 TEMP_DIR = Path("temp")
 LOG_FILE = "api.log"
 
@@ -42,6 +44,14 @@ class TempFileManager:
    def add_file(self, filepath: str):
        self.temp_files.add(filepath)
 
+   async def remove(self, filepath: str):
+       try:
+           if os.path.exists(filepath):
+               os.unlink(filepath)
+           self.temp_files.discard(filepath)
+       except Exception as e:
+           logger.error(f"Error cleaning up {filepath}: {e}")
+
    async def cleanup(self):
        for filepath in self.temp_files.copy():
            try:
@@ -58,14 +68,7 @@ def setup_directories():
        directory.mkdir(parents=True, exist_ok=True)
 
 def setup_logging():
-   logger.remove()
-   logger.add(
-       settings.LOG_FILE,
-       format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-       level="DEBUG",
-       rotation="500 MB",
-       retention="30 days"
-   )
+   configure_logging(settings)
 
 app = FastAPI(
    title=settings.API_TITLE,
@@ -77,11 +80,22 @@ app = FastAPI(
 async def startup_event():
    setup_directories()
    setup_logging()
+   resource_monitor.start()
+   result_store.open()
+   result_writer.start()
+   exam_pipeline.start()
+   job_runner.start()
    logger.info("API initialized successfully")
 
 @app.on_event("shutdown")
 async def shutdown_event():
    await temp_manager.cleanup()
+   await job_runner.shutdown()
+   exam_pipeline.shutdown()
+   await result_cache.flush()
+   await result_writer.close()
+   await resource_monitor.stop()
+   metrics.mark_process_dead()
    logger.info("API shutdown complete")
 
 app.add_middleware(
@@ -94,16 +108,33 @@ app.add_middleware(
 app.add_middleware(GZipMiddleware, minimum_size=1000)
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["*"])
 
-medical_detector = MedicalExamDetector()
-result_extractor = ResultExtractor()
-rate_limiter = MemoryRateLimiter()
+patterns = get_patterns()
+resource_monitor = ResourceMonitor(settings)
+rate_limiter = RateLimiter(monitor=resource_monitor)
+exam_pipeline = ExamPipeline(settings)
+result_cache = ResultCache(settings)
+result_store = ResultStore(settings)
+result_writer = ResultWriter(settings, result_store)
+profile_store = ProfileStore(settings)
+
+async def rate_limited(request: Request):
+   """
+   Dependencia de los endpoints de procesamiento: aplica el limitador y libera
+   el cupo cuando termina la respuesta (incluidas las respuestas en streaming).
+   """
+   await rate_limiter.check_rate_limit(request)
+   try:
+       yield
+   finally:
+       await rate_limiter.release(request)
 
 @app.get("/")
 async def root():
    return {
        "status": "active",
        "message": "Medical Exam Processing API is running",
-       "version": "1.0.0"
+       "version": settings.API_VERSION,
+       "pattern_version": patterns.version
    }
 
 @app.get("/health")
@@ -112,7 +143,7 @@ async def health_check():
        "status": "healthy",
        "system": {
            "cpu_count": multiprocessing.cpu_count(),
-           "memory_available": psutil.virtual_memory().available,
+           "memory_available": resource_monitor.snapshot.available_memory,
            "temp_files": len(temp_manager.temp_files)
        }
    }
@@ -120,72 +151,56 @@ async def health_check():
 @app.get("/metrics")
 async def get_metrics():
    try:
+       # Solo lee la última muestra del monitor: sin llamadas a psutil por solicitud
+       snapshot = resource_monitor.snapshot
        return {
            "timestamp": time.time(),
            "system": {
-               "memory_usage": psutil.Process().memory_info().rss,
-               "cpu_usage": psutil.Process().cpu_percent(),
+               "memory_usage": snapshot.rss,
+               "memory_usage_children": snapshot.children_rss,
+               "cpu_usage": snapshot.cpu_percent,
+               "event_loop_lag_ms": round(snapshot.loop_lag * 1000, 2),
+               "sampled_at": snapshot.updated_at,
+               "reserved_memory": rate_limiter.reserved_memory,
                "temp_files": len(temp_manager.temp_files)
-           }
+           },
+           "result_cache": result_cache.stats(),
+           "result_writer": result_writer.stats()
        }
    except Exception as e:
        logger.error(f"Error obteniendo métricas: {e}")
        raise HTTPException(status_code=500, detail=str(e))
 
-def validate_pdf_file(file: UploadFile) -> bool:
-   try:
-       if not file.filename:
-           logger.error("No filename provided")
-           raise HTTPException(status_code=400, detail="No filename provided")
-           
-       if not file.filename.lower().endswith('.pdf'):
-           logger.error("File must be a PDF")
-           raise HTTPException(status_code=400, detail="El archivo debe ser un PDF")
-           
-       return True
-   except Exception as e:
-       logger.error(f"Error validating PDF: {str(e)}")
-       raise HTTPException(status_code=400, detail=f"Error validating PDF: {str(e)}")
-
-def find_unit_in_line(line: str) -> Optional[str]:
-   for units in COMMON_UNITS.values():
-       for unit in units:
-           if unit in line.upper():
-               return unit
-   return None
-
-def find_method_in_line(line: str) -> Optional[str]:
-   for methods in ANALYSIS_METHODS.values():
-       for method in methods:
-           if method in line.upper():
-               return method
-   return None
-
-def save_exam_response_to_file(response: ExamResponse, patient_data: dict, base_filename: str):
-   output_path = settings.RESULTS_DIR / f"{base_filename}_response.json"
-   with open(output_path, 'w', encoding='utf-8') as f:
-       json.dump({
-           "patient_data": patient_data,
-           "response": response.dict()
-       }, f, indent=2, ensure_ascii=False)
-   logger.info(f"Saved complete response to {output_path}")
-
-def save_exam_results_to_file(single_exam: SingleExam, patient_data: dict, base_filename: str):
-   output_path = RESULTS_DIR / f"{base_filename}_{single_exam.type}.json"
-   with open(output_path, 'w', encoding='utf-8') as f:
-       json.dump({
-           "patient_data": patient_data,
-           "exam": single_exam.dict()
-       }, f, indent=2, ensure_ascii=False)
-   logger.info(f"Saved results to {output_path}")
-
-async def process_exam_section(exam: dict, section_text: str, patient_data: dict, base_filename: str) -> Optional[SingleExam]:
+@app.get("/metrics/prometheus")
+async def get_prometheus_metrics():
+   """Exposición en formato Prometheus (agrega todos los workers en modo multiproceso)"""
+   content, content_type = metrics.exposition()
+   return Response(content=content, media_type=content_type)
+
+def build_result_record(pdf_content: Union[bytes, bytearray], base_filename: str, original: dict,
+                        text: str, patient_data: dict, exams: List[SingleExam]) -> dict:
+   """
+   Registro persistido de un documento: el texto una sola vez, los exámenes sin
+   raw_text. El id es el hash del PDF: reprocesarlo reemplaza el registro anterior.
+   """
+   saved_at = time.time()
+   return {
+       "id": hashlib.sha256(pdf_content).hexdigest(),
+       "name": base_filename,
+       "original": original,
+       # Normalizada a AAAA-MM-DD para los filtros por fecha (la original queda en "original")
+       "date": normalize_date(original.get("date"), saved_at),
+       "saved_at": saved_at,
+       "patient_data": patient_data,
+       "text": text,
+       "exams": [exam.dict(exclude={"raw_text"}) for exam in exams]
+   }
+
+async def process_exam_section(exam: dict, results: List[dict], section_text: str, patient_data: dict, base_filename: str) -> Optional[SingleExam]:
    try:
        exam_name = exam["name"]
-       logger.debug(f"Processing exam section: {exam_name}")
+       logger.debug("Processing exam section: {}", exam_name)
 
-       results = await result_extractor.extract_exam_data(section_text, exam)
-       
        if not results:
            logger.warning(f"No results found for exam {exam_name}")
            return None
@@ -204,8 +219,7 @@ async def process_exam_section(exam: dict, section_text: str, patient_data: dict
            raw_text=section_text
        )
 
-       save_exam_results_to_file(single_exam, patient_data, base_filename)
-       logger.debug(f"Processed exam {exam_name} with {len(results)} results")
+       logger.debug("Processed exam {} with {} results", exam_name, len(results))
        
        return single_exam
 
@@ -213,142 +227,543 @@ async def process_exam_section(exam: dict, section_text: str, patient_data: dict
        logger.error(f"Error processing exam section: {str(e)}", exc_info=True)
        return None
 
-def validate_pdf_content(pdf_data: PDFContent) -> bool:
-   try:
-       if not pdf_data.content:
-           logger.error("No PDF content provided")
-           raise HTTPException(status_code=400, detail="No PDF content provided")
-           
-       try:
-           base64.b64decode(pdf_data.content)
-       except Exception:
-           raise HTTPException(status_code=400, detail="Invalid base64 content")
-           
-       return True
-   except Exception as e:
-       logger.error(f"Error validating PDF content: {str(e)}")
-       raise HTTPException(status_code=400, detail=f"Error validating PDF content: {str(e)}")
+def apply_original_metadata(cached: dict, original: dict) -> dict:
+   """
+   Ajusta una respuesta cacheada a los datos originales (name/type/date) de la
+   petición actual. Copia solo lo que cambia; la entrada del caché no se modifica.
+   """
+   labels = {
+       "original_name": original.get("name"),
+       "original_type": original.get("type"),
+       "original_date": original.get("date")
+   }
+   response = dict(cached)
+   if not response["is_medical"]:
+       response["original_metadata"] = {**(response["original_metadata"] or {}), **labels}
+       return response
 
-@app.post("/classify-exam/")
-async def classify_exam(
-   request: Request,
+   metadata = dict(response["metadata"])
+   patient_data = dict(metadata["patient_data"])
+   patient_data["metadata"] = {**patient_data["metadata"], **labels}
+   metadata["patient_data"] = patient_data
+   response["metadata"] = metadata
+   response["original_metadata"] = {
+       "name": original.get("name"),
+       "type": original.get("type"),
+       "date": original.get("date")
+   }
+   return response
+
+async def capture_slow_profile(pdf_content: Union[bytes, bytearray], name: Optional[str], latency: float):
+   """Reprocesa con perfilado un PDF que superó PROFILE_SLOW_THRESHOLD (sin contarlo en métricas)"""
+   try:
+       result = await exam_pipeline.run(pdf_content, profile=True, record_metrics=False)
+   except HTTPException as e:
+       logger.warning(f"No se pudo perfilar {name}: {e.detail}")
+       return
+   if result and "profile" in result:
+       profile_store.save(profile_store.new_id(), result["profile"], name, "slow", latency)
+
+def apply_text_mode(response: ExamResponse, text_mode: str, sections: dict) -> ExamResponse:
+   """
+   Deja el texto del documento según `text_mode` (ver TEXT_MODES). La respuesta
+   se arma y se cachea en modo "full", donde todos los exámenes comparten el
+   mismo texto; `sections` trae el tramo [inicio, fin) de cada examen.
+   """
+   if text_mode == "full" or not response.exams:
+       return response
+   text = response.exams[0].raw_text
+   for exam in response.exams:
+       if text_mode == "section":
+           span = sections.get(exam.type)
+           exam.raw_text = text[span[0]:span[1]] if span and text else text
+       else:
+           exam.raw_text = None
+   if text_mode == "once":
+       response.raw_text = text
+   return response
+
+def with_profile_id(response: ExamResponse, profile_id: Optional[str]) -> ExamResponse:
+   # Se agrega después de guardar en caché: el id es de esta solicitud, no del PDF
+   if profile_id:
+       response.metadata["profile_id"] = profile_id
+   return response
+
+async def classify_pdf(
+   pdf_content: Union[bytes, bytearray],
+   original: dict,
    background_tasks: BackgroundTasks,
-   exam_request: ExamRequest = Body(...)
-):
-   await rate_limiter.check_rate_limit(request)
+   profile: bool = False,
+   text_mode: Optional[str] = None
+) -> ExamResponse:
+   """
+   Procesa un PDF ya decodificado. `original` trae name/type/date del documento.
+   Compartido por el endpoint JSON y por el de subida directa.
+   Con `profile` (o si toca por muestreo) el pipeline se perfila y la
+   respuesta incluye `metadata.profile_id`. `text_mode` por defecto es
+   RESPONSE_TEXT_MODE.
+   """
+   text_mode = text_mode or settings.RESPONSE_TEXT_MODE
+   started = time.perf_counter()
+   profile = profile or profile_store.sampled()
+   profile_id = None
+   pipeline_result = None
    temp_file_path = None
+   cache_key = None
+   if result_cache.enabled:
+       cache_key = result_cache.key_for(pdf_content, exam_pipeline.output_options())
    try:
-       logger.info(f"Processing JSON request with PDF from IP: {request.client.host}")
-       
-       validate_pdf_content(exam_request.pdf_data)
-       pdf_content = base64.b64decode(exam_request.pdf_data.content)
-       
-       with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-           temp_file_path = tmp.name
-           temp_manager.add_file(temp_file_path)
-           tmp.write(pdf_content)
-       
-       file = UploadFile(
-           filename=exam_request.pdf_data.name or "document.pdf",
-           file=io.BytesIO(pdf_content)
-       )
-
-       text = await extract_text_from_pdf(file)
-       if not text:
+       # Bytes que no pueden ser un PDF procesable no llegan al pool
+       try:
+           check_pdf_structure(pdf_content, settings.PDF_MAX_PAGES)
+       except HTTPException:
+           metrics.record_document("invalid", len(pdf_content))
+           raise
+
+       if cache_key and not profile:
+           cached = await result_cache.get(cache_key)
+           if cached is not None:
+               # Mismo PDF y mismos patrones: no se reprocesa ni se reescriben resultados
+               logger.info(f"Respuesta desde caché: {cache_key[:16]}")
+               metrics.record_document("cached", len(pdf_content))
+               return apply_text_mode(
+                   ExamResponse(**apply_original_metadata(cached, original)),
+                   text_mode,
+                   cached.get("_sections", {})
+               )
+
+       # El PDF viaja en memoria; solo los muy grandes se vuelcan a disco (opcional)
+       pdf_source: Union[bytes, bytearray, str] = pdf_content
+       if settings.PDF_SPILL_THRESHOLD and len(pdf_content) > settings.PDF_SPILL_THRESHOLD:
+           with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf', dir=settings.TEMP_DIR) as tmp:
+               temp_file_path = tmp.name
+               temp_manager.add_file(temp_file_path)
+               tmp.write(pdf_content)
+           pdf_source = temp_file_path
+
+       # Texto, detección y extracción corren en el pool de procesos
+       pipeline_result = await exam_pipeline.run(pdf_source, profile=profile)
+       if not pipeline_result:
+           metrics.record_document("no_text", len(pdf_content))
            raise HTTPException(status_code=400, detail="No se pudo extraer texto del PDF")
 
-       patient_data = extract_patient_data(text)
+       if "profile" in pipeline_result:
+           profile_id = profile_store.new_id()
+           background_tasks.add_task(
+               profile_store.save, profile_id, pipeline_result.pop("profile"), original.get("name"), "request"
+           )
+
+       text = pipeline_result["text"]
+       patient_data = pipeline_result["patient_data"]
        patient_data["metadata"].update({
-           "original_name": exam_request.pdf_data.name,
-           "original_type": exam_request.pdf_data.type,
-           "original_date": exam_request.pdf_data.date
+           "original_name": original.get("name"),
+           "original_type": original.get("type"),
+           "original_date": original.get("date")
        })
 
-       detected_types, metadata = await medical_detector.detect_medical_exam(text)
-       logger.debug(f"Detected types: {json.dumps(detected_types, indent=2, ensure_ascii=False)}")
+       detected_types = pipeline_result["detected_types"]
+       metadata = pipeline_result["metadata"]
+       logger.debug("Detected types: {}", [exam["name"] for exam in detected_types])
+       if sample_text_dump():
+           logger.debug("Detected types (completo): {}", json.dumps(detected_types, indent=2, ensure_ascii=False))
        
        if not detected_types:
-           return ExamResponse(
+           metrics.record_document("undetected", len(pdf_content))
+           response = ExamResponse(
                is_medical=False,
                confidence="0.0",
-               metadata=metadata,
+               metadata={**metadata, "pattern_version": patterns.version},
                exams=[],
                total_exams=0,
                original_metadata=patient_data["metadata"]
            )
+           if cache_key:
+               result_cache.put(cache_key, response.dict())
+           return with_profile_id(response, profile_id)
 
-       base_filename = exam_request.pdf_data.name or "document"
+       metrics.record_document("detected", len(pdf_content))
+       base_filename = original.get("name") or "document"
        exams = []
 
        for exam in detected_types:
            single_exam = await process_exam_section(
                exam=exam,
+               results=pipeline_result["results"][exam["name"]],
                section_text=text,
                patient_data=patient_data,
                base_filename=base_filename
            )
            if single_exam:
+               metrics.COMPONENTS_FOUND.labels(exam_type=exam["name"]).inc(len(single_exam.data))
                exams.append(single_exam)
 
+       if exams:
+           # Se escribe en segundo plano: la respuesta solo espera si la cola está llena
+           await result_writer.submit(build_result_record(pdf_content, base_filename, original, text, patient_data, exams))
+
        response = ExamResponse(
            is_medical=True,
            confidence=str(max(exam.get("confidence", 0.0) for exam in detected_types)),
            metadata={
                **metadata,
                "patient_data": patient_data,
-               "processed_exams": len(exams)
+               "processed_exams": len(exams),
+               "pattern_version": patterns.version
            },
            exams=exams,
            total_exams=len(exams),
            original_metadata={
-               "name": exam_request.pdf_data.name,
-               "type": exam_request.pdf_data.type,
-               "date": exam_request.pdf_data.date
+               "name": original.get("name"),
+               "type": original.get("type"),
+               "date": original.get("date")
            }
        )
 
-       return response
+       sections = pipeline_result["sections"]
+       if cache_key:
+           # Los tramos de texto se guardan aparte (ExamResponse ignora la clave)
+           result_cache.put(cache_key, {**response.dict(), "_sections": sections})
+       return with_profile_id(apply_text_mode(response, text_mode, sections), profile_id)
 
+   except HTTPException:
+       raise
    except Exception as e:
        logger.error(f"Error processing exam: {e}", exc_info=True)
+       metrics.record_document("error")
        raise HTTPException(status_code=500, detail=str(e))
    finally:
+       latency = time.perf_counter() - started
+       if pipeline_result and not profile and profile_store.is_slow(latency):
+           # Tras responder: no se retrasa la solicitud lenta para perfilarla
+           background_tasks.add_task(capture_slow_profile, pdf_content, original.get("name"), latency)
        if temp_file_path:
-           background_tasks.add_task(temp_manager.cleanup)
+           # Solo el archivo de esta petición: otras pueden seguir procesando los suyos
+           background_tasks.add_task(temp_manager.remove, temp_file_path)
+
+TEXT_MODE_QUERY = Query(
+   None,
+   regex=TEXT_MODE_PATTERN,
+   description="Texto del documento en la respuesta: full, once, section o none (por defecto RESPONSE_TEXT_MODE)"
+)
+
+# El cuerpo se lee a mano (por trozos), así que el esquema se declara explícitamente
+EXAM_REQUEST_BODY = {
+   "required": True,
+   "content": {
+       "application/json": {
+           "schema": {
+               "type": "object",
+               "properties": {"pdf_data": PDFContent.schema()},
+               "required": ["pdf_data"]
+           }
+       }
+   }
+}
+
+def parse_original_metadata(body: dict, pdf_content: bytearray) -> dict:
+   """
+   Valida el JSON leído por `read_json_pdf_request` (content ya decodificado
+   aparte) y devuelve name/type/date del documento.
+   """
+   try:
+       exam_request = ExamRequest(**body)
+   except (ValidationError, TypeError) as e:
+       logger.error(f"Invalid request body: {e}")
+       raise HTTPException(status_code=422, detail=str(e))
+
+   if not pdf_content:
+       logger.error("No PDF content provided")
+       raise HTTPException(status_code=400, detail="No PDF content provided")
+
+   pdf_data = exam_request.pdf_data
+   return {"name": pdf_data.name, "type": pdf_data.type, "date": pdf_data.date}
+
+@app.post(
+   "/classify-exam/",
+   dependencies=[Depends(rate_limited)],
+   openapi_extra={"requestBody": EXAM_REQUEST_BODY}
+)
+async def classify_exam(
+   request: Request,
+   background_tasks: BackgroundTasks,
+   text_mode: Optional[str] = TEXT_MODE_QUERY
+):
+   logger.info(f"Processing JSON request with PDF from IP: {request.client.host}")
+
+   # El base64 se decodifica mientras llega el cuerpo, una sola vez
+   body, pdf_content = await read_json_pdf_request(request, settings.MAX_FILE_SIZE)
+   metrics.observe_stage("decode", request.state.decode_seconds)
+   return await classify_pdf(
+       pdf_content,
+       parse_original_metadata(body, pdf_content),
+       background_tasks,
+       profile=profile_store.requested(request),
+       text_mode=text_mode
+   )
+
+@app.post("/classify-exam/upload", dependencies=[Depends(rate_limited)])
+async def classify_exam_upload(
+   request: Request,
+   background_tasks: BackgroundTasks,
+   name: Optional[str] = Query(None, description="Nombre del documento"),
+   doc_type: Optional[str] = Query(None, alias="type", description="Tipo de documento"),
+   date: Optional[str] = Query(None, description="Fecha del documento"),
+   text_mode: Optional[str] = TEXT_MODE_QUERY
+):
+   """
+   Recibe el PDF sin base64: cuerpo binario (application/pdf) o multipart con
+   el campo `file`. Se lee por trozos y se corta al superar MAX_FILE_SIZE.
+   """
+   logger.info(f"Processing PDF upload from IP: {request.client.host}")
+
+   pdf_content, filename = await read_pdf_upload(request, settings.MAX_FILE_SIZE)
+   if not name and filename:
+       name = Path(filename).stem
+
+   return await classify_pdf(
+       pdf_content,
+       {"name": name, "type": doc_type, "date": date},
+       background_tasks,
+       profile=profile_store.requested(request),
+       text_mode=text_mode
+   )
+
+class BodyStreamingResponse(StreamingResponse):
+   """
+   StreamingResponse que no escucha la desconexión del cliente: esa escucha
+   consume los mensajes de `receive` y se quedaría con el cuerpo que el
+   generador todavía está leyendo. Una desconexión llega igual a quien lee el
+   cuerpo (ClientDisconnect).
+   """
+
+   async def __call__(self, scope, receive, send):
+       await self.stream_response(send)
+       if self.background is not None:
+           await self.background()
+
+BATCH_REQUEST_BODY = {
+   "required": True,
+   "content": {
+       "application/json": {
+           "schema": {
+               "type": "object",
+               "properties": {
+                   "pdf_data": {
+                       "type": "array",
+                       "items": PDFContent.schema(),
+                       "maxItems": settings.BATCH_MAX_ITEMS
+                   }
+               },
+               "required": ["pdf_data"]
+           }
+       }
+   }
+}
+
+async def rate_limited_batch(request: Request):
+   """
+   Como `rate_limited`, pero la petición solo reserva MEMORY_COST_BASE: cada
+   documento del lote reserva su propia memoria mientras se procesa.
+   """
+   await rate_limiter.check_rate_limit(request, memory_cost=settings.MEMORY_COST_BASE)
+   try:
+       yield
+   finally:
+       await rate_limiter.release(request)
+
+@app.post(
+   "/classify-exams/batch",
+   dependencies=[Depends(rate_limited_batch)],
+   openapi_extra={"requestBody": BATCH_REQUEST_BODY}
+)
+async def classify_exams_batch(
+   request: Request,
+   background_tasks: BackgroundTasks,
+   text_mode: Optional[str] = TEXT_MODE_QUERY
+):
+   """
+   Clasifica varios PDFs en una sola petición. La respuesta es NDJSON: una
+   línea por documento, en orden de término, con su índice en el lote y la
+   respuesta o el error. Un documento con error no interrumpe el lote. El
+   cuerpo se lee a medida que se liberan cupos, así que en memoria solo están
+   los documentos en proceso; un error del JSON envolvente (o más de
+   BATCH_MAX_ITEMS documentos) termina el lote con una línea de índice null.
+   """
+   logger.info(f"Processing batch of PDFs from IP: {request.client.host}")
+
+   # Documentos en vuelo suficientes para mantener ocupado el pool sin acaparar
+   # los cupos del pipeline (el resto del lote espera sin leerse, no en la cola con timeout)
+   slots = asyncio.Semaphore(exam_pipeline.max_workers * 2)
+   results: asyncio.Queue = asyncio.Queue()
+   tasks: Set[asyncio.Task] = set()
+
+   async def classify_item(index: int, metadata: Optional[dict], pdf_content: bytearray,
+                           error: Optional[HTTPException]):
+       item = {"index": index, "name": metadata.get("name") if isinstance(metadata, dict) else None}
+       reservation = 0
+       try:
+           if error is not None:
+               raise error
+           try:
+               pdf_data = PDFContent(**metadata)
+           except (ValidationError, TypeError) as e:
+               raise HTTPException(status_code=422, detail=str(e))
+           if not pdf_content:
+               raise HTTPException(status_code=400, detail="No PDF content provided")
+           reservation = rate_limiter.reserve_memory(RateLimiter.memory_cost(len(pdf_content)))
+           response = await classify_pdf(
+               pdf_content,
+               {"name": pdf_data.name, "type": pdf_data.type, "date": pdf_data.date},
+               background_tasks,
+               text_mode=text_mode
+           )
+           item.update({"status": 200, "response": response.dict()})
+       except HTTPException as e:
+           item.update({"status": e.status_code, "error": e.detail})
+       except Exception as e:
+           logger.error(f"Error processing batch item {index}: {e}", exc_info=True)
+           item.update({"status": 500, "error": str(e)})
+       finally:
+           rate_limiter.release_memory(reservation)
+           slots.release()
+       await results.put(item)
+
+   async def feed_items():
+       try:
+           async for index, metadata, pdf_content, error in read_json_batch(
+               request, settings.MAX_FILE_SIZE, settings.BATCH_MAX_ITEMS
+           ):
+               await slots.acquire()
+               task = asyncio.ensure_future(classify_item(index, metadata, pdf_content, error))
+               tasks.add(task)
+               task.add_done_callback(tasks.discard)
+       except HTTPException as e:
+           await results.put({"index": None, "status": e.status_code, "error": e.detail})
+       except ClientDisconnect:
+           logger.warning("Client disconnected while sending a batch")
+       finally:
+           if tasks:
+               await asyncio.gather(*list(tasks), return_exceptions=True)
+           await results.put(None)
+
+   async def stream_results():
+       feeder = asyncio.ensure_future(feed_items())
+       try:
+           while True:
+               item = await results.get()
+               if item is None:
+                   break
+               yield json.dumps(item, ensure_ascii=False) + "\n"
+       finally:
+           # Si el cliente se desconecta no se siguen leyendo ni procesando documentos
+           feeder.cancel()
+           for task in list(tasks):
+               task.cancel()
+
+   return BodyStreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def run_job(pdf_content: bytes, original: dict) -> dict:
+   background_tasks = BackgroundTasks()
+   try:
+       response = await classify_pdf(pdf_content, original, background_tasks)
+   finally:
+       await background_tasks()
+   return response.dict()
+
+job_runner = JobRunner(settings, create_job_store(settings), run_job, release_memory=rate_limiter.release_memory)
+
+@app.post(
+   "/jobs",
+   status_code=202,
+   dependencies=[Depends(rate_limited)],
+   openapi_extra={"requestBody": EXAM_REQUEST_BODY}
+)
+async def submit_job(request: Request):
+   """
+   Encola un PDF (mismo cuerpo que /classify-exam/) y responde de inmediato
+   con el id del trabajo; el resultado se consulta en GET /jobs/{job_id}.
+   """
+   logger.info(f"Queueing PDF job from IP: {request.client.host}")
+
+   body, pdf_content = await read_json_pdf_request(request, settings.MAX_FILE_SIZE)
+   metrics.observe_stage("decode", request.state.decode_seconds)
+   original = parse_original_metadata(body, pdf_content)
+   # El PDF sigue en memoria mientras espera en la cola: su costo queda
+   # reservado hasta que el trabajo termina
+   reservation = rate_limiter.reserve_memory(RateLimiter.memory_cost(len(pdf_content)))
+   job = await job_runner.submit(pdf_content, original, reservation)
+   if job is None:
+       rate_limiter.release_memory(reservation)
+       raise HTTPException(
+           status_code=503,
+           detail="Job queue is full. Please try again later."
+       )
+
+   return {
+       "job_id": job["id"],
+       "status": job["status"],
+       "status_url": f"/jobs/{job['id']}"
+   }
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+   job = await job_runner.get(job_id)
+   if job is None:
+       raise HTTPException(status_code=404, detail="Job not found")
+   job.pop("worker_pid", None)
+   return job
+
+# Las fechas se guardan como AAAA-MM-DD y se comparan como texto
+ISO_DATE_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
+
+@app.get("/patients/{rut}/history")
+async def get_patient_history(
+   rut: str,
+   exam_type: Optional[str] = Query(None, description="Tipo de examen (clave de EXAM_PATTERNS)"),
+   date_from: Optional[str] = Query(None, regex=ISO_DATE_PATTERN, description="Fecha inicial, AAAA-MM-DD"),
+   date_to: Optional[str] = Query(None, regex=ISO_DATE_PATTERN, description="Fecha final, AAAA-MM-DD"),
+   limit: int = Query(100, ge=1, le=1000)
+):
+   """
+   Exámenes guardados de un paciente, del más reciente al más antiguo. Los
+   resultados se persisten en segundo plano: uno recién procesado puede tardar
+   un instante en aparecer.
+   """
+   loop = asyncio.get_event_loop()
+   exams = await loop.run_in_executor(
+       None, lambda: result_store.history(rut, exam_type, date_from, date_to, limit)
+   )
+   return {"rut": normalize_rut(rut), "total": len(exams), "exams": exams}
 
 @app.get("/rate-limit-status")
 async def get_rate_limit_status(request: Request):
    ip = request.client.host
    current_time = time.time()
    
-   requests_last_minute = len([
-       req_time for req_time in rate_limiter.requests.get(ip, [])
-       if current_time - req_time < 60
-   ])
-   
-   requests_last_hour = len([
-       req_time for req_time in rate_limiter.requests.get(ip, [])
-       if current_time - req_time < 3600
-   ])
+   # Contadores precalculados por el limitador (costo constante)
+   counters = await rate_limiter.client_status(ip)
+   requests_last_minute = counters["requests_last_minute"]
+   snapshot = resource_monitor.snapshot
 
    return {
        "ip_info": {
            "ip": ip,
            "requests_last_minute": requests_last_minute,
-           "requests_last_hour": requests_last_hour,
-           "total_requests": len(rate_limiter.requests.get(ip, [])),
+           "requests_last_hour": counters["requests_last_window"],
+           "total_requests": counters["requests_last_window"],
        },
        "system_info": {
            "concurrent_requests": rate_limiter.concurrent_requests,
-           "memory_usage_mb": round(psutil.Process().memory_info().rss / (1024 * 1024), 2),
-           "memory_percent": round(psutil.Process().memory_percent(), 2),
-           "cpu_percent": round(psutil.Process().cpu_percent(), 2),
+           "memory_usage_mb": round(snapshot.rss / (1024 * 1024), 2),
+           "memory_percent": round(snapshot.memory_percent, 2),
+           "cpu_percent": round(snapshot.cpu_percent, 2),
        },
        "rate_limit_info": {
            "limit_per_minute": settings.RATE_LIMIT_PER_MINUTE,
            "remaining_requests": settings.RATE_LIMIT_PER_MINUTE - requests_last_minute,
            "cleanup_age_seconds": round(current_time - rate_limiter.last_cleanup, 2),
-           "total_ips_tracked": len(rate_limiter.requests),
+           "total_ips_tracked": rate_limiter.tracked_clients(),
+           "backend": settings.RATE_LIMIT_BACKEND,
        }
    }
    
@@ -0,0 +1,449 @@
+# middleware/rate_limit_backends.py
+# Almacenamiento de contadores del limitador: memoria del proceso, memoria
+# compartida entre workers (mmap) o un almacén clave-valor tipo Redis.
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import psutil
+from config import Settings
+
+# Cubetas por ventana: más cubetas = más precisión, mismo costo por solicitud
+WINDOW_BUCKETS = 60
+MINUTE = 60
+
+
+class SlidingWindowCounter:
+    """
+    Contador de ventana deslizante por cubetas: la ventana se divide en
+    `buckets` tramos fijos y se mantiene el total acumulado. Registrar y
+    consultar cuesta O(1) (amortizado) y la memoria es fija.
+    """
+    __slots__ = ("width", "counts", "head", "total")
+
+    def __init__(self, window_seconds: float, buckets: int = WINDOW_BUCKETS,
+                 counts: Optional[List[int]] = None, head: int = 0, total: int = 0):
+        self.width = window_seconds / buckets
+        self.counts: List[int] = list(counts) if counts is not None else [0] * buckets
+        self.head = head  # número absoluto de la cubeta más reciente
+        self.total = total
+
+    def _advance(self, now: float):
+        bucket = int(now // self.width)
+        steps = bucket - self.head
+        if steps <= 0:
+            return
+        size = len(self.counts)
+        if steps >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for offset in range(1, steps + 1):
+                index = (self.head + offset) % size
+                self.total -= self.counts[index]
+                self.counts[index] = 0
+        self.head = bucket
+
+    def add(self, now: float, amount: int = 1):
+        self._advance(now)
+        self.counts[self.head % len(self.counts)] += amount
+        self.total += amount
+
+    def count(self, now: float) -> int:
+        self._advance(now)
+        return self.total
+
+
+class RateLimitBackend(ABC):
+    """
+    Interfaz de los contadores del limitador.
+    `hit` registra una solicitud solo si el cliente no superó `limit` en el último minuto.
+    `acquire`/`release` llevan las solicitudes en curso de todos los workers.
+    Con `blocking`, las operaciones pueden esperar (un lock entre procesos, la
+    red) y el limitador las ejecuta fuera del event loop.
+    """
+
+    blocking = False
+
+    @abstractmethod
+    def hit(self, key: str, now: float, limit: int) -> bool:
+        ...
+
+    @abstractmethod
+    def client_status(self, key: str, now: float) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def acquire(self, limit: int) -> bool:
+        ...
+
+    @abstractmethod
+    def release(self):
+        ...
+
+    @abstractmethod
+    def in_flight(self) -> int:
+        ...
+
+    def tracked_clients(self) -> Optional[int]:
+        return None
+
+    def cleanup(self, now: float):
+        pass
+
+
+class ClientWindows:
+    """Ventanas de un cliente: último minuto y RATE_LIMIT_WINDOW."""
+    __slots__ = ("minute", "window", "last_seen")
+
+    def __init__(self, window_seconds: int):
+        self.minute = SlidingWindowCounter(MINUTE)
+        self.window = SlidingWindowCounter(window_seconds)
+        self.last_seen = 0.0
+
+
+class MemoryBackend(RateLimitBackend):
+    """Contadores en la memoria del proceso: cada worker de uvicorn lleva los suyos."""
+
+    def __init__(self, window_seconds: int):
+        self.window_seconds = window_seconds
+        # IP -> ventanas, ordenadas de menos a más reciente para expirar en O(1)
+        self.clients: "OrderedDict[str, ClientWindows]" = OrderedDict()
+        self.concurrent_requests = 0
+
+    def hit(self, key: str, now: float, limit: int) -> bool:
+        windows = self.clients.get(key)
+        if windows is None:
+            windows = self.clients[key] = ClientWindows(self.window_seconds)
+        else:
+            self.clients.move_to_end(key)
+        windows.last_seen = now
+
+        if windows.minute.count(now) >= limit:
+            return False
+        windows.minute.add(now)
+        windows.window.add(now)
+        return True
+
+    def client_status(self, key: str, now: float) -> Dict[str, int]:
+        windows = self.clients.get(key)
+        if windows is None:
+            return {"requests_last_minute": 0, "requests_last_window": 0}
+        return {
+            "requests_last_minute": windows.minute.count(now),
+            "requests_last_window": windows.window.count(now),
+        }
+
+    def acquire(self, limit: int) -> bool:
+        if self.concurrent_requests >= limit:
+            return False
+        self.concurrent_requests += 1
+        return True
+
+    def release(self):
+        self.concurrent_requests = max(0, self.concurrent_requests - 1)
+
+    def in_flight(self) -> int:
+        return self.concurrent_requests
+
+    def tracked_clients(self) -> Optional[int]:
+        return len(self.clients)
+
+    def cleanup(self, now: float):
+        """Elimina los clientes sin solicitudes dentro de la ventana"""
+        while self.clients:
+            key, windows = next(iter(self.clients.items()))
+            if now - windows.last_seen < self.window_seconds:
+                break
+            del self.clients[key]
+
+
+class SharedMemoryBackend(RateLimitBackend):
+    """
+    Tabla de contadores de tamaño fijo en un archivo mapeado en memoria,
+    compartida por todos los workers de un mismo host. Cada operación toma
+    un `flock` exclusivo sobre el archivo (y un lock entre hilos del proceso,
+    porque el limitador la llama desde un hilo aparte).
+
+    Estructura: cabecera | solicitudes en curso por PID | tabla de clientes
+    (direccionamiento abierto por hash de la IP; las entradas vencidas o la
+    más antigua del tramo sondeado se reutilizan en su lugar). El total en
+    curso es la suma de la tabla de PIDs: si un worker muere, sus entradas se
+    descartan en cuanto el total llega al límite (o en `cleanup`).
+    """
+
+    blocking = True
+
+    MAGIC = b"RLSHM002"
+    HEADER = struct.Struct("<8sIII")  # magic, slots, procesos, ocupadas
+    HEADER_SIZE = 64
+    PROC = struct.Struct("<qq")  # pid, solicitudes en curso
+    MAX_PROCS = 256
+    SLOT_KEY = struct.Struct("<Qd")  # hash de la IP, última solicitud
+    SLOT = struct.Struct(f"<Qdqqqq{WINDOW_BUCKETS}I{WINDOW_BUCKETS}I")
+    MAX_PROBES = 32
+
+    def __init__(self, path: Path, slots: int, window_seconds: int):
+        self.path = Path(path)
+        self.slots = slots
+        self.window_seconds = window_seconds
+        self._procs_offset = self.HEADER_SIZE
+        self._slots_offset = self._procs_offset + self.PROC.size * self.MAX_PROCS
+        size = self._slots_offset + self.SLOT.size * slots
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread_lock = threading.Lock()
+        self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o600)
+        with self._locked_fd():
+            header = os.pread(self._fd, self.HEADER.size, 0)
+            valid = (
+                len(header) == self.HEADER.size
+                and self.HEADER.unpack(header)[:3] == (self.MAGIC, slots, self.MAX_PROCS)
+                and os.fstat(self._fd).st_size == size
+            )
+            if not valid:
+                # Archivo nuevo o de otra configuración: se reinicia la tabla
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, self.HEADER.pack(self.MAGIC, slots, self.MAX_PROCS, 0), 0)
+        self._map = mmap.mmap(self._fd, size)
+        self._pid = 0
+        self._proc_index = -1
+        self.cleanup(0.0)
+
+    @contextmanager
+    def _locked_fd(self) -> Iterator[None]:
+        # flock es por descriptor: no excluye a otros hilos del mismo proceso
+        with self._thread_lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        value = int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+        return value or 1  # 0 marca una entrada vacía
+
+    def _slot_offset(self, index: int) -> int:
+        return self._slots_offset + index * self.SLOT.size
+
+    def _find_slot(self, key_hash: int, now: float, create: bool) -> Optional[int]:
+        start = key_hash % self.slots
+        empty = reusable = None
+        stalest, stalest_seen = None, 0.0
+        for probe in range(min(self.MAX_PROBES, self.slots)):
+            index = (start + probe) % self.slots
+            stored, last_seen = self.SLOT_KEY.unpack_from(self._map, self._slot_offset(index))
+            if stored == key_hash:
+                return index
+            if stored == 0:
+                # Las entradas nunca vuelven a quedar vacías: aquí termina la cadena
+                empty = index
+                break
+            if reusable is None and now - last_seen >= self.window_seconds:
+                reusable = index
+            if stalest is None or last_seen < stalest_seen:
+                stalest, stalest_seen = index, last_seen
+        if not create:
+            return None
+
+        if reusable is not None:
+            index = reusable
+        elif empty is not None:
+            index = empty
+            self._bump_occupied(1)
+        else:
+            index = stalest
+        self.SLOT.pack_into(self._map, self._slot_offset(index), key_hash, now, 0, 0, 0, 0,
+                            *([0] * (2 * WINDOW_BUCKETS)))
+        return index
+
+    def _bump_occupied(self, amount: int):
+        magic, slots, procs, occupied = self.HEADER.unpack_from(self._map, 0)
+        self.HEADER.pack_into(self._map, 0, magic, slots, procs, occupied + amount)
+
+    def _load(self, index: int) -> Tuple[int, SlidingWindowCounter, SlidingWindowCounter]:
+        values = self.SLOT.unpack_from(self._map, self._slot_offset(index))
+        key_hash, _, minute_head, minute_total, window_head, window_total = values[:6]
+        counts = values[6:]
+        minute = SlidingWindowCounter(MINUTE, counts=counts[:WINDOW_BUCKETS], head=minute_head, total=minute_total)
+        window = SlidingWindowCounter(self.window_seconds, counts=counts[WINDOW_BUCKETS:],
+                                      head=window_head, total=window_total)
+        return key_hash, minute, window
+
+    def _store(self, index: int, key_hash: int, now: float, minute: SlidingWindowCounter,
+               window: SlidingWindowCounter):
+        self.SLOT.pack_into(self._map, self._slot_offset(index), key_hash, now,
+                            minute.head, minute.total, window.head, window.total,
+                            *minute.counts, *window.counts)
+
+    def hit(self, key: str, now: float, limit: int) -> bool:
+        key_hash = self._hash(key)
+        with self._locked_fd():
+            index = self._find_slot(key_hash, now, create=True)
+            _, minute, window = self._load(index)
+            allowed = minute.count(now) < limit
+            if allowed:
+                minute.add(now)
+                window.add(now)
+            self._store(index, key_hash, now, minute, window)
+            return allowed
+
+    def client_status(self, key: str, now: float) -> Dict[str, int]:
+        with self._locked_fd():
+            index = self._find_slot(self._hash(key), now, create=False)
+            if index is None:
+                return {"requests_last_minute": 0, "requests_last_window": 0}
+            _, minute, window = self._load(index)
+            return {"requests_last_minute": minute.count(now), "requests_last_window": window.count(now)}
+
+    def _set_proc(self, index: int, pid: int, count: int):
+        self.PROC.pack_into(self._map, self._procs_offset + index * self.PROC.size, pid, count)
+
+    def _procs(self) -> Iterator[Tuple[int, int, int]]:
+        """(índice, pid, solicitudes en curso) de cada entrada de la tabla de PIDs"""
+        table = self._map[self._procs_offset:self._slots_offset]
+        for index, (pid, count) in enumerate(self.PROC.iter_unpack(table)):
+            yield index, pid, count
+
+    def _reap_dead_procs(self):
+        for index, pid, _ in self._procs():
+            if pid and pid != os.getpid() and not psutil.pid_exists(pid):
+                self._set_proc(index, 0, 0)
+
+    def _proc_slot(self) -> int:
+        # Entrada de este proceso en la tabla de PIDs (se recalcula tras un fork)
+        pid = os.getpid()
+        if self._pid == pid:
+            return self._proc_index
+        free = None
+        for index in range(self.MAX_PROCS):
+            stored_pid, _ = self.PROC.unpack_from(self._map, self._procs_offset + index * self.PROC.size)
+            if stored_pid == pid:
+                free = index
+                break
+            if stored_pid == 0 and free is None:
+                free = index
+        if free is None:
+            raise RuntimeError("Tabla de procesos del limitador llena")
+        self._set_proc(free, pid, 0)
+        self._pid, self._proc_index = pid, free
+        return free
+
+    def _add_in_flight(self, amount: int):
+        index = self._proc_slot()
+        pid, count = self.PROC.unpack_from(self._map, self._procs_offset + index * self.PROC.size)
+        self._set_proc(index, pid, max(0, count + amount))
+
+    def acquire(self, limit: int) -> bool:
+        with self._locked_fd():
+            self._proc_slot()
+            if self.in_flight() >= limit:
+                # Antes de rechazar se descartan los cupos de workers caídos
+                self._reap_dead_procs()
+                if self.in_flight() >= limit:
+                    return False
+            self._add_in_flight(1)
+            return True
+
+    def release(self):
+        with self._locked_fd():
+            self._add_in_flight(-1)
+
+    def in_flight(self) -> int:
+        return sum(count for _, pid, count in self._procs() if pid)
+
+    def tracked_clients(self) -> Optional[int]:
+        return self.HEADER.unpack_from(self._map, 0)[3]
+
+    def cleanup(self, now: float):
+        """Libera los cupos de procesos que ya no existen (p. ej. un worker caído)"""
+        with self._locked_fd():
+            self._reap_dead_procs()
+
+
+class KeyValueStore(ABC):
+    """
+    Operaciones mínimas que debe ofrecer un almacén externo (p. ej. Redis:
+    INCRBY + EXPIRE y MGET) para compartir el limitador entre hosts.
+    """
+
+    @abstractmethod
+    def incr(self, key: str, amount: int = 1, ttl: Optional[int] = None) -> int:
+        """Suma `amount` a la clave (0 si no existe), renueva su TTL y devuelve el valor."""
+
+    @abstractmethod
+    def get_many(self, keys: List[str]) -> List[Optional[int]]:
+        ...
+
+
+class KeyValueBackend(RateLimitBackend):
+    """
+    Limitador sobre un `KeyValueStore`: una clave por cubeta de cada ventana
+    (con TTL), más un contador global de solicitudes en curso. Registrar
+    primero y descontar si se excede hace la admisión atómica sin scripts.
+    El contador en curso también vence (`in_flight_ttl` segundos sin
+    solicitudes): lo que dejó un worker caído no bloquea los cupos para siempre.
+    """
+
+    blocking = True
+
+    def __init__(self, store: KeyValueStore, window_seconds: int, prefix: str = "rate_limit",
+                 in_flight_ttl: int = 600):
+        self.store = store
+        self.window_seconds = window_seconds
+        self.prefix = prefix
+        self.in_flight_ttl = in_flight_ttl
+
+    def _bucket_keys(self, key: str, window: str, window_seconds: float, now: float) -> List[str]:
+        width = window_seconds / WINDOW_BUCKETS
+        current = int(now // width)
+        return [f"{self.prefix}:{key}:{window}:{bucket}" for bucket in range(current - WINDOW_BUCKETS + 1, current + 1)]
+
+    def _count(self, keys: List[str]) -> int:
+        return sum(value or 0 for value in self.store.get_many(keys))
+
+    def hit(self, key: str, now: float, limit: int) -> bool:
+        minute_keys = self._bucket_keys(key, "m", MINUTE, now)
+        window_keys = self._bucket_keys(key, "w", self.window_seconds, now)
+        self.store.incr(minute_keys[-1], 1, ttl=MINUTE * 2)
+        if self._count(minute_keys) > limit:
+            self.store.incr(minute_keys[-1], -1, ttl=MINUTE * 2)
+            return False
+        self.store.incr(window_keys[-1], 1, ttl=self.window_seconds * 2)
+        return True
+
+    def client_status(self, key: str, now: float) -> Dict[str, int]:
+        return {
+            "requests_last_minute": self._count(self._bucket_keys(key, "m", MINUTE, now)),
+            "requests_last_window": self._count(self._bucket_keys(key, "w", self.window_seconds, now)),
+        }
+
+    def acquire(self, limit: int) -> bool:
+        if self.store.incr(f"{self.prefix}:in_flight", 1, ttl=self.in_flight_ttl) > limit:
+            self.store.incr(f"{self.prefix}:in_flight", -1, ttl=self.in_flight_ttl)
+            return False
+        return True
+
+    def release(self):
+        self.store.incr(f"{self.prefix}:in_flight", -1, ttl=self.in_flight_ttl)
+
+    def in_flight(self) -> int:
+        return max(0, self.store.get_many([f"{self.prefix}:in_flight"])[0] or 0)
+
+
+def create_rate_limit_backend(settings: Settings) -> RateLimitBackend:
+    if settings.RATE_LIMIT_BACKEND == "memory":
+        return MemoryBackend(settings.RATE_LIMIT_WINDOW)
+    if settings.RATE_LIMIT_BACKEND == "shared":
+        return SharedMemoryBackend(settings.rate_limit_shm_path, settings.RATE_LIMIT_SHM_SLOTS, settings.RATE_LIMIT_WINDOW)
+    raise ValueError(f"RATE_LIMIT_BACKEND desconocido: {settings.RATE_LIMIT_BACKEND}")
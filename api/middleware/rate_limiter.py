@@ -1,66 +1,131 @@
 # middleware/rate_limiter.py
-# curl http://localhost:8080/rate-limit-status 
-from collections import defaultdict
+# curl http://localhost:8080/rate-limit-status
+import asyncio
 import time
-from threading import Lock
-import psutil
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import HTTPException, Request
-from typing import Dict, List
+from typing import Any, Callable, Dict, Optional
 from config import get_settings
+from middleware.rate_limit_backends import RateLimitBackend, create_rate_limit_backend
+from services.resource_monitor import ResourceMonitor
 
 settings = get_settings()
 
-class MemoryRateLimiter:
-    def __init__(self):
-        self.requests: Dict[str, List[float]] = defaultdict(list)
-        self.concurrent_requests: int = 0
-        self.lock = Lock()
+
+class RateLimiter:
+    """
+    Límite por IP (RATE_LIMIT_PER_MINUTE) y de solicitudes en curso
+    (MAX_CONCURRENT_REQUESTS). Los contadores viven en el backend
+    (RATE_LIMIT_BACKEND): "shared" los comparte entre los workers del host.
+
+    Con `monitor`, además reserva la memoria estimada de cada solicitud y la
+    rechaza si no cabe bajo MAX_MEMORY_USAGE según la última muestra de RSS
+    del worker (sin los procesos del pool).
+
+    Las operaciones de un backend `blocking` (flock, red) corren en un hilo
+    propio del limitador: el event loop no espera el lock de otro worker y,
+    con un solo hilo, las operaciones de este proceso siguen en orden.
+    """
+
+    def __init__(self, backend: Optional[RateLimitBackend] = None, monitor: Optional[ResourceMonitor] = None):
+        self.backend = backend or create_rate_limit_backend(settings)
+        self.monitor = monitor
+        self.reserved_memory: int = 0
         self.last_cleanup: float = time.time()
-    
-    async def check_rate_limit(self, request: Request):
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def concurrent_requests(self) -> int:
+        return self.backend.in_flight()
+
+    async def check_rate_limit(self, request: Request, memory_cost: Optional[int] = None):
         """
-        Verifica límites de velocidad y recursos
+        Verifica límites de velocidad y recursos. Si no lanza excepción, la
+        solicitud ocupa un cupo hasta que se llame a `release`. `memory_cost`
+        reemplaza la estimación por tamaño del cuerpo (p. ej. en los lotes,
+        donde cada documento reserva lo suyo con `reserve_memory`).
         """
-        ip = request.client.host
-        current_time = time.time()
-        
-        with self.lock:
-            # Limpiar solicitudes antiguas
-            if current_time - self.last_cleanup >= settings.CLEANUP_INTERVAL:
-                self._cleanup_old_requests()
-            
-            # Verificar límite por IP
-            recent_requests = [
-                req_time for req_time in self.requests[ip]
-                if current_time - req_time < 60  # último minuto
-            ]
-            
-            if len(recent_requests) >= settings.RATE_LIMIT_PER_MINUTE:
-                raise HTTPException(
-                    status_code=429,
-                    detail="Rate limit exceeded. Please try again later."
-                )
-            
-            # Registrar nueva solicitud
-            self.requests[ip].append(current_time)
-            self.concurrent_requests += 1
-            
-            # Verificar memoria
-            if psutil.Process().memory_info().rss > settings.MAX_MEMORY_USAGE:
-                self.concurrent_requests -= 1
-                raise HTTPException(
-                    status_code=503,
-                    detail="Server is experiencing high memory usage. Please try again later."
-                )
-    
+        rejection = await self._call_backend(self._admit, request.client.host, time.time())
+        if rejection is not None:
+            raise rejection
+
+        # Verificar memoria: RSS muestreado + reservas en curso + costo estimado de esta solicitud
+        if self.monitor is not None:
+            cost = self.estimated_memory_cost(request) if memory_cost is None else memory_cost
+            try:
+                request.state.memory_reservation = self.reserve_memory(cost)
+            except HTTPException:
+                await self._call_backend(self.backend.release)
+                raise
+
+    def _admit(self, ip: str, current_time: float) -> Optional[HTTPException]:
+        """Límite por IP y cupo en curso; devuelve el rechazo en vez de lanzarlo (corre en otro hilo)"""
+        if current_time - self.last_cleanup >= settings.CLEANUP_INTERVAL:
+            self._cleanup_old_requests()
+
+        # Verificar límite por IP (y registrar la solicitud si se admite)
+        if not self.backend.hit(ip, current_time, settings.RATE_LIMIT_PER_MINUTE):
+            return HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please try again later."
+            )
+
+        if not self.backend.acquire(settings.MAX_CONCURRENT_REQUESTS):
+            return HTTPException(
+                status_code=503,
+                detail="Too many requests in progress. Please try again later."
+            )
+        return None
+
+    async def _call_backend(self, function: Callable[..., Any], *args: Any) -> Any:
+        if not self.backend.blocking:
+            return function(*args)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limiter")
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    @staticmethod
+    def memory_cost(body_size: int) -> int:
+        return settings.MEMORY_COST_BASE + int(body_size * settings.MEMORY_COST_PER_BYTE)
+
+    @classmethod
+    def estimated_memory_cost(cls, request: Request) -> int:
+        """Memoria estimada para procesar la solicitud según el tamaño del cuerpo"""
+        length = request.headers.get("content-length", "")
+        return cls.memory_cost(int(length) if length.isdigit() else settings.MAX_FILE_SIZE)
+
+    def reserve_memory(self, cost: int) -> int:
+        """
+        Reserva `cost` bytes si caben bajo MAX_MEMORY_USAGE (si no, 503) y
+        devuelve lo reservado, a liberar con `release_memory`.
+        """
+        if self.monitor is None:
+            return 0
+        if self.monitor.snapshot.rss + self.reserved_memory + cost > settings.MAX_MEMORY_USAGE:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is experiencing high memory usage. Please try again later."
+            )
+        self.reserved_memory += cost
+        return cost
+
+    def release_memory(self, cost: int):
+        self.reserved_memory = max(0, self.reserved_memory - cost)
+
+    async def release(self, request: Request):
+        """Libera el cupo y la memoria reservados por `check_rate_limit` al terminar la solicitud"""
+        self.release_memory(getattr(request.state, "memory_reservation", 0))
+        await self._call_backend(self.backend.release)
+
+    async def client_status(self, ip: str) -> Dict[str, int]:
+        """Contadores de un cliente, sin recorrer su historial."""
+        return await self._call_backend(self.backend.client_status, ip, time.time())
+
+    def tracked_clients(self) -> Optional[int]:
+        return self.backend.tracked_clients()
+
     def _cleanup_old_requests(self):
-        """Limpia solicitudes antiguas"""
+        """Elimina clientes inactivos y cupos de procesos que ya no existen"""
         current_time = time.time()
-        for ip in list(self.requests.keys()):
-            self.requests[ip] = [
-                req_time for req_time in self.requests[ip]
-                if current_time - req_time < settings.RATE_LIMIT_WINDOW
-            ]
-            if not self.requests[ip]:
-                del self.requests[ip]
-        self.last_cleanup = current_time
\ No newline at end of file
+        self.backend.cleanup(current_time)
+        self.last_cleanup = current_time
@@ -8,6 +8,12 @@ class PDFContent(BaseModel):
     date: Optional[str] = Field(default=None, description="Fecha del documento")
     content: str = Field(..., description="Contenido del PDF en base64")
 
+# Modos de texto en la respuesta: "full" (texto completo en cada examen),
+# "once" (una vez en ExamResponse.raw_text), "section" (cada examen solo con
+# las líneas donde se encontraron sus componentes) o "none" (sin texto)
+TEXT_MODES = ("full", "once", "section", "none")
+TEXT_MODE_PATTERN = f"^({'|'.join(TEXT_MODES)})$"
+
 # Clase para la petición
 class ExamRequest(BaseModel):
     pdf_data: PDFContent
@@ -27,5 +33,7 @@ class ExamResponse(BaseModel):
     exams: List[SingleExam] = Field(default_factory=list)
     total_exams: int = Field(default=0)
     json_file: Optional[List[str]] = None
+    # Texto del documento una sola vez (modo de texto "once"; ver RESPONSE_TEXT_MODE)
+    raw_text: Optional[str] = None
     # Campo para mantener la información original del JSON
     original_metadata: Optional[Dict] = Field(default=None, description="Metadata original del JSON")
\ No newline at end of file
@@ -1,6 +1,7 @@
 from typing import List, Dict, Tuple, Any, Optional
 from loguru import logger
 import re
+import time
 from exam_types.exam_patterns import EXAM_PATTERNS
 from exam_types.component_aliases import COMPONENT_ALIASES
 from exam_types.units_config import COMMON_UNITS
@@ -11,6 +12,43 @@ from exam_types.result_patterns import (
     SKIP_PATTERNS,
     SECTION_BREAKS,
 )
+from utils.pattern_matcher import Hit
+from utils.pattern_artifact import get_patterns
+from utils.document_index import DocumentIndex
+from utils.profiling import active_timer
+
+# Autómata único con nombres de examen, componentes y aliases (del artefacto de patrones)
+EXAM_MATCHER = get_patterns().exam_matcher
+
+# Segunda forma de ocurrencia de un componente: separador seguido de texto hasta un límite
+COMPONENT_TAIL_PATTERN = re.compile(r"[\s.:](.*?)\b")
+
+# Caracteres tras el componente donde se busca su resultado
+CONTEXT_WINDOW = 100
+
+
+class MedicalCheck:
+    """
+    Verificación de indicadores médicos por partes (p. ej. página a página):
+    el documento es médico en cuanto aparecen `required` indicadores distintos,
+    sin importar en qué parte. Cada indicador se busca hasta encontrarlo.
+    """
+
+    def __init__(self, indicators: List[str], required: int):
+        self.pending = list(indicators)
+        self.found: List[str] = []
+        self.required = required
+
+    def feed(self, text_upper: str):
+        for indicator in list(self.pending):
+            if indicator in text_upper:
+                self.pending.remove(indicator)
+                self.found.append(indicator)
+
+    @property
+    def is_medical(self) -> bool:
+        return len(self.found) >= self.required
+
 
 class MedicalExamDetector:
     def __init__(self):
@@ -18,11 +56,19 @@ class MedicalExamDetector:
             "LABORATORIO", "HOSPITAL", "CLINICA",
             "RESULTADO", "INFORME", "EXAMEN"
         ]
+        self.required_indicators = 2
+
+    def medical_check(self) -> MedicalCheck:
+        return MedicalCheck(self.medical_indicators, self.required_indicators)
 
     async def detect_medical_exam(self, text: str) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        return self.detect(text)
+
+    def detect(self, text: str, is_medical: Optional[bool] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
         """
-        Proceso de detección:
-        1. Verifica si es un documento médico
+        Proceso de detección (síncrono, se puede ejecutar en un proceso aparte):
+        1. Verifica si es un documento médico (salvo que `is_medical` ya lo diga,
+           p. ej. tras la verificación página a página del pipeline)
         2. Busca nombres de exámenes en el texto
         3. Para cada examen encontrado, busca sus componentes
         """
@@ -31,35 +77,57 @@ class MedicalExamDetector:
             detected_exams = []
             
             # Paso 1: Verificar si es documento médico
-            if not self._is_medical_document(text):
+            if is_medical is None:
+                is_medical = self._is_medical_document(text)
+            if not is_medical:
                 logger.debug("El documento no parece ser un examen médico")
                 return [], {"is_medical": False}
             
             logger.debug("Documento identificado como examen médico")
 
+            # Una sola pasada sobre el texto para todos los nombres, componentes y aliases
+            # Con perfilado activo se mide el costo de cada entrada de patrones
+            timer = active_timer()
+            started = time.perf_counter() if timer else 0.0
+            hits = EXAM_MATCHER.scan(text)
+            if timer:
+                timer.add("EXAM_MATCHER", "scan", time.perf_counter() - started)
+            occurrences = self._component_occurrences(text, hits)
+            index = DocumentIndex(text, [
+                (end, end + CONTEXT_WINDOW) for ends in occurrences.values() for end in ends
+            ])
+            component_cache: Dict[str, bool] = {}
+
             # Paso 2: Buscar tipos de examen (Futuramente verificar por nombre completo real y luego coincidencias)
             for exam_name, patterns in EXAM_PATTERNS.items():
                 # Buscar coincidencias por nombre
                 found_names = []
                 for name in patterns['nombres']:
-                    if re.search(rf"\b{re.escape(name)}\b", text):
+                    if any(bounded for _, _, bounded in hits.get(name.upper(), ())):
                         found_names.append(name)
-                        logger.debug(f"Encontrado examen tipo: {exam_name} ({name})")
+                        logger.debug("Encontrado examen tipo: {} ({})", exam_name, name)
 
                 if found_names:
                     # Paso 3: Buscar componentes del examen (Futuramente verificar por nombre completo real y luego coincidencias)
                     found_components = []
-                    for component in patterns['componentes']:
-                        if self._find_component_in_text(text, component):
+                    for component in patterns.get('componentes', []):
+                        started = time.perf_counter() if timer else 0.0
+                        if self._find_component_in_text(index, component, occurrences, component_cache):
                             found_components.append(component)
-                            logger.debug(f"Encontrado componente: {component}")
+                            logger.debug("Encontrado componente: {}", component)
                         elif component in COMPONENT_ALIASES:
                             # Buscar aliases
                             for alias in COMPONENT_ALIASES[component]:
-                                if self._find_component_in_text(text, alias):
+                                alias_started = time.perf_counter() if timer else 0.0
+                                found = self._find_component_in_text(index, alias, occurrences, component_cache)
+                                if timer:
+                                    timer.add("COMPONENT_ALIASES", f"{component}:{alias}", time.perf_counter() - alias_started)
+                                if found:
                                     found_components.append(component)
-                                    logger.debug(f"Encontrado componente por alias: {component} ({alias})")
+                                    logger.debug("Encontrado componente por alias: {} ({})", component, alias)
                                     break
+                        if timer:
+                            timer.add("EXAM_PATTERNS", f"{exam_name}:{component}", time.perf_counter() - started)
 
                     # Si encontró al menos un componente, agregar el examen
                     if found_components:
@@ -73,13 +141,13 @@ class MedicalExamDetector:
                             }
                         }
                         detected_exams.append(exam_data)
-                        logger.debug(f"Agregado examen {exam_name} con {len(found_components)} componentes")
+                        logger.debug("Agregado examen {} con {} componentes", exam_name, len(found_components))
 
             # Logging final
             if detected_exams:
-                logger.debug(f"Total exámenes detectados: {len(detected_exams)}")
+                logger.debug("Total exámenes detectados: {}", len(detected_exams))
                 for exam in detected_exams:
-                    logger.debug(f"Examen: {exam['name']}, Componentes: {exam['found']['componentes']}")
+                    logger.debug("Examen: {}, Componentes: {}", exam['name'], exam['found']['componentes'])
             else:
                 logger.debug("No se detectaron exámenes con componentes válidos")
 
@@ -94,66 +162,52 @@ class MedicalExamDetector:
 
     def _is_medical_document(self, text: str) -> bool:
         """Verifica si el texto es un documento médico."""
-        count = sum(1 for indicator in self.medical_indicators 
-                   if indicator in text)
-        return count >= 2
+        check = self.medical_check()
+        check.feed(text)
+        return check.is_medical
 
-    def _find_component_in_text(self, text: str, component: str) -> bool:
+    def _component_occurrences(self, text: str, hits: Dict[str, List[Hit]]) -> Dict[str, List[int]]:
+        """
+        Para cada literal encontrado, las posiciones donde termina cada ocurrencia
+        con las dos formas aceptadas: "\\bC\\b" y "\\bC[\\s.:](.*?)\\b".
+        """
+        occurrences: Dict[str, List[int]] = {}
+        for literal, literal_hits in hits.items():
+            ends = []
+            for start, end, bounded in literal_hits:
+                if bounded:
+                    ends.append(end)
+                tail_match = COMPONENT_TAIL_PATTERN.match(text, end)
+                if tail_match:
+                    ends.append(tail_match.end())
+            occurrences[literal] = ends
+        return occurrences
+
+    def _find_component_in_text(self, index: DocumentIndex, component: str,
+                                occurrences: Dict[str, List[int]],
+                                cache: Optional[Dict[str, bool]] = None) -> bool:
         """
         Busca un componente en el texto usando los patrones predefinidos.
+        Las ocurrencias del componente vienen de `EXAM_MATCHER.scan` y los
+        resultados cercanos se consultan en el índice posicional del documento.
         """
+        if cache is not None and component in cache:
+            return cache[component]
         try:
-            component_pattern = re.escape(component)
             result_found = False
 
-            # 1. Encontrar el componente en el texto
-            component_matches = []
-            base_patterns = [
-                rf"\b{component_pattern}\b",
-                rf"\b{component_pattern}[\s.:](.*?)\b"
-            ]
-
-            for pattern in base_patterns:
-                matches = re.finditer(pattern, text, re.IGNORECASE)
-                component_matches.extend([(m.start(), m.end()) for m in matches])
-
-            # 2. Para cada coincidencia del componente, buscar resultados en el contexto
-            for start, end in component_matches:
-                # Obtener contexto después del componente
-                context = text[end:end + 100]
-
-                # A. Buscar usando RESULT_PATTERNS definidos
-                for pattern_type, pattern in RESULT_PATTERNS.items():
-                    if re.search(pattern, context):
-                        result_found = True
-                        logger.debug(f"Componente {component} encontrado con {pattern_type}")
-                        break
-
-                if result_found:
+            # Para cada ocurrencia, buscar un resultado en el contexto siguiente
+            for end in occurrences.get(component.upper(), ()):
+                result_type = index.find_result(end, end + CONTEXT_WINDOW)
+                if result_type:
+                    result_found = True
+                    logger.debug("Componente {} encontrado con {}", component, result_type)
                     break
 
-                # B. Buscar usando REFERENCE_PATTERNS definidos
-                for ref_type, pattern in REFERENCE_PATTERNS.items():
-                    if re.search(pattern, context):
-                        result_found = True
-                        logger.debug(f"Componente {component} encontrado con referencia {ref_type}")
-                        break
-
-                if result_found:
-                    break
-
-                # C. Buscar unidades definidas en COMMON_UNITS
-                for category, units in COMMON_UNITS.items():
-                    for unit in units:
-                        if unit in context:
-                            result_found = True
-                            logger.debug(f"Componente {component} encontrado con unidad {unit}")
-                            break
-                    if result_found:
-                        break
-
+            if cache is not None:
+                cache[component] = result_found
             return result_found
 
         except Exception as e:
             logger.error(f"Error en _find_component_in_text: {str(e)}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,299 @@
+# services/jobs.py
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import psutil
+from loguru import logger
+from config import Settings
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+
+class JobStore(ABC):
+    """Interfaz del almacenamiento de estado de los trabajos."""
+
+    @abstractmethod
+    def create(self, job: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def update(self, job_id: str, **fields: Any):
+        ...
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def fail_unfinished(self, error: str) -> int:
+        """Marca como fallidos los trabajos que quedaron a medias (p. ej. tras un reinicio)."""
+
+    @abstractmethod
+    def purge(self, finished_before: float) -> int:
+        """Borra los trabajos terminados antes de `finished_before`; devuelve cuántos."""
+
+
+class MemoryJobStore(JobStore):
+    """Estado en memoria del proceso: solo sirve con un único worker de uvicorn."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def create(self, job: Dict[str, Any]):
+        self._jobs[job["id"]] = dict(job)
+
+    def update(self, job_id: str, **fields: Any):
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def fail_unfinished(self, error: str) -> int:
+        return 0
+
+    def purge(self, finished_before: float) -> int:
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] in (JOB_DONE, JOB_FAILED) and (job.get("finished_at") or 0) < finished_before
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+        return len(expired)
+
+
+class SQLiteJobStore(JobStore):
+    """
+    Estado en un archivo SQLite local, compartido por todos los workers de
+    uvicorn: cualquiera puede responder el GET de un trabajo creado en otro.
+    """
+
+    COLUMNS = (
+        "id", "status", "name", "worker_pid", "created_at", "started_at",
+        "finished_at", "status_code", "error", "result"
+    )
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        # Se abre en el primer uso (al iniciar el worker), no al importar
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, name TEXT, worker_pid INTEGER, "
+            "created_at REAL, started_at REAL, finished_at REAL, "
+            "status_code INTEGER, error TEXT, result TEXT)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS jobs_by_finished ON jobs (finished_at)")
+        connection.commit()
+        return connection
+
+    def _execute(self, query: str, params: tuple = ()) -> List[tuple]:
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+            rows = self._connection.execute(query, params).fetchall()
+            self._connection.commit()
+            return rows
+
+    def create(self, job: Dict[str, Any]):
+        values = [job.get(column) for column in self.COLUMNS]
+        if values[-1] is not None:
+            values[-1] = json.dumps(values[-1], ensure_ascii=False)
+        self._execute(
+            f"INSERT INTO jobs ({', '.join(self.COLUMNS)}) VALUES ({', '.join('?' * len(self.COLUMNS))})",
+            tuple(values)
+        )
+
+    def update(self, job_id: str, **fields: Any):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        columns = [column for column in fields if column in self.COLUMNS and column != "id"]
+        if not columns:
+            return
+        self._execute(
+            f"UPDATE jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+            tuple(fields[column] for column in columns) + (job_id,)
+        )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        job = dict(zip(self.COLUMNS, rows[0]))
+        if job["result"] is not None:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def fail_unfinished(self, error: str) -> int:
+        # Solo los de procesos que ya no existen: los demás workers siguen con los suyos
+        rows = self._execute(
+            "SELECT id, worker_pid FROM jobs WHERE status IN (?, ?)", (JOB_QUEUED, JOB_RUNNING)
+        )
+        orphans = [
+            job_id for job_id, pid in rows
+            if pid is None or pid == os.getpid() or not psutil.pid_exists(pid)
+        ]
+        for job_id in orphans:
+            self.update(job_id, status=JOB_FAILED, error=error, finished_at=time.time())
+        return len(orphans)
+
+    def purge(self, finished_before: float) -> int:
+        expired = (JOB_DONE, JOB_FAILED, finished_before)
+        count = self._execute("SELECT COUNT(*) FROM jobs WHERE status IN (?, ?) AND finished_at < ?", expired)[0][0]
+        if count:
+            self._execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", expired)
+        return count
+
+
+def create_job_store(settings: Settings) -> JobStore:
+    if settings.JOB_STORE == "memory":
+        return MemoryJobStore()
+    if settings.JOB_STORE == "sqlite":
+        return SQLiteJobStore(settings.job_db_path)
+    raise ValueError(f"JOB_STORE desconocido: {settings.JOB_STORE}")
+
+
+# handler(pdf_content, original) -> respuesta serializable
+JobHandler = Callable[[bytes, Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+
+class JobRunner:
+    """
+    Trabajos asíncronos sobre el pipeline: `submit` solo encola y responde de
+    inmediato; JOB_WORKERS tareas del event loop consumen la cola (acotada a
+    JOB_QUEUE_SIZE) y guardan estado y resultado en el `JobStore`. Los
+    trabajos terminados se borran tras JOB_RETENTION segundos.
+
+    `submit` acepta la memoria reservada para el PDF en la admisión (ver
+    `RateLimiter.reserve_memory`); se devuelve con `release_memory` cuando el
+    trabajo termina, así los PDFs en cola cuentan contra MAX_MEMORY_USAGE.
+    """
+
+    def __init__(self, settings: Settings, store: JobStore, handler: JobHandler,
+                 release_memory: Optional[Callable[[int], None]] = None):
+        self.settings = settings
+        self.store = store
+        self.handler = handler
+        self.release_memory = release_memory
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._cleanup_task: Optional[asyncio.Task] = None
+
+    async def _call_store(self, method: Callable, *args: Any, **kwargs: Any) -> Any:
+        # SQLite bloquea: las operaciones del store van al pool de hilos
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(None, lambda: method(*args, **kwargs))
+
+    def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.settings.JOB_QUEUE_SIZE)
+        interrupted = self.store.fail_unfinished("Trabajo interrumpido por reinicio del servidor")
+        if interrupted:
+            logger.warning(f"{interrupted} trabajos pendientes marcados como fallidos")
+        self._workers = [asyncio.ensure_future(self._worker()) for _ in range(self.settings.JOB_WORKERS)]
+        if self.settings.JOB_RETENTION > 0:
+            self._cleanup_task = asyncio.ensure_future(self._purge_periodically())
+        logger.info(f"Cola de trabajos iniciada con {self.settings.JOB_WORKERS} workers")
+
+    async def shutdown(self):
+        for task in [*self._workers, self._cleanup_task]:
+            if task is not None:
+                task.cancel()
+        self._workers = []
+        self._cleanup_task = None
+        self._queue = None
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def submit(self, pdf_content: bytes, original: Dict[str, Any],
+                     reservation: int = 0) -> Optional[Dict[str, Any]]:
+        """
+        Registra y encola un trabajo. Devuelve None si la cola está llena (la
+        reserva de memoria queda entonces a cargo de quien llama).
+        """
+        self.start()
+        if self._queue.full():
+            return None
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "status": JOB_QUEUED,
+            "name": original.get("name"),
+            "worker_pid": os.getpid(),
+            "created_at": time.time(),
+        }
+        await self._call_store(self.store.create, job)
+        try:
+            self._queue.put_nowait((job["id"], pdf_content, original, reservation))
+        except asyncio.QueueFull:
+            # Otra petición ocupó el último lugar mientras se registraba este trabajo
+            await self._call_store(self.store.update, job["id"], status=JOB_FAILED, status_code=503, error="Cola llena")
+            return None
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self._call_store(self.store.get, job_id)
+
+    async def purge(self) -> int:
+        """Borra los trabajos terminados hace más de JOB_RETENTION segundos."""
+        purged = await self._call_store(self.store.purge, time.time() - self.settings.JOB_RETENTION)
+        if purged:
+            logger.info(f"{purged} trabajos terminados eliminados")
+        return purged
+
+    async def _purge_periodically(self):
+        while True:
+            try:
+                await self.purge()
+            except Exception as e:
+                logger.error(f"Error limpiando trabajos: {e}")
+            await asyncio.sleep(self.settings.CLEANUP_INTERVAL)
+
+    async def _worker(self):
+        while True:
+            job_id, pdf_content, original, reservation = await self._queue.get()
+            try:
+                await self._run(job_id, pdf_content, original)
+            finally:
+                if reservation and self.release_memory is not None:
+                    self.release_memory(reservation)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, pdf_content: bytes, original: Dict[str, Any]):
+        await self._call_store(self.store.update, job_id, status=JOB_RUNNING, started_at=time.time())
+        fields: Dict[str, Any]
+        try:
+            result = await self.handler(pdf_content, original)
+            fields = {"status": JOB_DONE, "status_code": 200, "result": result}
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # HTTPException trae status_code y detail; cualquier otro error es un 500
+            fields = {
+                "status": JOB_FAILED,
+                "status_code": getattr(e, "status_code", 500),
+                "error": str(getattr(e, "detail", e)),
+            }
+            logger.error(f"Trabajo {job_id} fallido: {fields['error']}")
+        fields["finished_at"] = time.time()
+        await self._call_store(self.store.update, job_id, **fields)
@@ -0,0 +1,101 @@
+# services/metrics.py
+# Métricas Prometheus del pipeline de exámenes (GET /metrics/prometheus)
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from config import get_settings
+
+settings = get_settings()
+
+# El modo multiproceso se decide al importar prometheus_client: la variable
+# debe existir antes de importarlo en cada worker
+_multiproc_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or settings.PROMETHEUS_MULTIPROC_DIR
+if _multiproc_dir:
+    Path(_multiproc_dir).mkdir(parents=True, exist_ok=True)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = str(_multiproc_dir)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "exam_pipeline_stage_seconds",
+    "Duración de cada etapa del procesamiento de un documento",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+EXAM_TYPE_SECONDS = Histogram(
+    "exam_type_stage_seconds",
+    "Duración de las etapas por tipo de examen (clave de EXAM_PATTERNS)",
+    ["stage", "exam_type"],
+    buckets=LATENCY_BUCKETS,
+)
+DOCUMENTS = Counter(
+    "exam_documents_total",
+    "Documentos procesados según resultado (detected, undetected, no_text, cached, error)",
+    ["result"],
+)
+EXAMS_DETECTED = Counter("exam_detected_total", "Exámenes detectados por tipo", ["exam_type"])
+COMPONENTS_FOUND = Counter("exam_components_found_total", "Componentes extraídos por tipo de examen", ["exam_type"])
+PDF_PAGES = Counter("exam_pdf_pages_total", "Páginas de PDF procesadas")
+PDF_BYTES = Counter("exam_pdf_bytes_total", "Bytes de PDF recibidos para procesar")
+RESULT_RECORDS = Counter(
+    "exam_result_records_total",
+    "Registros de resultados persistidos según resultado (written, failed)",
+    ["result"],
+)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def mark_process_dead(pid: Optional[int] = None):
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(pid or os.getpid())
+
+
+def exposition() -> Tuple[bytes, str]:
+    """Texto de exposición; en modo multiproceso agrega los archivos de todos los workers."""
+    if multiprocess_enabled():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+
+
+def observe_exam_stage(stage: str, exam_type: str, seconds: float):
+    EXAM_TYPE_SECONDS.labels(stage=stage, exam_type=exam_type).observe(seconds)
+
+
+def record_document(result: str, pdf_bytes: int = 0):
+    DOCUMENTS.labels(result=result).inc()
+    if pdf_bytes:
+        PDF_BYTES.inc(pdf_bytes)
+
+
+def record_pipeline_result(result: Dict[str, Any]):
+    """
+    Registra lo medido dentro del proceso del pool (`run_exam_pipeline` devuelve
+    los tiempos en el resultado; el pool no comparte el registro del worker).
+    """
+    for stage, seconds in result.get("timings", {}).items():
+        observe_stage(stage, seconds)
+    for exam_type, seconds in result.get("extract_timings", {}).items():
+        observe_exam_stage("extract", exam_type, seconds)
+    PDF_PAGES.inc(result.get("pages", 0))
+    for exam in result.get("detected_types", []):
+        EXAMS_DETECTED.labels(exam_type=exam["name"]).inc()
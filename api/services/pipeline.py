@@ -0,0 +1,387 @@
+# services/pipeline.py
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+from fastapi import HTTPException
+from loguru import logger
+from config import Settings
+from services import metrics
+from services.exam_detector import MedicalExamDetector
+from services.result_extractor import ResultExtractor
+from utils.exam_segmenter import segment_exams
+from utils.ocr import engine_available, ocr_page
+from utils.profiling import profile_call
+from utils.table_parser import find_layouts
+from utils.text_extractors import iter_pdf_pages, read_pdf_pages, join_pages, extract_patient_data
+
+# Funciones y entradas de patrones que se guardan en el resumen de cada perfil
+PROFILE_TOP = 30
+
+# Instancias por proceso: cada worker del pool importa el módulo una vez
+_detector = MedicalExamDetector()
+_extractor = ResultExtractor()
+
+
+def run_exam_pipeline(pdf_source: Optional[Union[bytes, str, Path]], profile: bool = False, ocr: bool = False,
+                      shard_threshold: int = 0, check_pages: int = 0, page_texts: Optional[List[str]] = None,
+                      ocr_pages: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Etapas CPU del procesamiento: texto -> datos del paciente -> detección -> extracción.
+    Se ejecuta dentro de un proceso del pool; el resultado debe ser serializable.
+    `pdf_source` son los bytes del PDF o, para PDFs grandes, la ruta donde se volcó;
+    con `page_texts` no se vuelve a leer y puede ser None.
+    Con `profile` el resultado trae además "profile" (ver `utils.profiling.profile_call`).
+
+    Si el texto requiere más procesos, retorna solo lo pendiente para que
+    `ExamPipeline` lo reparta en el pool y vuelva a llamar con `page_texts`:
+    {"pending_shards": páginas} si el PDF tiene más de `shard_threshold`
+    páginas, o, con `ocr`, {"pending_ocr": {índice: huella}, "page_texts": [...]}
+    si hay páginas sin capa de texto. `ocr_pages` son las páginas de
+    `page_texts` que vienen del OCR.
+    Con `check_pages`, un documento sin indicadores médicos tras esa cantidad
+    de páginas con texto se descarta sin leer el resto (ver `_read_pages`).
+    """
+    if not profile:
+        return _run_stages(pdf_source, ocr, shard_threshold, check_pages, page_texts, ocr_pages)
+    result, profile_data = profile_call(
+        _run_stages, pdf_source, ocr, shard_threshold, check_pages, page_texts, ocr_pages, top=PROFILE_TOP
+    )
+    if result:
+        result["profile"] = profile_data
+    return result
+
+
+def extract_shard(pdf_source: Union[bytes, str, Path], first: int, last: int,
+                  ocr: bool = False) -> Optional[Dict[str, Any]]:
+    """Texto de las páginas [first, last) en un proceso del pool (PDFs sobre PDF_SHARD_THRESHOLD)"""
+    stats: Dict[str, Any] = {}
+    page_texts = read_pdf_pages(pdf_source, stats, first, last, hash_empty=ocr)
+    if page_texts is None:
+        return None
+    return {"page_texts": page_texts, "empty_pages": stats["empty_pages"]}
+
+
+def _read_pages(pdf_source: Union[bytes, str, Path], stats: Dict[str, Any], shard_threshold: int,
+                check_pages: int, ocr: bool = False) -> Optional[List[str]]:
+    """
+    Primera lectura del PDF, página a página. Con `check_pages` los indicadores
+    médicos se verifican a medida que se extrae cada página: si tras
+    `check_pages` páginas con texto el documento aún no es médico, se deja de
+    leer (stats["is_medical"] = False); una página sin texto antes de decidirlo
+    anula el descarte. Un PDF de más de `shard_threshold` páginas solo se lee
+    hasta decidirlo (stats["shard"]): el resto se extrae por tramos en el pool.
+    """
+    check = _detector.medical_check() if check_pages else None
+    page_texts: List[str] = []
+    text_pages = 0
+    try:
+        for text in iter_pdf_pages(pdf_source, stats, hash_empty=ocr):
+            deciding = check is not None and not check.is_medical
+            if not deciding and shard_threshold and stats["pages"] > shard_threshold:
+                stats["shard"] = True
+                break
+            page_texts.append(text)
+            if not deciding:
+                continue
+            if not text.strip():
+                # Página sin capa de texto: el OCR podría traer los indicadores
+                check = None
+                continue
+            text_pages += 1
+            check.feed(text.upper())
+            if not check.is_medical and text_pages >= check_pages:
+                stats["is_medical"] = False
+                break
+    except Exception as e:
+        logger.error(f"Error al extraer texto del PDF: {e}")
+        return None
+    if check is not None and check.is_medical:
+        stats["is_medical"] = True
+    return page_texts
+
+
+def _run_stages(pdf_source: Optional[Union[bytes, str, Path]], ocr: bool = False, shard_threshold: int = 0,
+                check_pages: int = 0, page_texts: Optional[List[str]] = None,
+                ocr_pages: Optional[List[int]] = None) -> Optional[Dict[str, Any]]:
+    timings: Dict[str, float] = {}
+    stats: Dict[str, Any] = {}
+
+    start = time.perf_counter()
+    if page_texts is None:
+        page_texts = _read_pages(pdf_source, stats, shard_threshold, check_pages, ocr)
+        if page_texts is None:
+            return None
+        if stats.get("shard"):
+            return {"pending_shards": stats["pages"]}
+        if ocr and stats["empty_pages"] and stats.get("is_medical") is not False:
+            return {"pending_ocr": stats["empty_pages"], "page_texts": page_texts, "pages": stats["pages"]}
+    text, page_offsets = join_pages(page_texts)
+    timings["text"] = time.perf_counter() - start
+    if not text.strip():
+        logger.warning("El PDF no contiene texto extraíble.")
+        return None
+
+    start = time.perf_counter()
+    patient_data = extract_patient_data(text)
+    timings["patient_data"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    detected_types, metadata = _detector.detect(text, stats.get("is_medical"))
+    timings["detect"] = time.perf_counter() - start
+    if len(page_texts) < stats.get("pages", 0):
+        # Descartado sin leer todas las páginas
+        metadata["pages_read"] = len(page_texts)
+    if ocr_pages:
+        # Páginas (desde 1) cuyo texto viene del OCR
+        metadata["ocr_pages"] = [index + 1 for index in ocr_pages]
+
+    # Cada examen se extrae solo de su tramo del documento
+    start = time.perf_counter()
+    spans = segment_exams(text, detected_types) if detected_types else {}
+    timings["segment"] = time.perf_counter() - start
+
+    results = {}
+    sections = {}
+    extract_timings = {}
+    line_starts = None
+    lines = text.split("\n")
+    text_upper = text.upper()
+    upper_lines = text_upper.split("\n")
+    # Filas de encabezado de las tablas del documento (una vez para todos los exámenes)
+    layouts = find_layouts(text_upper) if detected_types else []
+    for exam in detected_types:
+        start = time.perf_counter()
+        line_indexes: List[int] = []
+        results[exam["name"]] = _extractor.extract(
+            text, exam, line_indexes, spans.get(exam["name"]), lines, upper_lines, layouts
+        )
+        if line_indexes:
+            if line_starts is None:
+                line_starts = _line_starts(text)
+            sections[exam["name"]] = _line_span(text, line_starts, min(line_indexes), max(line_indexes))
+        extract_timings[exam["name"]] = time.perf_counter() - start
+    timings["extract"] = sum(extract_timings.values())
+
+    return {
+        "text": text,
+        "patient_data": patient_data,
+        "detected_types": detected_types,
+        "metadata": metadata,
+        "results": results,
+        # Por examen, [inicio, fin) en `text` de las líneas donde se encontraron sus componentes
+        "sections": sections,
+        # Medido aquí porque el registro de métricas del pool no es el del worker
+        "timings": timings,
+        "extract_timings": extract_timings,
+        "pages": len(page_texts),
+        # Posición en `text` donde empieza cada página
+        "page_offsets": page_offsets,
+    }
+
+
+def _line_starts(text: str) -> List[int]:
+    """Posición en `text` donde empieza cada línea (mismas líneas que text.split('\\n'))"""
+    starts = [0]
+    position = text.find("\n")
+    while position != -1:
+        starts.append(position + 1)
+        position = text.find("\n", position + 1)
+    return starts
+
+
+def _line_span(text: str, line_starts: List[int], first: int, last: int) -> List[int]:
+    end = line_starts[last + 1] - 1 if last + 1 < len(line_starts) else len(text)
+    return [line_starts[first], end]
+
+
+class ExamPipeline:
+    """
+    Ejecuta `run_exam_pipeline` en un ProcessPoolExecutor para no bloquear el
+    event loop. Admite como máximo MAX_CONCURRENT_REQUESTS documentos en curso
+    por worker de uvicorn; el resto espera PIPELINE_QUEUE_TIMEOUT y luego recibe 503.
+    Los PDFs de más de PDF_SHARD_THRESHOLD páginas se extraen por tramos en
+    paralelo y las páginas sin capa de texto se reconocen con OCR_ENGINE, una
+    tarea por página, en el mismo pool. Para esas tareas un PDF en memoria se
+    vuelca una vez a TEMP_DIR: cada tarea recibe la ruta y no una copia de los bytes.
+    """
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self.max_workers = self._pool_size(settings)
+        self.ocr_options: Optional[Dict[str, Any]] = None
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight: int = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    @staticmethod
+    def _pool_size(settings: Settings) -> int:
+        if settings.PIPELINE_WORKERS > 0:
+            return settings.PIPELINE_WORKERS
+        return max(1, multiprocessing.cpu_count() // max(1, settings.SERVER_WORKERS))
+
+    @staticmethod
+    def _ocr_options(settings: Settings) -> Optional[Dict[str, Any]]:
+        if not settings.OCR_ENGINE:
+            return None
+        if not engine_available(settings.OCR_ENGINE):
+            logger.warning(f"Motor OCR '{settings.OCR_ENGINE}' no disponible: los PDFs escaneados no se procesarán")
+            return None
+        return {
+            "engine": settings.OCR_ENGINE,
+            "language": settings.OCR_LANGUAGE,
+            "dpi": settings.OCR_DPI,
+            "cache_dir": settings.RESULTS_DIR / "ocr" if settings.OCR_CACHE else None,
+        }
+
+    def start(self):
+        if self.executor is None:
+            self.ocr_options = self._ocr_options(self.settings)
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            self._slots = asyncio.Semaphore(self.settings.MAX_CONCURRENT_REQUESTS)
+            logger.info(f"Pipeline iniciado con {self.max_workers} procesos")
+
+    def output_options(self) -> Dict[str, Any]:
+        """Configuración que cambia el resultado de un mismo PDF (va en la clave del caché)"""
+        self.start()
+        ocr = self.ocr_options
+        return {
+            "medical_check_pages": self.settings.MEDICAL_CHECK_PAGES,
+            "ocr": [ocr["engine"], ocr["language"], ocr["dpi"]] if ocr else None,
+        }
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+            logger.info("Pipeline detenido")
+
+    async def run(self, pdf_source: Union[bytes, str, Path], profile: bool = False,
+                  record_metrics: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        `profile` perfila la ejecución en el proceso del pool. `record_metrics=False`
+        no registra métricas (p. ej. al volver a procesar un PDF solo para perfilarlo).
+        """
+        self.start()
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.settings.PIPELINE_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy processing documents. Please try again later."
+            )
+        started_at = time.perf_counter()
+        if record_metrics:
+            metrics.observe_stage("queue_wait", started_at - queued_at)
+
+        self.in_flight += 1
+        try:
+            result = await asyncio.wait_for(
+                self._process(pdf_source, profile),
+                timeout=self.settings.PROCESS_TIMEOUT
+            )
+            if record_metrics:
+                metrics.observe_stage("pipeline", time.perf_counter() - started_at)
+                if result:
+                    metrics.record_pipeline_result(result)
+            return result
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Document processing timed out")
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    async def _process(self, pdf_source: Union[bytes, str, Path], profile: bool) -> Optional[Dict[str, Any]]:
+        loop = asyncio.get_event_loop()
+        ocr = self.ocr_options is not None
+        result = await loop.run_in_executor(
+            self.executor, run_exam_pipeline, pdf_source, profile, ocr,
+            self.settings.PDF_SHARD_THRESHOLD, self.settings.MEDICAL_CHECK_PAGES
+        )
+        if not result or ("pending_shards" not in result and "pending_ocr" not in result):
+            return result
+
+        timings: Dict[str, float] = {}
+        spilled = None
+        if isinstance(pdf_source, (bytes, bytearray)):
+            spilled = await loop.run_in_executor(None, self._spill, pdf_source)
+            pdf_source = spilled
+        try:
+            if "pending_shards" in result:
+                started = time.perf_counter()
+                shards = await self._extract_shards(pdf_source, result["pending_shards"], ocr)
+                if shards is None:
+                    return None
+                page_texts, empty_pages = shards
+                timings["text"] = time.perf_counter() - started
+            else:
+                page_texts, empty_pages = result["page_texts"], result["pending_ocr"]
+
+            ocr_pages = []
+            if ocr and empty_pages:
+                started = time.perf_counter()
+                await self._recognize_pages(pdf_source, empty_pages, page_texts)
+                ocr_pages = sorted(empty_pages)
+                timings["ocr"] = time.perf_counter() - started
+        finally:
+            if spilled:
+                self._remove_spill(spilled)
+
+        # Con `page_texts` el PDF ya no se lee: no se envía al pool
+        result = await loop.run_in_executor(
+            self.executor, run_exam_pipeline, None, profile, ocr, 0, 0, page_texts, ocr_pages
+        )
+        if result:
+            result["timings"].update(timings)
+        return result
+
+    def _spill(self, pdf_content: Union[bytes, bytearray]) -> str:
+        """Vuelca el PDF a TEMP_DIR para que las tareas del pool lo lean desde disco"""
+        self.settings.TEMP_DIR.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf", dir=self.settings.TEMP_DIR) as tmp:
+            tmp.write(pdf_content)
+        return tmp.name
+
+    @staticmethod
+    def _remove_spill(path: str):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.error(f"Error cleaning up {path}: {e}")
+
+    async def _extract_shards(self, pdf_source: Union[bytes, str, Path], pages: int, ocr: bool = False):
+        """Texto de un PDF grande por tramos de PDF_SHARD_PAGES páginas, en paralelo y en orden"""
+        loop = asyncio.get_event_loop()
+        size = max(1, self.settings.PDF_SHARD_PAGES)
+        shards = await asyncio.gather(*(
+            loop.run_in_executor(self.executor, extract_shard, pdf_source, first, min(first + size, pages), ocr)
+            for first in range(0, pages, size)
+        ))
+        if any(shard is None for shard in shards):
+            return None
+        page_texts: List[str] = []
+        empty_pages: Dict[int, Optional[str]] = {}
+        for shard in shards:
+            page_texts.extend(shard["page_texts"])
+            empty_pages.update(shard["empty_pages"])
+        return page_texts, empty_pages
+
+    async def _recognize_pages(self, pdf_source: Union[bytes, str, Path], empty_pages: Dict[int, Optional[str]],
+                               page_texts: List[str]):
+        """OCR de las páginas sin capa de texto, una tarea por página en el pool"""
+        loop = asyncio.get_event_loop()
+        texts = await asyncio.gather(
+            *(loop.run_in_executor(self.executor, ocr_page, pdf_source, index, key, self.ocr_options)
+              for index, key in empty_pages.items()),
+            return_exceptions=True
+        )
+        for index, text in zip(empty_pages, texts):
+            if isinstance(text, Exception):
+                logger.error(f"Error en OCR de la página {index + 1}: {text}")
+                text = ""
+            page_texts[index] = text
@@ -0,0 +1,63 @@
+# services/profile_store.py
+import json
+import random
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+from fastapi import Request
+from loguru import logger
+from config import Settings
+
+TRUE_VALUES = ("1", "true", "yes", "on")
+
+
+class ProfileStore:
+    """
+    Decide qué solicitudes se perfilan (cabecera PROFILE_HEADER, muestreo
+    PROFILE_SAMPLE_RATE o latencia sobre PROFILE_SLOW_THRESHOLD) y guarda cada
+    perfil en RESULTS_DIR/profiles: `<id>.prof` (cargable con pstats) y
+    `<id>.json` con el resumen y las entradas de patrones más costosas.
+    """
+
+    def __init__(self, settings: Settings):
+        self.directory: Path = settings.RESULTS_DIR / "profiles"
+        self.header = settings.PROFILE_HEADER
+        self.sample_rate = settings.PROFILE_SAMPLE_RATE
+        self.slow_threshold = settings.PROFILE_SLOW_THRESHOLD
+
+    def requested(self, request: Request) -> bool:
+        if not self.header:
+            return False
+        return request.headers.get(self.header, "").strip().lower() in TRUE_VALUES
+
+    def sampled(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def is_slow(self, seconds: float) -> bool:
+        return self.slow_threshold > 0 and seconds > self.slow_threshold
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def save(self, profile_id: str, profile: Dict[str, Any], name: Optional[str],
+             reason: str, latency: Optional[float] = None):
+        """Escribe el perfil devuelto por el pipeline (síncrono: usar como tarea de fondo)"""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / f"{profile_id}.prof", "wb") as f:
+                f.write(profile["stats"])
+            with open(self.directory / f"{profile_id}.json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "id": profile_id,
+                    "name": name,
+                    "reason": reason,
+                    "latency": latency,
+                    "pipeline_seconds": profile["seconds"],
+                    "patterns": profile["patterns"],
+                    "summary": profile["summary"],
+                }, f, ensure_ascii=False, indent=2)
+            logger.info(f"Perfil guardado: {profile_id} ({reason}, {name})")
+        except Exception as e:
+            logger.error(f"Error guardando perfil {profile_id}: {e}")
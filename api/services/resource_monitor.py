@@ -0,0 +1,71 @@
+# services/resource_monitor.py
+import asyncio
+import time
+from typing import NamedTuple, Optional
+import psutil
+from loguru import logger
+from config import Settings
+
+
+class ResourceSnapshot(NamedTuple):
+    rss: int                # RSS solo del worker (lo que se compara con MAX_MEMORY_USAGE)
+    children_rss: int       # RSS sumado de sus procesos hijos (pool del pipeline, OCR); solo informativo,
+                            # cuenta dos veces las páginas compartidas por copy-on-write
+    memory_percent: float
+    cpu_percent: float
+    available_memory: int
+    loop_lag: float         # segundos de retraso del event loop en el último intervalo
+    updated_at: float
+
+
+class ResourceMonitor:
+    """
+    Muestrea memoria, CPU y retraso del event loop cada RESOURCE_SAMPLE_INTERVAL
+    segundos en una tarea de fondo. Las decisiones de admisión y los endpoints
+    de métricas leen `snapshot` en vez de consultar psutil en cada solicitud.
+    """
+
+    def __init__(self, settings: Settings):
+        self.interval = settings.RESOURCE_SAMPLE_INTERVAL
+        self._process = psutil.Process()
+        self._task: Optional[asyncio.Task] = None
+        self.snapshot = self._sample(loop_lag=0.0)
+
+    def _sample(self, loop_lag: float) -> ResourceSnapshot:
+        rss = self._process.memory_info().rss
+        children_rss = 0
+        for child in self._process.children(recursive=True):
+            try:
+                children_rss += child.memory_info().rss
+            except psutil.Error:
+                continue  # el hijo terminó entre el listado y la lectura
+        return ResourceSnapshot(
+            rss=rss,
+            children_rss=children_rss,
+            memory_percent=self._process.memory_percent(),
+            cpu_percent=self._process.cpu_percent(),
+            available_memory=psutil.virtual_memory().available,
+            loop_lag=loop_lag,
+            updated_at=time.time(),
+        )
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            loop_lag = max(0.0, loop.time() - expected)
+            try:
+                # Listar hijos recorre /proc: se hace fuera del event loop
+                self.snapshot = await loop.run_in_executor(None, self._sample, loop_lag)
+            except Exception as e:
+                logger.error(f"Error muestreando recursos: {e}")
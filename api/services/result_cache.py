@@ -0,0 +1,175 @@
+# services/result_cache.py
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Set, Union
+from loguru import logger
+from config import Settings
+from utils.pattern_artifact import builder_version, get_patterns
+
+# Código que produce la respuesta a partir del PDF (rutas desde api/): si
+# cambia, las respuestas guardadas con la versión anterior dejan de servirse
+# aunque API_VERSION no cambie
+RESULT_MODULES = (
+    "services/pipeline.py",
+    "services/exam_detector.py",
+    "services/result_extractor.py",
+    "utils/document_index.py",
+    "utils/exam_segmenter.py",
+    "utils/table_parser.py",
+    "utils/text_extractors.py",
+    "utils/ocr.py",
+    "main.py",
+)
+
+
+def code_version() -> str:
+    """Huella del código de extracción: la del artefacto de patrones más RESULT_MODULES."""
+    digest = hashlib.sha256(builder_version().encode("ascii"))
+    api_dir = Path(__file__).resolve().parents[1]
+    for module in RESULT_MODULES:
+        digest.update((api_dir / module).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def approximate_size(value: Any) -> int:
+    """Tamaño aproximado en bytes de una respuesta (largo de sus strings más un costo fijo por elemento)"""
+    if isinstance(value, str):
+        return len(value) + 16
+    if isinstance(value, dict):
+        return 64 + sum(approximate_size(key) + approximate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(approximate_size(item) for item in value)
+    return 16
+
+
+class ResultCache:
+    """
+    Caché de respuestas por contenido: la clave es el hash de los bytes del PDF
+    más la versión de los patrones (utils.pattern_artifact), la de la API, la
+    huella del código de extracción (`code_version`) y la configuración que
+    cambia el resultado (ver `ExamPipeline.output_options`);
+    si cambia cualquiera, el caché anterior deja de usarse. Tiene un nivel en
+    memoria (LRU acotado a RESULT_CACHE_SIZE entradas y RESULT_CACHE_BYTES
+    bytes aproximados) y, opcionalmente, uno en disco bajo RESULTS_DIR/cache
+    compartido por todos los workers. El disco se lee y escribe en hilos
+    aparte, fuera del event loop.
+    """
+
+    def __init__(self, settings: Settings):
+        self.max_entries = settings.RESULT_CACHE_SIZE
+        self.max_bytes = settings.RESULT_CACHE_BYTES
+        self.disk_dir: Optional[Path] = settings.RESULTS_DIR / "cache" if settings.RESULT_CACHE_DISK else None
+        self.pattern_version = get_patterns().version
+        self.api_version = settings.API_VERSION
+        self.code_version = code_version()
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.memory_bytes = 0
+        self._pending_writes: Set[asyncio.Future] = set()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 or self.disk_dir is not None
+
+    def key_for(self, pdf_content: Union[bytes, bytearray], options: Optional[Dict[str, Any]] = None) -> str:
+        key = (f"{hashlib.sha256(pdf_content).hexdigest()}-{self.pattern_version}"
+               f"-{self.api_version}-{self.code_version}")
+        if options:
+            serialized = json.dumps(options, sort_keys=True, default=str)
+            key += "-" + hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:8]
+        return key
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return self._memory[key]
+
+        entry = None
+        if self.disk_dir is not None:
+            entry = await asyncio.get_running_loop().run_in_executor(None, self._read_disk, key)
+        if entry is not None:
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, entry)
+            return entry
+
+        self.misses += 1
+        return None
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Guarda en memoria y programa la escritura en disco (no la espera)."""
+        self._remember(key, response)
+        if self.disk_dir is not None:
+            future = asyncio.get_running_loop().run_in_executor(None, self._write_disk, key, response)
+            self._pending_writes.add(future)
+            future.add_done_callback(self._pending_writes.discard)
+
+    async def flush(self):
+        """Espera las escrituras en disco pendientes (al apagar y en pruebas)."""
+        if self._pending_writes:
+            await asyncio.gather(*list(self._pending_writes))
+
+    def _remember(self, key: str, response: Dict[str, Any]):
+        if self.max_entries <= 0:
+            return
+        size = approximate_size(response)
+        if self.max_bytes and size > self.max_bytes:
+            return
+        if key in self._memory:
+            self.memory_bytes -= self._sizes[key]
+        self._memory[key] = response
+        self._sizes[key] = size
+        self.memory_bytes += size
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries or (self.max_bytes and self.memory_bytes > self.max_bytes):
+            evicted, _ = self._memory.popitem(last=False)
+            self.memory_bytes -= self._sizes.pop(evicted)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / f"{key}.json"
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de caché ilegible {path}: {e}")
+            return None
+
+    def _write_disk(self, key: str, response: Dict[str, Any]):
+        path = self._disk_path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{id(response)}.tmp")
+        try:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(response, f, ensure_ascii=False)
+            # Reemplazo atómico: otro worker nunca lee un archivo a medio escribir
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error guardando caché {path}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+            "max_entries": self.max_entries,
+            "memory_bytes": self.memory_bytes,
+            "max_bytes": self.max_bytes,
+            "disk_enabled": self.disk_dir is not None,
+            "pattern_version": self.pattern_version,
+        }
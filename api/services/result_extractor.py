@@ -1,5 +1,8 @@
 from typing import List, Dict, Optional, Any
 import re
+import time
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
 from loguru import logger
 from exam_types.exam_patterns import EXAM_PATTERNS
 from exam_types.component_aliases import COMPONENT_ALIASES
@@ -12,89 +15,178 @@ from exam_types.result_patterns import (
     SECTION_BREAKS
 )
 from exam_types.methods_config import ANALYSIS_METHODS
+from utils.pattern_artifact import get_patterns
+from utils.profiling import active_timer
+from utils.exam_segmenter import LineRange
+from utils.table_parser import LayoutAt, find_layouts
+
+# Celda de valor en una tabla: número (coma o punto decimal) o resultado cualitativo
+NUMERIC_CELL = re.compile(r"\d+(?:[.,]\d+)?")
+QUALITATIVE_CELL = re.compile(RESULT_PATTERNS["qualitative"])
+DIGIT = re.compile(r"\d")
+NUMBER = re.compile(r'\d+[.,]?\d*')
+
+# Clasificadores de línea, unidades y métodos del artefacto de patrones
+PATTERNS = get_patterns()
+UNIT_TRIE = PATTERNS.unit_trie
+METHOD_LOOKUP = PATTERNS.method_lookup
+
+REFERENCE_REGEXES = [(ref_type, re.compile(pattern)) for ref_type, pattern in REFERENCE_PATTERNS.items()]
+
+
+def parse_reference(text: str):
+    """
+    Primer patrón de REFERENCE_PATTERNS presente en `text`: retorna el rango
+    (o None si es cualitativo) y el texto encontrado (None si no hay).
+    """
+    for ref_type, regex in REFERENCE_REGEXES:
+        ref_match = regex.search(text)
+        if ref_match:
+            ref_text = ref_match.group(0)
+            numbers = NUMBER.findall(ref_text)
+
+            if ref_type == "RANGO" and len(numbers) >= 2:
+                return {
+                    "tipo": "rango",
+                    "min": float(numbers[0].replace(',', '.')),
+                    "max": float(numbers[1].replace(',', '.'))
+                }, ref_text
+            elif ref_type in ["HASTA", "MENOR"]:
+                return {
+                    "tipo": "hasta",
+                    "max": float(numbers[0].replace(',', '.'))
+                }, ref_text
+            elif ref_type == "MAYOR":
+                return {
+                    "tipo": "mayor",
+                    "min": float(numbers[0].replace(',', '.'))
+                }, ref_text
+            return None, ref_text
+    return None, None
+
+
+@lru_cache(maxsize=1024)
+def _cell_reference(cell: str):
+    """`parse_reference` de una celda (las celdas se repiten entre filas y documentos)"""
+    return parse_reference(cell)
+
+
+@lru_cache(maxsize=1024)
+def _cell_unit(cell: str) -> Optional[str]:
+    """Unidad de una celda: la canónica de COMMON_UNITS, la celda tal cual si no trae números o None"""
+    unit = UNIT_TRIE.find(cell)
+    if unit is None and not DIGIT.search(cell):
+        return cell
+    return unit
+
+
+@lru_cache(maxsize=1024)
+def _cell_method(cell: str) -> Optional[str]:
+    return METHOD_LOOKUP.find(cell)
+
 
 class ResultExtractor:
-    def __init__(self):
+    def __init__(self, use_tables: bool = True):
         self.result_patterns = RESULT_PATTERNS
         self.reference_patterns = REFERENCE_PATTERNS
         self.common_units = COMMON_UNITS
         self.analysis_methods = ANALYSIS_METHODS
+        # Filas de tablas con encabezado reconocido se separan por columnas;
+        # False = siempre la cascada de regex por línea
+        self.use_tables = use_tables
 
     async def extract_exam_data(self, text: str, exam_type: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return self.extract(text, exam_type)
+
+    def extract(self, text: str, exam_type: Dict[str, Any],
+                line_indexes: Optional[List[int]] = None,
+                line_ranges: Optional[List[LineRange]] = None,
+                lines: Optional[List[str]] = None,
+                upper_lines: Optional[List[str]] = None,
+                layouts: Optional[List[LayoutAt]] = None) -> List[Dict[str, Any]]:
         """
         Extrae datos basándose en los componentes definidos para este tipo de examen.
+        Es síncrono para poder ejecutarse en un proceso aparte.
+        Si se pasa `line_indexes`, se agrega el número de línea de cada resultado.
+        Con `line_ranges` (de `segment_exams`) solo se recorren esas líneas;
+        `lines`/`upper_lines` evitan volver a dividir el texto en cada examen.
+        Las filas bajo un encabezado de tabla (`utils.table_parser`) se separan
+        por columnas; el resto, o la fila que no calza con su tabla, usa los
+        patrones por línea. `layouts` (de `find_layouts` sobre el documento)
+        evita buscar los encabezados en cada examen.
         """
         try:
             results = []
-            lines = text.split('\n')
-            
+            if lines is None:
+                lines = text.split('\n')
+            if upper_lines is None:
+                upper_lines = text.upper().split('\n')
+            if line_ranges is None:
+                line_ranges = [(0, len(lines) - 1)]
+            if not self.use_tables:
+                layouts = []
+            elif layouts is None:
+                layouts = find_layouts("\n".join(upper_lines))
+            header_lines = [line_index for line_index, _ in layouts]
+
             # Obtener solo los componentes de este tipo de examen
             exam_components = exam_type['patterns']['componentes']
-            logger.debug(f"Buscando componentes para {exam_type['name']}: {exam_components}")
-            
-            # Para cada línea
-            for line in lines:
-                line_upper = line.upper().strip()
-                
-                # Para cada componente definido en este tipo de examen
-                for component in exam_components:
-                    # Si encuentra el componente o uno de sus aliases
-                    if self._component_matches(line_upper, component):
+            logger.debug("Buscando componentes para {}: {}", exam_type['name'], exam_components)
+
+            # Una pasada por tramo asigna a cada línea sus componentes candidatos (en el orden del examen)
+            classifier = PATTERNS.line_classifier(tuple(exam_components))
+            timer = active_timer()
+            for first, last in line_ranges:
+                section_upper = "\n".join(upper_lines[first:last + 1])
+                # Encabezados dentro del tramo
+                layout_index = bisect_left(header_lines, first) - 1
+                layout_end = bisect_right(header_lines, last)
+                for relative_index, candidates, offsets in classifier.classify(section_upper):
+                    line_index = first + relative_index
+                    line = lines[line_index]
+                    # Formato de la tabla en curso: el del último encabezado antes de la línea
+                    while layout_index + 1 < layout_end and header_lines[layout_index + 1] < line_index:
+                        layout_index += 1
+                    if layout_index >= 0 and header_lines[layout_index] >= first:
+                        started = time.perf_counter() if timer else 0.0
+                        result = self._extract_table_row(line, layouts[layout_index][1].row(line), candidates)
+                        if timer:
+                            timer.add("TABLE_FORMATS", layouts[layout_index][1].format_name, time.perf_counter() - started)
+                        if result:
+                            results.append(result)
+                            if line_indexes is not None:
+                                line_indexes.append(line_index)
+                            continue
+                    for component in candidates:
                         # Procesar la línea y extraer datos
-                        result = self._extract_component_data(line, component)
+                        started = time.perf_counter() if timer else 0.0
+                        result = self._extract_component_data(line, component, offsets)
+                        if timer:
+                            timer.add("EXAM_PATTERNS", f"{exam_type['name']}:{component}", time.perf_counter() - started)
                         if result:
                             results.append(result)
-                            break  
-            
+                            if line_indexes is not None:
+                                line_indexes.append(line_index)
+                            break
+
             return results
             
         except Exception as e:
             logger.error(f"Error en extract_exam_data: {str(e)}")
             return []
 
-    def _component_matches(self, line: str, component: str) -> bool:
-        """
-        Verifica si el componente o sus aliases están en la línea.
-        """
-        # Verificar componente principal
-        if re.search(rf"\b{re.escape(component)}\b", line):
-            return True
-            
-        # Verificar aliases si existen
-        if component in COMPONENT_ALIASES:
-            for alias in COMPONENT_ALIASES[component]:
-                if re.search(rf"\b{re.escape(alias)}\b", line):
-                    return True
-                    
-        return False
-
     def _extract_exact_unit(self, text: str) -> Optional[str]:
         """
         Extrae la unidad y la normaliza al formato estándar definido en COMMON_UNITS.
         """
-        # Convertir el texto a una lista de palabras manteniendo los /
-        words = text.replace('/',' / ').split()
-        
-        # Reconstruir posibles unidades del texto
-        for i in range(len(words)):
-            for j in range(i + 1, len(words) + 1):
-                # Reconstruir la unidad potencial
-                potential_unit = ''.join(words[i:j]).replace(' ', '')
-                
-                # Buscar esta unidad en COMMON_UNITS
-                for category, units in self.common_units.items():
-                    for standard_unit in units:
-                        # Comparación insensible a mayúsculas/minúsculas
-                        if potential_unit.upper() == standard_unit.upper():
-                            # Retornar la unidad en el formato estándar de COMMON_UNITS
-                            return standard_unit
-        
-        return None
+        return UNIT_TRIE.find(text)
 
-    def _find_complete_component_name(self, line: str, component: str) -> str:
+    def _find_complete_component_name(self, line: str, component: str,
+                                      offsets: Optional[Dict[str, int]] = None) -> str:
         """
         Encuentra el nombre completo del componente de manera flexible.
         Mantiene la flexibilidad pero evita incluir palabras clave del documento.
+        `offsets` trae la primera posición de cada literal en la línea, si ya se conoce.
         """
         line_upper = line.upper()
         common_keywords = [" METODO:", " MÉTODO:", " VALOR:", " RESULTADO:", " MUESTRA:"]
@@ -103,7 +195,7 @@ class ResultExtractor:
         matches = []
         
         # 1. Buscar componente base y extensiones
-        start_idx = line_upper.find(component)
+        start_idx = offsets.get(component, -1) if offsets is not None else line_upper.find(component)
         if start_idx >= 0:
             next_content = line_upper[start_idx:]
             
@@ -146,7 +238,7 @@ class ResultExtractor:
         # 2. Buscar en aliases (mantener la misma lógica para aliases)
         if component in COMPONENT_ALIASES:
             for alias in COMPONENT_ALIASES[component]:
-                start_idx = line_upper.find(alias)
+                start_idx = offsets.get(alias, -1) if offsets is not None else line_upper.find(alias)
                 if start_idx >= 0:
                     next_content = line_upper[start_idx:]
                     # Aplicar la misma lógica que arriba...
@@ -179,7 +271,8 @@ class ResultExtractor:
         return max(matches, key=len) if matches else component
 
 
-    def _extract_component_data(self, line: str, component: str) -> Optional[Dict[str, Any]]:
+    def _extract_component_data(self, line: str, component: str,
+                                offsets: Optional[Dict[str, int]] = None) -> Optional[Dict[str, Any]]:
         """
         Extrae información del componente usando los patrones predefinidos.
         """
@@ -198,7 +291,7 @@ class ResultExtractor:
             }
 
             # 1. Extraer el nombre del componente
-            result["componente"] = self._find_complete_component_name(line, component)
+            result["componente"] = self._find_complete_component_name(line, component, offsets)
             if not result["componente"]:
                 return None
 
@@ -226,30 +319,10 @@ class ResultExtractor:
                         remaining_text = remaining_text.replace(exact_unit.upper(), '', 1).strip()
 
             # 4. Extraer rango de referencia
-            for ref_type, pattern in self.reference_patterns.items():
-                ref_match = re.search(pattern, remaining_text)
-                if ref_match:
-                    ref_text = ref_match.group(0)
-                    numbers = re.findall(r'\d+[.,]?\d*', ref_text)
-                    
-                    if ref_type == "RANGO" and len(numbers) >= 2:
-                        result["rango_referencia"] = {
-                            "tipo": "rango",
-                            "min": float(numbers[0].replace(',', '.')),
-                            "max": float(numbers[1].replace(',', '.'))
-                        }
-                    elif ref_type in ["HASTA", "MENOR"]:
-                        result["rango_referencia"] = {
-                            "tipo": "hasta",
-                            "max": float(numbers[0].replace(',', '.'))
-                        }
-                    elif ref_type == "MAYOR":
-                        result["rango_referencia"] = {
-                            "tipo": "mayor",
-                            "min": float(numbers[0].replace(',', '.'))
-                        }
-                    remaining_text = remaining_text.replace(ref_text, '', 1).strip()
-                    break
+            reference, ref_text = self._parse_reference(remaining_text)
+            if ref_text is not None:
+                result["rango_referencia"] = reference
+                remaining_text = remaining_text.replace(ref_text, '', 1).strip()
 
             # 5. Extraer método
             # Primero buscar después de "METODO:" o "MÉTODO:"
@@ -263,13 +336,7 @@ class ResultExtractor:
             
             # Si no se encontró después de "METODO:", buscar en el texto restante
             if not result["metodo"]:
-                for category, methods in self.analysis_methods.items():
-                    for method in methods:
-                        if method in remaining_text:
-                            result["metodo"] = method
-                            break
-                    if result["metodo"]:
-                        break
+                result["metodo"] = METHOD_LOOKUP.find(remaining_text)
 
             # Validar que tenemos al menos un valor
             if not result["valor"]:
@@ -279,4 +346,67 @@ class ResultExtractor:
 
         except Exception as e:
             logger.error(f"Error extrayendo datos del componente {component}: {str(e)}")
-            return None
\ No newline at end of file
+            return None
+
+    def _parse_reference(self, text: str):
+        return parse_reference(text)
+
+    def _extract_table_row(self, line: str, fields: Optional[Dict[str, str]],
+                           candidates: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de una fila de tabla ya separada por columnas (`TableLayout.row`).
+        Retorna None si la fila no calza con la tabla (sin componente del examen
+        en su celda, valor que no es número ni cualitativo o unidad desalineada)
+        para que se procese con los patrones por línea.
+        """
+        if not fields:
+            return None
+        name = fields.get("componente", "").upper()
+        component = None
+        for candidate in candidates:
+            if any(literal in name for literal in PATTERNS.literals_of(candidate)):
+                component = candidate
+                break
+        if component is None:
+            return None
+
+        value = fields.get("valor", "").upper()
+        unit = None
+        if NUMERIC_CELL.fullmatch(value):
+            value_type = "numeric"
+            value = value.replace(',', '.')
+            unit_cell = fields.get("unidad", "")
+            if unit_cell:
+                unit = _cell_unit(unit_cell.upper())
+                # Una "unidad" con números desconocida suele ser la referencia corrida
+                if unit is None:
+                    return None
+        elif QUALITATIVE_CELL.fullmatch(value):
+            value_type = "qualitative"
+        else:
+            return None
+
+        # Sin referencia, la celda siguiente a la unidad suele ser el método
+        leftovers = []
+        reference = None
+        if fields.get("referencia"):
+            reference, ref_text = _cell_reference(fields["referencia"].upper())
+            if ref_text is None:
+                leftovers.append(fields["referencia"])
+            elif reference is not None:
+                reference = dict(reference)
+
+        method = None
+        leftovers.extend(fields[key] for key in ("metodo", "extra") if fields.get(key))
+        if leftovers:
+            method = _cell_method(" ".join(leftovers).upper())
+
+        return {
+            "componente": name,
+            "linea_original": line.strip(),
+            "valor": value,
+            "tipo_resultado": value_type,
+            "unidad": unit,
+            "rango_referencia": reference,
+            "metodo": method
+        }
@@ -0,0 +1,477 @@
+# services/result_store.py
+import asyncio
+import fcntl
+import json
+import os
+import sqlite3
+import re
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import psutil
+from loguru import logger
+from config import Settings
+from services import metrics
+
+try:
+    # Opcional: orjson serializa varias veces más rápido que json
+    import orjson
+except ImportError:
+    orjson = None
+
+SEGMENT_ACTIVE = "active"
+SEGMENT_CLOSED = "closed"
+
+# Campos de cada componente que se guardan (el resto de la extracción no se persiste)
+COMPONENT_FIELDS = ("componente", "valor", "unidad", "rango_referencia", "metodo")
+
+
+def dumps_line(record: Dict[str, Any]) -> bytes:
+    """Registro en JSON compacto, una línea terminada en \\n"""
+    if orjson is not None:
+        return orjson.dumps(record, default=str) + b"\n"
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def loads_line(line: bytes) -> Dict[str, Any]:
+    if orjson is not None:
+        return orjson.loads(line)
+    return json.loads(line)
+
+
+def normalize_rut(rut: Optional[str]) -> Optional[str]:
+    """12.345.678-k -> 12345678-K"""
+    if not rut:
+        return None
+    return rut.replace(".", "").replace(" ", "").upper()
+
+
+# Fechas que envía el cliente: AAAA-MM-DD (o con hora), AAAA/MM/DD y DD/MM/AAAA,
+# DD-MM-AAAA o DD.MM.AAAA (también con año de dos dígitos)
+_YEAR_FIRST = re.compile(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:$|[T\s])")
+_DAY_FIRST = re.compile(r"(\d{1,2})[-/.](\d{1,2})[-/.](\d{4}|\d{2})(?:$|\s)")
+
+
+def normalize_date(value: Optional[str], saved_at: float) -> str:
+    """
+    Fecha del documento como AAAA-MM-DD, que es como la comparan los filtros
+    por rango del índice. Si falta o no se reconoce, la fecha de `saved_at`.
+    """
+    text = str(value or "").strip()
+    match = _YEAR_FIRST.match(text)
+    if match:
+        year, month, day = match.groups()
+    else:
+        match = _DAY_FIRST.match(text)
+        day, month, year = match.groups() if match else (0, 0, 0)
+        if len(str(year)) == 2:
+            year = f"20{year}"
+    try:
+        return date(int(year), int(month), int(day)).isoformat()
+    except ValueError:
+        if text:
+            logger.warning(f"Fecha de documento no reconocida: {text!r}; se usa la de guardado")
+        return time.strftime("%Y-%m-%d", time.localtime(saved_at))
+
+
+class ResultStore:
+    """
+    Almacén de resultados en RESULTS_DIR/records, solo de anexado:
+
+    - Segmentos JSONL (`seg-<inicio>-<pid>-<n>.jsonl`). Cada proceso escribe
+      solo en su segmento activo, que rota al superar RESULT_SEGMENT_SIZE.
+      Por documento hay una línea "document" (datos del paciente y texto, una
+      sola vez) y una línea "exam" por examen con sus componentes.
+    - Índice SQLite (index.sqlite3, WAL, compartido entre workers) con la
+      posición de cada línea, por RUT, tipo de examen y fecha. Los datos se
+      escriben (y fsync) antes de confirmar el índice: nunca apunta a nada que
+      no esté en disco.
+    - Compactación: reescribe los segmentos cerrados con espacio muerto
+      (documentos reprocesados) o pequeños en segmentos nuevos y borra los viejos.
+    """
+
+    def __init__(self, settings: Settings):
+        self.directory: Path = settings.RESULTS_DIR / "records"
+        self.segment_size = settings.RESULT_SEGMENT_SIZE
+        self.fsync = settings.RESULT_FSYNC
+        self._lock = threading.Lock()
+        self._started = int(time.time())
+        self._sequence = 0
+        self._segment: Optional[str] = None
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def open(self):
+        """Crea el directorio y abre el índice (al iniciar el worker, no al importar)"""
+        with self._lock:
+            if self._connection is None:
+                self._connection = self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        connection = sqlite3.connect(
+            str(self.directory / "index.sqlite3"), timeout=30, check_same_thread=False
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(
+            "CREATE TABLE IF NOT EXISTS segments ("
+            "name TEXT PRIMARY KEY, pid INTEGER, state TEXT NOT NULL, size INTEGER NOT NULL DEFAULT 0);"
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id TEXT PRIMARY KEY, name TEXT, rut TEXT, date TEXT, saved_at REAL, "
+            "segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS exams ("
+            "document TEXT NOT NULL, rut TEXT, exam_type TEXT NOT NULL, date TEXT, saved_at REAL, "
+            "segment TEXT NOT NULL, offset INTEGER NOT NULL, length INTEGER NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS exams_by_rut ON exams (rut, date);"
+            "CREATE INDEX IF NOT EXISTS exams_by_type ON exams (exam_type, date);"
+            "CREATE INDEX IF NOT EXISTS exams_by_document ON exams (document);"
+            "CREATE INDEX IF NOT EXISTS exams_by_segment ON exams (segment);"
+            "CREATE INDEX IF NOT EXISTS documents_by_segment ON documents (segment);"
+        )
+        connection.commit()
+        return connection
+
+    # Escritura
+
+    def append(self, records: List[Dict[str, Any]]):
+        """Anexa un lote de documentos (ver `build_result_record` en main.py)"""
+        self.open()
+        lines: List[Tuple[str, Dict[str, Any], bytes]] = []
+        for record in records:
+            rut = normalize_rut(record["patient_data"].get("rut"))
+            document = {key: value for key, value in record.items() if key != "exams"}
+            lines.append(("document", document, dumps_line({"kind": "document", **document})))
+            for exam in record["exams"]:
+                row = {
+                    "kind": "exam",
+                    "document": record["id"],
+                    "rut": rut,
+                    "date": record["date"],
+                    "exam_type": exam["type"],
+                    "confidence": exam["confidence"],
+                    "components": [
+                        {field: component.get(field) for field in COMPONENT_FIELDS}
+                        for component in exam["data"]
+                    ],
+                }
+                lines.append(("exam", row, dumps_line(row)))
+
+        with self._lock:
+            segment, offset = self._segment_for(sum(len(line) for _, _, line in lines))
+            self._write(segment, b"".join(line for _, _, line in lines))
+
+            # Posiciones dentro del segmento, en el mismo orden en que se escribieron
+            documents, exams = [], []
+            for kind, row, line in lines:
+                if kind == "document":
+                    documents.append((
+                        row["id"], row["name"], normalize_rut(row["patient_data"].get("rut")),
+                        row["date"], row["saved_at"], segment, offset, len(line)
+                    ))
+                else:
+                    exams.append((
+                        row["document"], row["rut"], row["exam_type"], row["date"],
+                        documents[-1][4], segment, offset, len(line)
+                    ))
+                offset += len(line)
+
+            with self._connection:
+                # Un PDF reprocesado reemplaza su versión anterior (queda como espacio muerto)
+                ids = [(row[0],) for row in documents]
+                self._connection.executemany("DELETE FROM documents WHERE id = ?", ids)
+                self._connection.executemany("DELETE FROM exams WHERE document = ?", ids)
+                self._connection.executemany("INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?)", documents)
+                self._connection.executemany("INSERT INTO exams VALUES (?, ?, ?, ?, ?, ?, ?, ?)", exams)
+                self._connection.execute("UPDATE segments SET size = ? WHERE name = ?", (offset, segment))
+
+    def _segment_for(self, length: int) -> Tuple[str, int]:
+        """Segmento activo de este proceso y su tamaño actual; rota si no cabe el lote"""
+        if self._segment is not None:
+            size = (self.directory / self._segment).stat().st_size
+            if size == 0 or size + length <= self.segment_size:
+                return self._segment, size
+            with self._connection:
+                self._connection.execute(
+                    "UPDATE segments SET state = ? WHERE name = ?", (SEGMENT_CLOSED, self._segment)
+                )
+
+        self._sequence += 1
+        self._segment = f"seg-{self._started}-{os.getpid()}-{self._sequence:04d}.jsonl"
+        (self.directory / self._segment).touch()
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO segments (name, pid, state) VALUES (?, ?, ?)",
+                (self._segment, os.getpid(), SEGMENT_ACTIVE)
+            )
+        return self._segment, 0
+
+    def _write(self, segment: str, payload: bytes):
+        fd = os.open(str(self.directory / segment), os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, payload)
+            if self.fsync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def close(self):
+        """Cierra el segmento activo (al apagar el worker)"""
+        with self._lock:
+            if self._segment is not None and self._connection is not None:
+                with self._connection:
+                    self._connection.execute(
+                        "UPDATE segments SET state = ? WHERE name = ?", (SEGMENT_CLOSED, self._segment)
+                    )
+                self._segment = None
+
+    # Lectura
+
+    def history(self, rut: str, exam_type: Optional[str] = None, date_from: Optional[str] = None,
+                date_to: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Exámenes de un paciente, del más reciente al más antiguo"""
+        return self.query(rut=rut, exam_type=exam_type, date_from=date_from, date_to=date_to, limit=limit)
+
+    def query(self, rut: Optional[str] = None, exam_type: Optional[str] = None,
+              date_from: Optional[str] = None, date_to: Optional[str] = None,
+              limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Búsqueda por RUT y/o tipo de examen con rango de fechas (inclusive; las
+        fechas se comparan como texto, formato AAAA-MM-DD).
+        """
+        self.open()
+        conditions, params = [], []
+        for column, operator, value in (
+            ("e.rut", "=", normalize_rut(rut)), ("e.exam_type", "=", exam_type),
+            ("e.date", ">=", date_from), ("e.date", "<=", date_to),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (
+            "SELECT e.segment, e.offset, e.length, d.name FROM exams e JOIN documents d ON d.id = e.document "
+            f"{where} ORDER BY e.date DESC, e.saved_at DESC LIMIT ?"
+        )
+
+        # Si una compactación movió las líneas entre la consulta y la lectura, se reintenta
+        for attempt in range(3):
+            with self._lock:
+                rows = self._connection.execute(query, tuple(params) + (limit,)).fetchall()
+            try:
+                lines = self._read_lines([(segment, offset, length) for segment, offset, length, _ in rows])
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+        results = []
+        for (_, _, _, name), line in zip(rows, lines):
+            row = loads_line(line)
+            row.pop("kind", None)
+            row["name"] = name
+            results.append(row)
+        return results
+
+    def _read_lines(self, positions: Iterable[Tuple[str, int, int]]) -> List[bytes]:
+        positions = list(positions)
+        lines: List[Optional[bytes]] = [None] * len(positions)
+        by_segment: Dict[str, List[int]] = {}
+        for index, (segment, _, _) in enumerate(positions):
+            by_segment.setdefault(segment, []).append(index)
+        for segment, indexes in by_segment.items():
+            with open(self.directory / segment, "rb") as f:
+                for index in sorted(indexes, key=lambda i: positions[i][1]):
+                    _, offset, length = positions[index]
+                    f.seek(offset)
+                    lines[index] = f.read(length)
+        return lines
+
+    def stats(self) -> Dict[str, Any]:
+        if self._connection is None:
+            return {"segments": 0, "bytes": 0, "documents": 0, "exams": 0}
+        with self._lock:
+            segments, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM segments").fetchone()
+            documents = self._connection.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            exams = self._connection.execute("SELECT COUNT(*) FROM exams").fetchone()[0]
+        return {"segments": segments, "bytes": size, "documents": documents, "exams": exams}
+
+    # Compactación
+
+    def compact(self) -> int:
+        """
+        Reescribe los segmentos cerrados (o de procesos que ya no existen) que
+        tienen espacio muerto o ocupan menos de la mitad de RESULT_SEGMENT_SIZE.
+        Un solo proceso compacta a la vez (flock). Devuelve los bytes liberados.
+        """
+        self.open()
+        lock_fd = os.open(str(self.directory / "compact.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return 0
+            return self._compact()
+        finally:
+            os.close(lock_fd)
+
+    def _compact(self) -> int:
+        with self._lock:
+            segments = self._connection.execute("SELECT name, pid, state, size FROM segments").fetchall()
+            live = dict(self._connection.execute(
+                "SELECT segment, SUM(length) FROM ("
+                "SELECT segment, length FROM documents UNION ALL SELECT segment, length FROM exams"
+                ") GROUP BY segment"
+            ).fetchall())
+        candidates = [
+            name for name, pid, state, size in segments
+            if name != self._segment
+            and (state == SEGMENT_CLOSED or not psutil.pid_exists(pid))
+            and (live.get(name, 0) < size or size < self.segment_size // 2)
+        ]
+        # Un solo segmento pequeño y sin espacio muerto no gana nada al reescribirse
+        if len(candidates) < 2 and not any(live.get(name, 0) < size for name, _, _, size in segments if name in candidates):
+            return 0
+
+        before = sum(size for name, _, _, size in segments if name in candidates)
+        written = 0
+        target: List[Any] = [None, 0]  # segmento de destino de esta compactación y su tamaño
+        for segment in candidates:
+            written += self._rewrite(segment, target)
+        logger.info(f"Compactación de resultados: {len(candidates)} segmentos, {before - written} bytes liberados")
+        return before - written
+
+    def _rewrite(self, segment: str, target: List[Any]) -> int:
+        """Copia las líneas vivas de `segment` a `target` (nombre, tamaño) y lo borra"""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT 'documents', rowid, offset, length FROM documents WHERE segment = ? "
+                "UNION ALL SELECT 'exams', rowid, offset, length FROM exams WHERE segment = ? ORDER BY 3",
+                (segment, segment)
+            ).fetchall()
+            lines = self._read_lines([(segment, offset, length) for _, _, offset, length in rows]) if rows else []
+            payload = b"".join(lines)
+
+            offset = 0
+            if payload:
+                if target[0] is None or target[1] + len(payload) > self.segment_size:
+                    target[:] = [self._new_compaction_segment(), 0]
+                offset = target[1]
+                self._write(target[0], payload)
+            with self._connection:
+                for (table, rowid, old_offset, length) in rows:
+                    # Si el documento se reemplazó mientras tanto, la fila ya no existe
+                    self._connection.execute(
+                        f"UPDATE {table} SET segment = ?, offset = ? WHERE rowid = ? AND segment = ? AND offset = ?",
+                        (target[0], offset, rowid, segment, old_offset)
+                    )
+                    offset += length
+                if payload:
+                    target[1] = offset
+                    self._connection.execute("UPDATE segments SET size = ? WHERE name = ?", (offset, target[0]))
+                self._connection.execute("DELETE FROM segments WHERE name = ?", (segment,))
+        try:
+            os.unlink(self.directory / segment)
+        except FileNotFoundError:
+            pass
+        return len(payload)
+
+    def _new_compaction_segment(self) -> str:
+        """Segmento nuevo (cerrado desde el inicio) donde escribe una compactación"""
+        self._sequence += 1
+        name = f"cseg-{int(time.time())}-{os.getpid()}-{self._sequence:04d}.jsonl"
+        (self.directory / name).touch()
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO segments (name, pid, state) VALUES (?, ?, ?)", (name, os.getpid(), SEGMENT_CLOSED)
+            )
+        return name
+
+
+class ResultWriter:
+    """
+    Persistencia fuera del camino de la solicitud: `submit` solo encola el
+    registro del documento y una tarea de fondo lo anexa al ResultStore por
+    lotes (hasta RESULT_WRITE_BATCH registros, un write y un fsync por lote).
+    Con la cola llena (RESULT_WRITE_QUEUE_SIZE) `submit` espera: si el disco
+    no da abasto se frenan las solicitudes en vez de perder resultados.
+    Otra tarea compacta el almacén cada RESULT_COMPACT_INTERVAL segundos.
+    """
+
+    def __init__(self, settings: Settings, store: ResultStore):
+        self.store = store
+        self.queue_size = settings.RESULT_WRITE_QUEUE_SIZE
+        self.batch_size = max(1, settings.RESULT_WRITE_BATCH)
+        self.compact_interval = settings.RESULT_COMPACT_INTERVAL
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._compact_task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.failed = 0
+
+    def start(self):
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.ensure_future(self._run())
+        if self._compact_task is None and self.compact_interval > 0:
+            self._compact_task = asyncio.ensure_future(self._compact_periodically())
+
+    async def close(self):
+        """Escribe lo pendiente y detiene las tareas de fondo"""
+        if self._compact_task is not None:
+            self._compact_task.cancel()
+            self._compact_task = None
+        if self._task is None:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+        self.store.close()
+
+    async def submit(self, record: Dict[str, Any]):
+        """Encola un registro sin esperar al disco; con la cola llena espera un lugar."""
+        self.start()
+        await self._queue.put(record)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "failed": self.failed,
+        }
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        stopping = False
+        while not stopping:
+            batch: List[Dict[str, Any]] = []
+            record = await self._queue.get()
+            # Se agrupa lo que ya está en la cola, sin esperar a que se llene el lote
+            while True:
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size or self._queue.empty():
+                    break
+                record = self._queue.get_nowait()
+            if not batch:
+                continue
+            started = time.perf_counter()
+            try:
+                await loop.run_in_executor(None, self.store.append, batch)
+                self.written += len(batch)
+                metrics.RESULT_RECORDS.labels(result="written").inc(len(batch))
+            except Exception as e:
+                self.failed += len(batch)
+                metrics.RESULT_RECORDS.labels(result="failed").inc(len(batch))
+                logger.error(f"Error guardando {len(batch)} resultados: {e}")
+            metrics.observe_stage("persist", time.perf_counter() - started)
+
+    async def _compact_periodically(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            await asyncio.sleep(self.compact_interval)
+            try:
+                await loop.run_in_executor(None, self.store.compact)
+            except Exception as e:
+                logger.error(f"Error compactando resultados: {e}")
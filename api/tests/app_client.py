@@ -0,0 +1,36 @@
+# tests/app_client.py
+# Cliente de pruebas de la app (main.py) con directorios temporales y backends
+# de un solo proceso. Se configura antes de importar main: `app_client()` debe
+# usarse en vez de importar main directamente.
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+from starlette.testclient import TestClient
+
+_TMP = Path(tempfile.mkdtemp(prefix="api-test-"))
+TEST_ENVIRONMENT = {
+    "RESULTS_DIR": str(_TMP / "results"),
+    "TEMP_DIR": str(_TMP / "temp"),
+    "LOG_FILE": str(_TMP / "logs" / "api.log"),
+    "RATE_LIMIT_BACKEND": "memory",
+    "JOB_STORE": "memory",
+    "PIPELINE_WORKERS": "2",
+}
+
+
+def load_app():
+    """Importa main con la configuración de prueba (una sola vez por proceso)."""
+    os.environ.update(TEST_ENVIRONMENT)
+    from config import get_settings
+    if get_settings().RESULTS_DIR != Path(TEST_ENVIRONMENT["RESULTS_DIR"]):
+        get_settings.cache_clear()
+    import main
+    return main
+
+
+def app_client() -> TestClient:
+    # El TestClient de Starlette usa el loop actual; `asyncio.run` de otras pruebas lo deja cerrado
+    asyncio.set_event_loop(asyncio.new_event_loop())
+    return TestClient(load_app().app)
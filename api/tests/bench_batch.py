@@ -0,0 +1,56 @@
+# tests/bench_batch.py
+# Con la API corriendo (python main.py): python tests/bench_batch.py [documentos]
+import base64
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import requests
+
+from synthetic_reports import generate_pdf, generate_report
+
+API_URL = "http://localhost:8000"
+
+
+def build_items(seeds: range) -> list:
+    # Semillas distintas en cada modo para que el caché de resultados no influya
+    return [
+        {"name": f"bench_{seed}", "content": base64.b64encode(generate_pdf(generate_report(seed))).decode()}
+        for seed in seeds
+    ]
+
+
+def run_single(items: list) -> float:
+    start = time.perf_counter()
+    with requests.Session() as session:
+        for item in items:
+            session.post(f"{API_URL}/classify-exam/", json={"pdf_data": item}, timeout=600).raise_for_status()
+    return time.perf_counter() - start
+
+
+def run_batch(items: list) -> float:
+    start = time.perf_counter()
+    statuses = {}
+    with requests.post(f"{API_URL}/classify-exams/batch", json={"pdf_data": items}, stream=True, timeout=3600) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                status = json.loads(line)["status"]
+                statuses[status] = statuses.get(status, 0) + 1
+    elapsed = time.perf_counter() - start
+    print(f"  estados del lote: {statuses}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+
+    single = run_single(build_items(range(documents)))
+    print(f"{documents} llamadas individuales: {single:.1f}s ({documents / single:.1f} docs/s)")
+
+    batch = run_batch(build_items(range(documents, 2 * documents)))
+    print(f"1 lote de {documents}: {batch:.1f}s ({documents / batch:.1f} docs/s), {single / batch:.2f}x")
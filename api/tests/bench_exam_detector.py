@@ -0,0 +1,46 @@
+# tests/bench_exam_detector.py
+# python tests/bench_exam_detector.py  (o python -m tests.bench_exam_detector, desde api/)
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from legacy_extraction import legacy_detect
+from synthetic_reports import generate_report
+from services.exam_detector import MedicalExamDetector
+
+
+def bench(reports, rounds: int = 3):
+    detector = MedicalExamDetector()
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy = [legacy_detect(text) for text in reports]
+    legacy_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        current = []
+        for text in reports:
+            detected, _ = asyncio.run(detector.detect_medical_exam(text))
+            current.append([(e["name"], e["found"]["nombres"], e["found"]["componentes"]) for e in detected])
+    current_time = (time.perf_counter() - start) / rounds
+
+    assert legacy == current, "Las detecciones difieren de la implementación original"
+    return legacy_time, current_time
+
+
+if __name__ == "__main__":
+    logger.remove()
+    for pages in (1, 5, 20):
+        reports = [generate_report(seed, pages=pages) for seed in range(10)]
+        legacy_time, current_time = bench(reports)
+        print(f"{pages:>3} pág. x {len(reports)} informes | "
+              f"original: {legacy_time * 1000:8.1f} ms | "
+              f"autómata: {current_time * 1000:8.1f} ms | "
+              f"speedup: {legacy_time / current_time:5.1f}x")
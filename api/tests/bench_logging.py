@@ -0,0 +1,56 @@
+# tests/bench_logging.py
+# python tests/bench_logging.py  (o python -m tests.bench_logging, desde api/)
+# Latencia del pipeline de un documento según la configuración de logging
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from synthetic_reports import generate_pdf, generate_report
+from config import get_settings
+from services.pipeline import run_exam_pipeline
+from utils.log_config import configure_logging
+
+ROUNDS = 30
+
+
+def measure(pdf: bytes) -> list:
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        run_exam_pipeline(pdf)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def run(label: str, pdf: bytes, log_file: Path, **overrides):
+    settings = get_settings().copy(update={"LOG_FILE": log_file, **overrides})
+    if overrides.get("LOG_LEVEL") == "OFF":
+        logger.remove()
+    else:
+        configure_logging(settings)
+    measure(pdf)  # calentamiento
+    latencies = measure(pdf)
+    logger.complete()
+    logger.remove()
+    size = log_file.stat().st_size if log_file.exists() else 0
+    print(f"{label:<36} p50: {statistics.median(latencies) * 1000:7.2f} ms | "
+          f"máx: {max(latencies) * 1000:7.2f} ms | log: {size / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    pdf = generate_pdf(generate_report(0, pages=5))
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        print(f"{ROUNDS} documentos de 5 páginas por configuración")
+        run("DEBUG + texto completo, síncrono", pdf, directory / "debug_text.log",
+            LOG_LEVEL="DEBUG", LOG_ENQUEUE=False, LOG_TEXT_SAMPLE_RATE=1.0)
+        run("DEBUG, encolado", pdf, directory / "debug.log", LOG_LEVEL="DEBUG")
+        run("INFO, encolado (por defecto)", pdf, directory / "info.log")
+        run("sin logging", pdf, directory / "off.log", LOG_LEVEL="OFF")
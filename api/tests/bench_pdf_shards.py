@@ -0,0 +1,59 @@
+# tests/bench_pdf_shards.py
+# python tests/bench_pdf_shards.py  (o python -m tests.bench_pdf_shards, desde api/)
+# Latencia del pipeline según el número de páginas, extrayendo el texto en un
+# solo proceso o por tramos en paralelo (PDF_SHARD_THRESHOLD / PDF_SHARD_PAGES)
+import asyncio
+import multiprocessing
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from synthetic_reports import generate_pdf, generate_report
+from config import get_settings
+from services.pipeline import ExamPipeline
+
+PAGE_COUNTS = [10, 40, 80, 120, 200]
+ROUNDS = 3
+SHARD_PAGES = 16
+
+
+async def measure(pipeline: ExamPipeline, pdf: bytes) -> float:
+    await pipeline.run(pdf, record_metrics=False)  # calentamiento
+    latencies = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        await pipeline.run(pdf, record_metrics=False)
+        latencies.append(time.perf_counter() - start)
+    return statistics.median(latencies)
+
+
+async def main():
+    settings = get_settings()
+    workers = multiprocessing.cpu_count()
+    sequential = ExamPipeline(settings.copy(update={"PDF_SHARD_THRESHOLD": 0, "PIPELINE_WORKERS": workers}))
+    sharded = ExamPipeline(settings.copy(update={
+        "PDF_SHARD_THRESHOLD": SHARD_PAGES, "PDF_SHARD_PAGES": SHARD_PAGES, "PIPELINE_WORKERS": workers,
+    }))
+    print(f"{workers} procesos, tramos de {SHARD_PAGES} páginas, mediana de {ROUNDS} documentos")
+    print(f"{'páginas':>8} | {'secuencial':>10} | {'por tramos':>10} | aceleración")
+    try:
+        for pages in PAGE_COUNTS:
+            # ~1 página del generador por página del PDF (56 líneas, 60 por página)
+            pdf = generate_pdf(generate_report(pages, pages=pages))
+            base = await measure(sequential, pdf)
+            parallel = await measure(sharded, pdf)
+            print(f"{pages:>8} | {base * 1000:8.0f} ms | {parallel * 1000:8.0f} ms | {base / parallel:6.2f}x")
+    finally:
+        sequential.shutdown()
+        sharded.shutdown()
+
+
+if __name__ == "__main__":
+    logger.remove()
+    asyncio.run(main())
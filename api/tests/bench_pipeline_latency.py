@@ -0,0 +1,65 @@
+# tests/bench_pipeline_latency.py
+# Con la API corriendo (python main.py): python tests/bench_pipeline_latency.py
+import base64
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import requests
+
+from synthetic_reports import generate_pdf, generate_report
+
+API_URL = "http://localhost:8000"
+
+
+def measure_health(stop: threading.Event, latencies: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        requests.get(f"{API_URL}/health", timeout=30)
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+
+
+def send_pdf(payload: dict) -> int:
+    return requests.post(f"{API_URL}/classify-exam/", json=payload, timeout=600).status_code
+
+
+def percentile(values: list, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(pdf_requests: int, pages: int, concurrency: int):
+    pdf = generate_pdf(generate_report(0, pages=pages))
+    payload = {"pdf_data": {"name": "bench", "content": base64.b64encode(pdf).decode()}}
+
+    latencies = []
+    stop = threading.Event()
+    monitor = threading.Thread(target=measure_health, args=(stop, latencies))
+    monitor.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        statuses = list(pool.map(send_pdf, [payload] * pdf_requests))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    monitor.join()
+
+    print(f"{pdf_requests} PDFs de {pages} pág. ({concurrency} concurrentes) en {elapsed:.1f}s, "
+          f"estados: {sorted(set(statuses))}")
+    print(f"  /health p50: {statistics.median(latencies) * 1000:.1f} ms | "
+          f"p99: {percentile(latencies, 0.99) * 1000:.1f} ms | muestras: {len(latencies)}")
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    requests.get(f"{API_URL}/health", timeout=30)
+    print(f"/health sin carga: {(time.perf_counter() - start) * 1000:.1f} ms")
+    run(pdf_requests=20, pages=20, concurrency=8)
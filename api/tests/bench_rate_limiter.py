@@ -0,0 +1,74 @@
+# tests/bench_rate_limiter.py
+# Costo por solicitud del limitador a medida que crece el historial de una IP
+import asyncio
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from types import SimpleNamespace
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from middleware import rate_limiter as rate_limiter_module
+from middleware.rate_limit_backends import MemoryBackend, SharedMemoryBackend
+from middleware.rate_limiter import RateLimiter
+
+settings = rate_limiter_module.settings
+CHECKS = 2000
+
+
+class LegacyRateLimiter:
+    """Versión anterior: lista de timestamps por IP recorrida en cada solicitud."""
+
+    def __init__(self):
+        self.requests = defaultdict(list)
+
+    async def check_rate_limit(self, request):
+        current_time = time.time()
+        recent_requests = [
+            req_time for req_time in self.requests[request.client.host]
+            if current_time - req_time < 60
+        ]
+        if len(recent_requests) >= settings.RATE_LIMIT_PER_MINUTE:
+            raise RuntimeError("429")
+        self.requests[request.client.host].append(current_time)
+
+
+async def measure(limiter, request) -> float:
+    start = time.perf_counter()
+    for _ in range(CHECKS):
+        await limiter.check_rate_limit(request)
+        if hasattr(limiter, "release"):
+            await limiter.release(request)
+    return (time.perf_counter() - start) / CHECKS * 1e6
+
+
+async def main():
+    # Límite alto: se mide el costo de la verificación, no los rechazos
+    settings.RATE_LIMIT_PER_MINUTE = 10 ** 9
+    settings.MAX_MEMORY_USAGE = 10 ** 15
+    settings.MAX_CONCURRENT_REQUESTS = 10 ** 9
+    request = SimpleNamespace(client=SimpleNamespace(host="10.0.0.1"), headers={}, state=SimpleNamespace())
+
+    shm_dir = tempfile.TemporaryDirectory()
+    print(f"{'historial':>10} | {'anterior (us)':>13} | {'memoria (us)':>12} | {'compartido (us)':>15}")
+    for history in (0, 1_000, 10_000, 100_000):
+        legacy = LegacyRateLimiter()
+        legacy.requests[request.client.host] = [time.time()] * history
+        limiters = [
+            RateLimiter(MemoryBackend(settings.RATE_LIMIT_WINDOW)),
+            RateLimiter(SharedMemoryBackend(Path(shm_dir.name) / f"bench_{history}.shm", 4096, settings.RATE_LIMIT_WINDOW)),
+        ]
+        timings = []
+        for limiter in limiters:
+            for _ in range(history):
+                await limiter.check_rate_limit(request)
+                await limiter.release(request)
+            timings.append(await measure(limiter, request))
+        print(f"{history:>10} | {await measure(legacy, request):>13.1f} | {timings[0]:>12.1f} | {timings[1]:>15.1f}")
+    shm_dir.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.get_event_loop().run_until_complete(main())
@@ -0,0 +1,106 @@
+# tests/bench_result_extractor.py
+# python tests/bench_result_extractor.py  (o python -m tests.bench_result_extractor, desde api/)
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from legacy_extraction import legacy_extract
+from synthetic_reports import generate_report
+from exam_types import EXAM_PATTERNS
+from services.result_extractor import ResultExtractor
+from utils.table_parser import find_layouts
+
+
+def bench(reports, rounds: int = 2):
+    extractor = ResultExtractor(use_tables=False)
+    table_extractor = ResultExtractor()
+    exam_types = [
+        {"name": name, "patterns": patterns}
+        for name, patterns in EXAM_PATTERNS.items()
+        if patterns.get("componentes")
+    ]
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        legacy = [legacy_extract(extractor, text, exam) for text in reports for exam in exam_types]
+    legacy_time = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        current = [
+            asyncio.run(extractor.extract_exam_data(text, exam))
+            for text in reports for exam in exam_types
+        ]
+    current_time = (time.perf_counter() - start) / rounds
+
+    assert legacy == current, "Los registros difieren de la implementación original"
+
+    # Filas separadas por columnas bajo el encabezado de su tabla (TABLE_FORMATS);
+    # como en el pipeline, los encabezados se buscan una vez por documento
+    start = time.perf_counter()
+    for _ in range(rounds):
+        tables = []
+        for text in reports:
+            layouts = find_layouts(text.upper())
+            tables.extend(table_extractor.extract(text, exam, layouts=layouts) for exam in exam_types)
+    table_time = (time.perf_counter() - start) / rounds
+
+    assert sum(map(len, tables)) == sum(map(len, legacy)), "Distinta cantidad de resultados con tablas"
+    return legacy_time, current_time, table_time
+
+
+def bench_rows(report: str, rounds: int = 5):
+    """Costo por fila tabular: cascada de regex vs separación por columnas"""
+    extractor = ResultExtractor()
+    layouts = find_layouts(report.upper())
+    lines = report.split("\n")
+    rows = []
+    for line_index, line in enumerate(lines):
+        active = [layout for index, layout in layouts if index < line_index]
+        fields = active[-1].row(line) if active else None
+        if not fields:
+            continue
+        candidates = [
+            component for component in COMPONENTS
+            if component in fields.get("componente", "").upper()
+        ]
+        if candidates and extractor._extract_table_row(line, fields, candidates):
+            rows.append((line, active[-1], candidates))
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line, _, candidates in rows:
+            extractor._extract_component_data(line, candidates[0])
+    regex_time = (time.perf_counter() - start) / rounds / len(rows)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for line, layout, candidates in rows:
+            extractor._extract_table_row(line, layout.row(line), candidates)
+    table_time = (time.perf_counter() - start) / rounds / len(rows)
+    return len(rows), regex_time, table_time
+
+
+COMPONENTS = [component for patterns in EXAM_PATTERNS.values() for component in patterns.get("componentes", [])]
+
+
+if __name__ == "__main__":
+    logger.remove()
+    for pages in (1, 5, 20):
+        reports = [generate_report(seed, pages=pages) for seed in range(5)]
+        legacy_time, current_time, table_time = bench(reports)
+        print(f"{pages:>3} pág. x {len(reports)} informes | "
+              f"original: {legacy_time * 1000:8.1f} ms | "
+              f"clasificador: {current_time * 1000:8.1f} ms | "
+              f"tablas: {table_time * 1000:8.1f} ms | "
+              f"speedup: {legacy_time / table_time:5.1f}x")
+
+    rows, regex_time, table_time = bench_rows(generate_report(0, pages=20))
+    print(f"{rows} filas tabulares | regex: {regex_time * 1e6:6.1f} µs/fila | "
+          f"columnas: {table_time * 1e6:6.1f} µs/fila | {regex_time / table_time:5.1f}x")
@@ -0,0 +1,100 @@
+# tests/legacy_extraction.py
+# Implementaciones originales de la detección y extracción (antes de los
+# autómatas, el índice por documento, el clasificador de líneas y el trie de
+# unidades). Sirven de referencia para las pruebas de equivalencia y los benchmarks.
+import re
+import sys
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from exam_types import EXAM_PATTERNS, COMPONENT_ALIASES, COMMON_UNITS, ANALYSIS_METHODS
+from exam_types.result_patterns import RESULT_PATTERNS, REFERENCE_PATTERNS
+
+
+def legacy_find_component(text: str, component: str) -> bool:
+    """Búsqueda original: recompila los patrones por componente y por petición."""
+    component_pattern = re.escape(component)
+    component_matches = []
+    for pattern in [rf"\b{component_pattern}\b", rf"\b{component_pattern}[\s.:](.*?)\b"]:
+        component_matches.extend(m.end() for m in re.finditer(pattern, text, re.IGNORECASE))
+
+    for end in component_matches:
+        context = text[end:end + 100]
+        if any(re.search(pattern, context) for pattern in RESULT_PATTERNS.values()):
+            return True
+        if any(re.search(pattern, context) for pattern in REFERENCE_PATTERNS.values()):
+            return True
+        if any(unit in context for units in COMMON_UNITS.values() for unit in units):
+            return True
+    return False
+
+
+def legacy_detect(text: str):
+    """Exámenes detectados como (nombre, nombres encontrados, componentes encontrados)."""
+    text = text.upper()
+    detected = []
+    for exam_name, patterns in EXAM_PATTERNS.items():
+        found_names = [name for name in patterns["nombres"] if re.search(rf"\b{re.escape(name)}\b", text)]
+        if not found_names:
+            continue
+        found_components = []
+        for component in patterns.get("componentes", []):
+            if legacy_find_component(text, component):
+                found_components.append(component)
+            elif any(legacy_find_component(text, alias) for alias in COMPONENT_ALIASES.get(component, [])):
+                found_components.append(component)
+        if found_components:
+            detected.append((exam_name, found_names, found_components))
+    return detected
+
+
+def legacy_component_matches(line: str, component: str) -> bool:
+    """Búsqueda original: un regex por componente y alias en cada línea."""
+    if re.search(rf"\b{re.escape(component)}\b", line):
+        return True
+    return any(re.search(rf"\b{re.escape(alias)}\b", line) for alias in COMPONENT_ALIASES.get(component, []))
+
+
+def legacy_extract(extractor, text: str, exam_type: dict):
+    """extract_exam_data original sobre el documento completo (extractor sin tablas)."""
+    results = []
+    for line in text.split("\n"):
+        line_upper = line.upper().strip()
+        for component in exam_type["patterns"]["componentes"]:
+            if legacy_component_matches(line_upper, component):
+                result = extractor._extract_component_data(line, component)
+                if result:
+                    results.append(result)
+                    break
+    return results
+
+
+def legacy_exact_unit(text: str) -> Optional[str]:
+    """_extract_exact_unit original: cada tramo de palabras contra cada unidad."""
+    words = text.replace('/', ' / ').split()
+    for i in range(len(words)):
+        for j in range(i + 1, len(words) + 1):
+            potential_unit = ''.join(words[i:j]).replace(' ', '')
+            for units in COMMON_UNITS.values():
+                for standard_unit in units:
+                    if potential_unit.upper() == standard_unit.upper():
+                        return standard_unit
+    return None
+
+
+def legacy_find_unit_in_line(line: str) -> Optional[str]:
+    for units in COMMON_UNITS.values():
+        for unit in units:
+            if unit in line.upper():
+                return unit
+    return None
+
+
+def legacy_find_method_in_line(line: str) -> Optional[str]:
+    for methods in ANALYSIS_METHODS.values():
+        for method in methods:
+            if method in line.upper():
+                return method
+    return None
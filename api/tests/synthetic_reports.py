@@ -0,0 +1,125 @@
+# tests/synthetic_reports.py
+# Generador de informes de laboratorio sintéticos para benchmarks
+import random
+import sys
+from pathlib import Path
+from typing import Iterable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from exam_types import EXAM_PATTERNS, COMPONENT_ALIASES, COMMON_UNITS, ANALYSIS_METHODS
+
+HEADER = [
+    "LABORATORIO CLINICO CENTRAL",
+    "INFORME DE RESULTADOS",
+    "Paciente: PEREZ SOTO, JUAN ANDRES",
+    "RUT: 12345678-9",
+    "Edad: 45 años",
+    "",
+]
+
+
+def _component_line(rng: random.Random, component: str) -> str:
+    units = [unit for units in COMMON_UNITS.values() for unit in units]
+    methods = [method for methods in ANALYSIS_METHODS.values() for method in methods]
+
+    if component in COMPONENT_ALIASES and rng.random() < 0.4:
+        component = rng.choice(COMPONENT_ALIASES[component])
+    value = f"{rng.uniform(0, 500):.{rng.choice([0, 1, 2])}f}"
+    low = rng.randint(0, 50)
+    high = low + rng.randint(1, 100)
+    reference = rng.choice([f"{low} - {high}", f"HASTA {high}", f"< {high}", f"MAYOR A {low}", ""])
+    unit = rng.choice(units)
+    method = rng.choice(methods + [""] * 5)
+
+    kind = rng.random()
+    if kind < 0.15:
+        return f"{component}: {rng.choice(['NO REACTIVO', 'NEGATIVO', 'POSITIVO', 'NORMAL'])}"
+    if kind < 0.35:
+        return f"{component}  |  {value}  |  {unit}  |  {reference}  |  {method}"
+    if kind < 0.5:
+        return f"{component}\t{value}\t{unit}\t{reference}"
+    if kind < 0.6:
+        return f"{component} {value} {unit} METODO: {method} {reference}"
+    return f"{component}   {value}   {unit}   {reference}   {method}"
+
+
+def generate_report(seed: int, pages: int = 1, exams_per_page: int = 4, lines_per_exam: int = 12) -> str:
+    """Genera un informe sintético con `pages` páginas de exámenes."""
+    rng = random.Random(seed)
+    exam_types = [name for name, patterns in EXAM_PATTERNS.items() if patterns.get("componentes")]
+    lines: List[str] = list(HEADER)
+
+    for page in range(pages):
+        for exam_name in rng.sample(exam_types, exams_per_page):
+            patterns = EXAM_PATTERNS[exam_name]
+            lines.append(rng.choice(patterns["nombres"]))
+            lines.append("PARAMETRO   RESULTADO   UNIDAD   REFERENCIA")
+            for _ in range(lines_per_exam):
+                lines.append(_component_line(rng, rng.choice(patterns["componentes"])))
+            lines.append("")
+        lines.append(f"Página {page + 1} de {pages}")
+
+    lines.append("OBSERVACIONES: muestra procesada en HOSPITAL")
+    return "\n".join(lines)
+
+
+def generate_pdf(text: str, lines_per_page: int = 60, scanned_pages: Iterable[int] = ()) -> bytes:
+    """
+    PDF mínimo (Helvetica, sin dependencias) con el texto repartido en páginas.
+    Las páginas en `scanned_pages` no tienen capa de texto: llevan solo una
+    imagen cuyos bytes son el texto de la página (para un motor OCR de prueba).
+    """
+    lines = text.split("\n")
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)] or [[""]]
+    scanned_pages = set(scanned_pages)
+
+    objects: List[bytes] = [b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    pages_id = 2 + 2 * len(pages) + len(scanned_pages & set(range(len(pages))))
+    page_ids = []
+    for index, page_lines in enumerate(pages):
+        if index in scanned_pages:
+            pixels = "\n".join(page_lines).encode("utf-8")
+            objects.append(
+                b"<< /Type /XObject /Subtype /Image /Width %d /Height 1 /ColorSpace /DeviceGray "
+                b"/BitsPerComponent 8 /Length %d >>\nstream\n" % (len(pixels), len(pixels)) + pixels + b"\nendstream"
+            )
+            stream = b"q 595 0 0 842 0 0 cm /Im0 Do Q"
+            objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+            objects.append(
+                b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+                b"/Resources << /XObject << /Im0 %d 0 R >> >> >>" % (pages_id, len(objects), len(objects) - 1)
+            )
+            page_ids.append(len(objects))
+            continue
+        operations = ["BT /F1 9 Tf 12 TL 40 800 Td"]
+        for line in page_lines:
+            escaped = line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            operations.append(f"({escaped}) Tj T*")
+        operations.append("ET")
+        stream = "\n".join(operations).encode("latin-1", "replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 1 0 R >> >> >>" % (pages_id, len(objects))
+        )
+        page_ids.append(len(objects))
+    objects.append(
+        b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+        + b"] /Count %d >>" % len(page_ids)
+    )
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        output += b"%010d 00000 n \n" % offset
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, len(objects), xref
+    )
+    return bytes(output)
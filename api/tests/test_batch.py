@@ -0,0 +1,126 @@
+# tests/test_batch.py
+# python -m pytest tests/test_batch.py  (o python tests/test_batch.py)
+import base64
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi import HTTPException
+from loguru import logger
+
+from app_client import app_client, load_app
+from synthetic_reports import generate_pdf, generate_report
+from utils.pdf_upload import JSONBatchStream
+
+logger.remove()
+
+PDFS = [generate_pdf(generate_report(seed)) for seed in range(4)]
+
+
+def encoded(pdf: bytes) -> str:
+    return base64.b64encode(pdf).decode()
+
+
+def stream_batch(body: bytes, chunk_size: int, max_size: int = 10_000_000, max_items: int = 0):
+    stream = JSONBatchStream(max_size, max_items)
+    emitted = []
+    for start in range(0, len(body), chunk_size):
+        stream.feed(body[start:start + chunk_size])
+        emitted.append(len(stream.items))
+    return stream, stream.finish(), emitted
+
+
+def test_batch_stream_emits_each_item_when_its_object_closes():
+    items = [{"name": f"doc{index}", "content": encoded(pdf), "tags": [{"content": "x"}]}
+             for index, pdf in enumerate(PDFS)]
+    body = json.dumps({"pdf_data": items, "nota": "fin"}).encode()
+    for chunk_size in (1, 7, 4096):
+        stream, skeleton, emitted = stream_batch(body, chunk_size)
+        assert skeleton == {"pdf_data": [None] * len(PDFS), "nota": "fin"}
+        assert [(index, metadata["name"], bytes(content), error) for index, metadata, content, error in stream.items] \
+            == [(index, f"doc{index}", pdf, None) for index, pdf in enumerate(PDFS)]
+        assert stream.items[0][1] == {"name": "doc0", "content": "", "tags": [{"content": "x"}]}
+        # El primer documento está disponible antes de leer el resto del lote
+        assert emitted[len(json.dumps({"pdf_data": [items[0]]})) // chunk_size] >= 1
+
+
+def test_batch_stream_isolates_item_errors():
+    items = [
+        {"name": "ok", "content": encoded(PDFS[0])},
+        {"name": "padding", "content": "QUJDR"},
+        {"name": "grande", "content": encoded(PDFS[1] * 3)},
+        {"name": "sin contenido"},
+        {"name": "ok2", "content": encoded(PDFS[2])},
+    ]
+    body = json.dumps({"pdf_data": items}).encode()
+    stream, _, _ = stream_batch(body, 333, max_size=len(PDFS[1]) * 2)
+    statuses = [error.status_code if error else None for _, _, _, error in stream.items]
+    assert statuses == [None, 400, 413, None, None]
+    assert bytes(stream.items[4][2]) == PDFS[2]
+    assert bytes(stream.items[3][2]) == b"" and "content" not in stream.items[3][1]
+
+
+def test_batch_stream_item_limit():
+    body = json.dumps({"pdf_data": [{"content": encoded(pdf)} for pdf in PDFS]}).encode()
+    try:
+        stream_batch(body, 1000, max_items=2)
+    except HTTPException as e:
+        assert e.status_code == 413
+    else:
+        raise AssertionError("el lote debía superar max_items")
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def test_batch_endpoint_streams_every_item_once():
+    main = load_app()
+    with app_client() as client:
+        logger.remove()
+        singles = [client.post("/classify-exam/", json={"pdf_data": {"name": f"doc{index}", "content": encoded(pdf)}})
+                   for index, pdf in enumerate(PDFS)]
+        items = [{"name": f"doc{index}", "content": encoded(pdf)} for index, pdf in enumerate(PDFS)]
+        items.insert(2, {"name": "roto", "content": "QUJDR"})
+        items.insert(4, {"name": "sin contenido"})
+        response = client.post("/classify-exams/batch", json={"pdf_data": items})
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = ndjson(response)
+        by_index = {line["index"]: line for line in lines}
+        assert sorted(line["index"] for line in lines) == list(range(len(items)))
+        assert by_index[2]["status"] == 400 and by_index[2]["name"] == "roto"
+        assert by_index[4]["status"] == 422
+        good = [index for index in range(len(items)) if index not in (2, 4)]
+        for single, index in zip(singles, good):
+            expected, actual = single.json(), by_index[index]["response"]
+            assert by_index[index]["status"] == 200
+            assert actual["exams"] == expected["exams"] and actual["total_exams"] == expected["total_exams"]
+        # Toda la memoria reservada por documento se liberó
+        assert main.rate_limiter.reserved_memory == 0
+
+        # Error del JSON envolvente: los documentos ya leídos se responden y
+        # el lote termina con una línea de índice null
+        body = json.dumps({"pdf_data": [{"name": "doc0", "content": encoded(PDFS[0])}]}).encode()[:-2]
+        lines = ndjson(client.post("/classify-exams/batch", data=body))
+        assert {(line["index"], line["status"]) for line in lines} == {(0, 200), (None, 422)}
+
+        main.settings.BATCH_MAX_ITEMS = 2
+        try:
+            lines = ndjson(client.post("/classify-exams/batch", json={"pdf_data": items}))
+        finally:
+            main.settings.BATCH_MAX_ITEMS = 1000
+        assert sorted(line["index"] for line in lines if line["index"] is not None) == [0, 1]
+        assert {"index": None, "status": 413, "error": "El lote supera 2 documentos"} in lines
+
+
+if __name__ == "__main__":
+    test_batch_stream_emits_each_item_when_its_object_closes()
+    test_batch_stream_isolates_item_errors()
+    test_batch_stream_item_limit()
+    test_batch_endpoint_streams_every_item_once()
+    print("OK")
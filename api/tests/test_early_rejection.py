@@ -0,0 +1,135 @@
+# tests/test_early_rejection.py
+# python -m pytest tests/test_early_rejection.py  (o python tests/test_early_rejection.py)
+import io
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi import HTTPException
+from loguru import logger
+from PyPDF2 import PdfReader, PdfWriter
+
+from synthetic_reports import generate_pdf, generate_report
+from services.pipeline import run_exam_pipeline
+from utils.pdf_upload import check_pdf_structure, declared_pages
+
+logger.remove()
+
+INVOICE = "\n".join(f"FACTURA 000{line} | ITEM {line} | CANTIDAD 1 | TOTAL $ {line * 100}" for line in range(600))
+REPORT = generate_report(5, pages=6)
+
+
+def rejected(status_detail: str, content: bytes, max_pages: int = 0) -> bool:
+    try:
+        check_pdf_structure(content, max_pages)
+    except HTTPException as e:
+        return e.status_code == 400 and status_detail in e.detail
+    return False
+
+
+def incremental_update(pdf: bytes, objects: dict, xref_stream: bool = False) -> bytes:
+    """Agrega una actualización incremental con `objects` y su propia sección xref (/Prev)."""
+    previous = int(re.findall(rb"startxref\s+(\d+)", pdf)[-1])
+    root = re.findall(rb"/Root \d+ 0 R", pdf)[-1]
+    update, offsets = pdf, {}
+    for number, body in objects.items():
+        offsets[number] = len(update)
+        update += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_offset = len(update)
+    if xref_stream:
+        update += b"99 0 obj\n<< /Type /XRef /Size 100 %s /W [1 4 2] /Prev %d /Length 0 >>\nstream\n\nendstream\nendobj\n" % (root, previous)
+    else:
+        update += b"xref\n0 1\n0000000000 65535 f \n"
+        for number, offset in offsets.items():
+            update += b"%d 1\n%010d 00000 n \n" % (number, offset)
+        update += b"trailer\n<< /Size 100 %s /Prev %d >>\n" % (root, previous)
+    return update + b"startxref\n%d\n%%%%EOF\n" % xref_offset
+
+
+def test_non_medical_document_is_rejected_after_first_pages():
+    pdf = generate_pdf(INVOICE, lines_per_page=20)
+    result = run_exam_pipeline(pdf, check_pages=2)
+    assert result["metadata"] == {"is_medical": False, "pages_read": 2}
+    assert result["detected_types"] == []
+    # Sin verificación por página se lee todo y el resultado es el mismo
+    full = run_exam_pipeline(pdf)
+    assert full["pages"] == 30 and full["metadata"] == {"is_medical": False}
+
+
+def test_large_non_medical_document_is_not_sharded():
+    pdf = generate_pdf(INVOICE, lines_per_page=20)
+    assert "pending_shards" in run_exam_pipeline(pdf, shard_threshold=10)
+    result = run_exam_pipeline(pdf, shard_threshold=10, check_pages=2)
+    assert result["metadata"]["pages_read"] == 2
+
+
+def test_medical_document_is_read_completely():
+    pdf = generate_pdf(REPORT, lines_per_page=20)
+    checked, full = run_exam_pipeline(pdf, check_pages=1), run_exam_pipeline(pdf)
+    for key in ("text", "pages", "metadata", "results"):
+        assert checked[key] == full[key]
+    # Las páginas sin texto (escaneadas) no cuentan para descartar
+    scanned = generate_pdf(REPORT, lines_per_page=20, scanned_pages=[0, 1])
+    assert "pending_ocr" in run_exam_pipeline(scanned, ocr=True, check_pages=1)
+
+
+def test_structure_check():
+    pdf = generate_pdf(REPORT, lines_per_page=20)
+    check_pdf_structure(pdf, max_pages=100)
+    assert declared_pages(pdf) == run_exam_pipeline(pdf)["pages"]
+    assert rejected("no es un PDF", pdf[1:])
+    assert rejected("incompleto", pdf[:len(pdf) // 2])
+    assert rejected("máximo 3", pdf, max_pages=3)
+
+
+def test_structure_check_reads_only_trailer_and_page_tree():
+    pdf = generate_pdf(REPORT, lines_per_page=20)
+    pages = declared_pages(pdf)
+    # Un /Type /Pages fuera del árbol de páginas no cuenta
+    decoy = incremental_update(pdf, {50: b"<< /Type /Pages /Count 5000 >>"})
+    check_pdf_structure(decoy, max_pages=100)
+    assert declared_pages(decoy) == pages
+
+    # Actualización incremental: la raíz del árbol redefinida en la última sección
+    pages_root = int(re.search(rb"(\d+) 0 obj\n<< /Type /Pages", pdf).group(1))
+    grown = incremental_update(pdf, {pages_root: b"<< /Type /Pages /Kids [3 0 R] /Count 400 >>"})
+    assert declared_pages(grown) == 400
+    assert rejected("máximo 100", grown, max_pages=100)
+
+    # Con xref stream el trailer es su diccionario; las páginas no se ven sin descomprimir
+    stream = incremental_update(pdf, {}, xref_stream=True)
+    check_pdf_structure(stream, max_pages=1)
+    assert declared_pages(stream) is None
+
+
+def test_encrypted_pdf_with_only_owner_password_is_processed():
+    pdf = generate_pdf(REPORT, lines_per_page=20)
+    encrypted = {}
+    for user_password in ("", "secreto"):
+        writer = PdfWriter()
+        for page in PdfReader(io.BytesIO(pdf)).pages:
+            writer.add_page(page)
+        writer.encrypt(user_password, "propietario")
+        output = io.BytesIO()
+        writer.write(output)
+        encrypted[user_password] = output.getvalue()
+    # La verificación previa no rechaza por /Encrypt: el lector prueba la contraseña vacía
+    check_pdf_structure(encrypted[""], max_pages=100)
+    assert declared_pages(encrypted[""]) == declared_pages(pdf)
+    assert run_exam_pipeline(encrypted[""])["results"] == run_exam_pipeline(pdf)["results"]
+    # Con contraseña de usuario el PDF no se puede leer
+    check_pdf_structure(encrypted["secreto"])
+    assert run_exam_pipeline(encrypted["secreto"]) is None
+
+
+if __name__ == "__main__":
+    test_non_medical_document_is_rejected_after_first_pages()
+    test_large_non_medical_document_is_not_sharded()
+    test_medical_document_is_read_completely()
+    test_structure_check()
+    test_structure_check_reads_only_trailer_and_page_tree()
+    test_encrypted_pdf_with_only_owner_password_is_processed()
+    print("OK")
@@ -0,0 +1,130 @@
+# tests/test_extraction_equivalence.py
+# python -m pytest tests/test_extraction_equivalence.py  (o python tests/test_extraction_equivalence.py)
+# Los autómatas, el índice por documento, el clasificador de líneas, el trie de
+# unidades y el lector de tablas deben dar lo mismo que el código original
+# (tests/legacy_extraction.py), salvo los cambios documentados.
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from legacy_extraction import (
+    legacy_detect, legacy_extract, legacy_exact_unit, legacy_find_unit_in_line, legacy_find_method_in_line
+)
+from synthetic_reports import generate_report
+from exam_types import EXAM_PATTERNS, COMPONENT_ALIASES, COMMON_UNITS
+from services.exam_detector import MedicalExamDetector
+from services.result_extractor import ResultExtractor
+from utils.exam_segmenter import segment_exams
+from utils.pattern_artifact import get_patterns
+from utils.table_parser import find_layouts
+from utils.unit_lookup import UnitTrie
+
+logger.remove()
+
+REPORTS = [generate_report(seed, pages=pages) for pages in (1, 3) for seed in range(4)]
+EXAM_TYPES = [
+    {"name": name, "patterns": patterns}
+    for name, patterns in EXAM_PATTERNS.items()
+    if patterns.get("componentes")
+]
+
+
+def report_lines():
+    return {line for report in REPORTS for line in report.split("\n") if line.strip()}
+
+
+def test_detector_matches_legacy_detection():
+    # Autómata de nombres y componentes + DocumentIndex vs un regex por literal
+    detector = MedicalExamDetector()
+    for text in REPORTS:
+        detected, _ = detector.detect(text)
+        assert [(e["name"], e["found"]["nombres"], e["found"]["componentes"]) for e in detected] \
+            == legacy_detect(text)
+
+
+def test_line_classifier_matches_legacy_extraction():
+    extractor = ResultExtractor(use_tables=False)
+    for text in REPORTS:
+        for exam in EXAM_TYPES:
+            assert extractor.extract(text, exam) == legacy_extract(extractor, text, exam)
+
+
+def test_unit_trie_matches_legacy_unit_search():
+    # El original nunca reconoce unidades con espacios (une las palabras antes de comparar)
+    trie = UnitTrie(unit for units in COMMON_UNITS.values() for unit in units if not re.search(r"\s", unit))
+    for line in report_lines():
+        words = line.split()
+        for start in range(len(words)):
+            fragment = " ".join(words[start:])
+            assert trie.find(fragment) == legacy_exact_unit(fragment), fragment
+    # Cambio documentado: con claves sin espacios ahora se reconocen
+    assert get_patterns().unit_trie.find("45 POR CIENTO") == "POR CIENTO"
+
+
+def test_first_match_lookups_match_legacy_loops():
+    patterns = get_patterns()
+    for line in report_lines():
+        assert patterns.unit_lookup.find(line.upper()) == legacy_find_unit_in_line(line)
+        assert patterns.method_lookup.find(line.upper()) == legacy_find_method_in_line(line)
+
+
+def known_names(exam: dict):
+    components = exam["patterns"]["componentes"]
+    return components + [alias for component in components for alias in COMPONENT_ALIASES.get(component, [])]
+
+
+def test_table_parser_only_corrects_regex_records():
+    regex = ResultExtractor(use_tables=False)
+    tables = ResultExtractor()
+    corrected = 0
+    for text in REPORTS:
+        layouts = find_layouts(text.upper())
+        assert layouts, "los informes sintéticos traen tablas con encabezado"
+        for exam in EXAM_TYPES:
+            expected = regex.extract(text, exam)
+            actual = tables.extract(text, exam, layouts=layouts)
+            # Misma fila, mismo registro: solo cambian los campos que se leen por columna
+            assert len(actual) == len(expected)
+            for table_record, regex_record in zip(actual, expected):
+                if table_record != regex_record:
+                    corrected += 1
+                    name = table_record["componente"].upper()
+                    assert any(re.search(rf"\b{re.escape(known)}\b", name) for known in known_names(exam)), name
+    assert corrected > 0
+
+    # Sin encabezados de tabla se usa siempre la cascada de regex
+    for text in REPORTS:
+        free_text = "\n".join(line for line in text.split("\n") if not find_layouts(line.upper()))
+        for exam in EXAM_TYPES:
+            assert tables.extract(free_text, exam) == regex.extract(free_text, exam)
+
+
+def test_segmented_extraction_is_part_of_the_full_document_extraction():
+    extractor = ResultExtractor()
+    detector = MedicalExamDetector()
+    for text in REPORTS:
+        detected, _ = detector.detect(text)
+        spans = segment_exams(text, detected)
+        assert any(spans.values()), "los informes sintéticos traen encabezados de examen"
+        for exam in detected:
+            full_lines, section_lines = [], []
+            full = extractor.extract(text, exam, full_lines)
+            section = extractor.extract(text, exam, section_lines, spans[exam["name"]])
+            assert set(zip(section_lines, map(repr, section))) <= set(zip(full_lines, map(repr, full)))
+            for line_index in section_lines:
+                assert any(first <= line_index <= last for first, last in spans[exam["name"]] or [(0, line_index)])
+
+
+if __name__ == "__main__":
+    test_detector_matches_legacy_detection()
+    test_line_classifier_matches_legacy_extraction()
+    test_unit_trie_matches_legacy_unit_search()
+    test_first_match_lookups_match_legacy_loops()
+    test_table_parser_only_corrects_regex_records()
+    test_segmented_extraction_is_part_of_the_full_document_extraction()
+    print("OK")
@@ -0,0 +1,118 @@
+# tests/test_jobs.py
+# python -m pytest tests/test_jobs.py  (o python tests/test_jobs.py)
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fastapi import HTTPException
+from loguru import logger
+
+from app_client import app_client
+from config import Settings
+from services.jobs import (
+    JOB_DONE, JOB_FAILED, JOB_QUEUED, JOB_RUNNING, JobRunner, MemoryJobStore, SQLiteJobStore
+)
+
+logger.remove()
+
+
+class ControlledHandler:
+    """Handler de trabajos que espera a que la prueba lo libere."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.finish = asyncio.Event()
+
+    async def __call__(self, pdf_content: bytes, original: dict) -> dict:
+        self.started.set()
+        await self.finish.wait()
+        if pdf_content == b"roto":
+            raise HTTPException(status_code=400, detail="PDF inválido")
+        return {"name": original["name"], "size": len(pdf_content)}
+
+
+async def wait_for_status(runner: JobRunner, job_id: str, status: str) -> dict:
+    for _ in range(200):
+        job = await runner.get(job_id)
+        if job["status"] == status:
+            return job
+        await asyncio.sleep(0.005)
+    raise AssertionError(f"{job_id} no llegó a {status}: {job}")
+
+
+def run_transitions(store):
+    async def scenario():
+        handler = ControlledHandler()
+        released = []
+        settings = Settings(JOB_WORKERS=1, JOB_QUEUE_SIZE=2, JOB_RETENTION=0)
+        runner = JobRunner(settings, store, handler, release_memory=released.append)
+        runner.start()
+
+        first = await runner.submit(b"%PDF-uno", {"name": "uno"}, reservation=100)
+        second = await runner.submit(b"roto", {"name": "dos"}, reservation=200)
+        assert first["status"] == JOB_QUEUED
+        await handler.started.wait()
+        await wait_for_status(runner, first["id"], JOB_RUNNING)
+        # Un solo worker: el segundo sigue en la cola
+        assert (await runner.get(second["id"]))["status"] == JOB_QUEUED
+
+        handler.finish.set()
+        done = await wait_for_status(runner, first["id"], JOB_DONE)
+        assert done["status_code"] == 200 and done["result"] == {"name": "uno", "size": 8}
+        assert done["created_at"] <= done["started_at"] <= done["finished_at"]
+        failed = await wait_for_status(runner, second["id"], JOB_FAILED)
+        assert failed["status_code"] == 400 and failed["error"] == "PDF inválido"
+        # La memoria reservada de cada trabajo se devuelve al terminar
+        assert released == [100, 200]
+
+        assert await runner.get("no-existe") is None
+        await runner.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_job_transitions_in_memory():
+    run_transitions(MemoryJobStore())
+
+
+def test_job_transitions_in_sqlite():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "jobs" / "jobs.sqlite3"
+        store = SQLiteJobStore(path)
+        # Se abre en el primer uso, no al construirlo
+        assert not path.parent.exists()
+        run_transitions(store)
+
+
+def test_finished_jobs_are_purged_after_retention():
+    for store in (MemoryJobStore(), SQLiteJobStore(Path(tempfile.mkdtemp()) / "jobs.sqlite3")):
+        now = time.time()
+        store.create({"id": "viejo", "status": JOB_DONE, "finished_at": now - 7200})
+        store.create({"id": "fallido", "status": JOB_FAILED, "finished_at": now - 7200})
+        store.create({"id": "reciente", "status": JOB_DONE, "finished_at": now})
+        store.create({"id": "en-curso", "status": JOB_RUNNING, "worker_pid": os.getpid()})
+        assert store.purge(now - 3600) == 2
+        assert store.get("viejo") is None and store.get("fallido") is None
+        assert store.get("reciente") is not None and store.get("en-curso") is not None
+
+
+def test_unknown_job_is_404():
+    with app_client() as client:
+        logger.remove()
+        response = client.get("/jobs/no-existe")
+        assert response.status_code == 404
+        assert response.json() == {"detail": "Job not found"}
+
+
+if __name__ == "__main__":
+    test_job_transitions_in_memory()
+    test_job_transitions_in_sqlite()
+    test_finished_jobs_are_purged_after_retention()
+    test_unknown_job_is_404()
+    print("OK")
@@ -0,0 +1,148 @@
+# tests/test_ocr_fallback.py
+# python -m pytest tests/test_ocr_fallback.py  (o python tests/test_ocr_fallback.py)
+import asyncio
+import io
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+from PyPDF2 import PdfReader
+
+from synthetic_reports import generate_pdf, generate_report
+from config import get_settings
+from services.pipeline import ExamPipeline, run_exam_pipeline
+from utils.ocr import OcrEngine, ocr_page, register_engine
+from utils import text_extractors
+from utils.text_extractors import read_pdf_text
+
+
+class FakeOcrEngine(OcrEngine):
+    """Sin tesseract: la "imagen" de una página escaneada de prueba son los bytes de su texto."""
+
+    name = "fake"
+    renders = 0
+    recognitions = 0
+
+    def render(self, page_pdf: bytes) -> bytes:
+        FakeOcrEngine.renders += 1
+        page = PdfReader(io.BytesIO(page_pdf)).pages[0]
+        return page["/Resources"]["/XObject"]["/Im0"].get_object().get_data()
+
+    def recognize(self, image: bytes) -> str:
+        FakeOcrEngine.recognitions += 1
+        return image.decode("utf-8")
+
+
+# Antes de crear el pool: los procesos hijos heredan el registro
+register_engine("fake", FakeOcrEngine)
+logger.remove()
+
+TEXT = generate_report(3, pages=3)
+LINES_PER_PAGE = 40
+
+
+def options(cache_dir=None):
+    return {"engine": "fake", "language": "spa", "dpi": 300, "cache_dir": cache_dir}
+
+
+def test_text_layer_skips_ocr():
+    result = run_exam_pipeline(generate_pdf(TEXT, LINES_PER_PAGE), ocr=True)
+    assert "pending_ocr" not in result
+    assert "ocr_pages" not in result["metadata"]
+
+
+def test_only_empty_pages_are_sent_to_ocr():
+    pdf = generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[1])
+    result = run_exam_pipeline(pdf, ocr=True)
+    assert list(result["pending_ocr"]) == [1]
+    # Sin OCR se procesa solo la capa de texto
+    assert "pending_ocr" not in run_exam_pipeline(pdf)
+
+
+def test_undecodable_scanned_page_does_not_fail_the_document():
+    # Imagen con un filtro que PyPDF2 no decodifica (frecuente en escaneos);
+    # mismo largo para no mover las posiciones de la tabla xref
+    pdf = generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[1])
+    pdf = pdf.replace(b"/ColorSpace /DeviceGray", b"/Filter /JBIG2Decode   ")
+    result = run_exam_pipeline(pdf)
+    assert result and result["results"]
+    # Con OCR la huella usa los bytes sin decodificar
+    assert list(run_exam_pipeline(pdf, ocr=True)["pending_ocr"]) == [1]
+
+    # Sin OCR no se calculan huellas; si una falla, la página se reconoce sin caché
+    stats = {}
+    read_pdf_text(pdf, stats)
+    assert stats["empty_pages"] == {1: None}
+    original = text_extractors.page_hash
+    text_extractors.page_hash = lambda page: 1 / 0
+    try:
+        assert run_exam_pipeline(pdf, ocr=True)["pending_ocr"] == {1: None}
+    finally:
+        text_extractors.page_hash = original
+
+
+def test_ocr_page_cache():
+    pdf = generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[0])
+    stats = {}
+    read_pdf_text(pdf, stats, hash_empty=True)
+    key = stats["empty_pages"][0]
+    expected = "\n".join(TEXT.split("\n")[:LINES_PER_PAGE])
+
+    with tempfile.TemporaryDirectory() as directory:
+        FakeOcrEngine.renders = FakeOcrEngine.recognitions = 0
+        assert ocr_page(pdf, 0, key, options(Path(directory))) == expected
+        assert ocr_page(pdf, 0, key, options(Path(directory))) == expected
+        assert (FakeOcrEngine.renders, FakeOcrEngine.recognitions) == (1, 1)
+
+        # Sin el texto en caché se vuelve a reconocer, pero la imagen no se renderiza
+        for path in Path(directory).glob("*.txt"):
+            path.unlink()
+        assert ocr_page(pdf, 0, key, options(Path(directory))) == expected
+        assert (FakeOcrEngine.renders, FakeOcrEngine.recognitions) == (1, 2)
+
+
+def test_pipeline_ocr_fallback():
+    with tempfile.TemporaryDirectory() as directory:
+        settings = get_settings().copy(update={
+            "OCR_ENGINE": "fake", "RESULTS_DIR": Path(directory), "PIPELINE_WORKERS": 2,
+        })
+        pipeline = ExamPipeline(settings)
+        # Páginas escaneadas dentro de un PDF extraído por tramos
+        sharded_pipeline = ExamPipeline(settings.copy(update={"PDF_SHARD_THRESHOLD": 2, "PDF_SHARD_PAGES": 1}))
+
+        async def run():
+            try:
+                scanned = await pipeline.run(generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[0, 1, 2]))
+                mixed = await pipeline.run(generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[2]))
+                sharded = await sharded_pipeline.run(generate_pdf(TEXT, LINES_PER_PAGE, scanned_pages=[1]))
+                return scanned, mixed, sharded
+            finally:
+                pipeline.shutdown()
+                sharded_pipeline.shutdown()
+
+        scanned, mixed, sharded = asyncio.run(run())
+        expected = run_exam_pipeline(generate_pdf(TEXT, LINES_PER_PAGE))
+
+        assert scanned["metadata"]["ocr_pages"] == [1, 2, 3]
+        assert mixed["metadata"]["ocr_pages"] == [3]
+        assert sharded["metadata"]["ocr_pages"] == [2]
+        for result in (scanned, mixed, sharded):
+            # PyPDF2 omite las líneas vacías que el OCR conserva: se compara lo extraído
+            assert [exam["name"] for exam in result["detected_types"]] == \
+                [exam["name"] for exam in expected["detected_types"]]
+            assert result["results"] == expected["results"]
+            assert "ocr" in result["timings"]
+        assert len(list(Path(directory, "ocr").glob("*.txt"))) == 3
+
+
+if __name__ == "__main__":
+    test_text_layer_skips_ocr()
+    test_only_empty_pages_are_sent_to_ocr()
+    test_undecodable_scanned_page_does_not_fail_the_document()
+    test_ocr_page_cache()
+    test_pipeline_ocr_fallback()
+    print("OK")
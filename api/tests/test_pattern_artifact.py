@@ -0,0 +1,98 @@
+# tests/test_pattern_artifact.py
+# python -m pytest tests/test_pattern_artifact.py  (o python tests/test_pattern_artifact.py)
+import json
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from synthetic_reports import generate_report
+from utils.pattern_artifact import (
+    ARTIFACT_FORMAT, compile_patterns, load_patterns, main, patterns_version, read_artifact, builder_version,
+    tables_to_json
+)
+
+logger.remove()
+
+REPORT = generate_report(3, pages=2).upper()
+
+
+def scans(patterns):
+    """Lo que cada autómata del conjunto encuentra en REPORT"""
+    return {
+        "exam": patterns.exam_matcher.scan(REPORT),
+        "units": patterns.unit_matcher.scan(REPORT),
+        "unit_trie": [patterns.unit_trie.find(line) for line in REPORT.split("\n")],
+        "methods": [patterns.method_lookup.find(line) for line in REPORT.split("\n")],
+        "lines": {
+            components: list(classifier.classify(REPORT))
+            for components, classifier in patterns.classifiers.items()
+        },
+        "starts": {
+            source: [match.start() for match in regex.finditer(REPORT)]
+            for source, regex in patterns.start_patterns.items()
+        },
+    }
+
+
+def test_loaded_artifact_matches_compiled_patterns():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patterns.json"
+        compiled = load_patterns(path, write=True)
+        assert path.exists()
+        # Solo datos planos: nada que se ejecute al cargar
+        assert json.loads(path.read_text(encoding="utf-8"))["format"] == ARTIFACT_FORMAT
+        loaded = load_patterns(path)
+        assert loaded.version == compiled.version == patterns_version()
+        # Cargar no compila los autómatas: cada uno se compila en su primer uso
+        assert loaded.exam_matcher._compiled is None
+        assert all(classifier.matcher._compiled is None for classifier in loaded.classifiers.values())
+        assert scans(loaded) == scans(compiled)
+        assert loaded.exam_matcher._compiled is not None
+
+
+def test_stale_or_broken_artifact_is_recompiled():
+    version, builder = patterns_version(), builder_version()
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patterns.json"
+        path.write_bytes(b"no es JSON")
+        assert read_artifact(path, version, builder)[0] is None
+        # Por defecto no se escribe (PATTERN_ARTIFACT_WRITE=False)
+        assert load_patterns(path).version == version
+        assert read_artifact(path, version, builder)[0] is None
+        load_patterns(path, write=True)
+        assert read_artifact(path, version, builder)[0] is not None
+
+        # Artefacto de otra versión de los patrones
+        path.write_text(json.dumps(
+            {"format": ARTIFACT_FORMAT, "version": "0" * 16, "builder": builder,
+             "tables": tables_to_json(compile_patterns())}
+        ), encoding="utf-8")
+        assert "otra versión" in read_artifact(path, version, builder)[1]
+        load_patterns(path)
+        assert "otra versión" in read_artifact(path, version, builder)[1]
+
+        # Con la versión correcta pero tablas incompletas
+        path.write_text(json.dumps(
+            {"format": ARTIFACT_FORMAT, "version": version, "builder": builder, "tables": {}}
+        ), encoding="utf-8")
+        assert "ilegible" in read_artifact(path, version, builder)[1]
+
+
+def test_cli_build_and_check():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patterns.json"
+        assert main(["--output", str(path), "--check"]) == 1
+        assert main(["--output", str(path)]) == 0
+        assert main(["--output", str(path), "--check"]) == 0
+
+
+if __name__ == "__main__":
+    test_loaded_artifact_matches_compiled_patterns()
+    test_stale_or_broken_artifact_is_recompiled()
+    test_cli_build_and_check()
+    print("OK")
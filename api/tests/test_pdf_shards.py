@@ -0,0 +1,96 @@
+# tests/test_pdf_shards.py
+# python -m pytest tests/test_pdf_shards.py  (o python tests/test_pdf_shards.py)
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from synthetic_reports import generate_pdf, generate_report
+from config import get_settings
+from services.pipeline import ExamPipeline, run_exam_pipeline
+from utils.text_extractors import join_pages
+
+logger.remove()
+
+TEXT = generate_report(7, pages=12)
+
+
+def test_join_pages_offsets():
+    text, offsets = join_pages(["AB\nC", "", "DE", "F"])
+    assert text == "AB\nC\nDE\nF"
+    assert offsets == [0, 4, 5, 8]
+    assert text[offsets[2]:offsets[3] - 1] == "DE"
+
+
+def run_pipeline(pdf: bytes, **overrides):
+    with tempfile.TemporaryDirectory() as directory:
+        settings = get_settings().copy(update={
+            "RESULTS_DIR": Path(directory), "PIPELINE_WORKERS": 2, "OCR_ENGINE": "", **overrides,
+        })
+        pipeline = ExamPipeline(settings)
+
+        async def run():
+            try:
+                return await pipeline.run(pdf)
+            finally:
+                pipeline.shutdown()
+
+        return asyncio.run(run())
+
+
+def test_sharded_text_matches_sequential():
+    pdf = generate_pdf(TEXT, lines_per_page=20)
+    expected = run_exam_pipeline(pdf)
+    assert expected["pages"] > 10
+
+    assert "pending_shards" in run_exam_pipeline(pdf, shard_threshold=10)
+    result = run_pipeline(pdf, PDF_SHARD_THRESHOLD=10, PDF_SHARD_PAGES=3)
+    for key in ("text", "page_offsets", "pages", "results", "sections"):
+        assert result[key] == expected[key]
+
+
+def test_shard_tasks_read_a_single_spilled_copy():
+    pdf = generate_pdf(TEXT, lines_per_page=20)
+    sources = []
+
+    class RecordingPipeline(ExamPipeline):
+        async def _extract_shards(self, pdf_source, pages, ocr=False):
+            sources.append(pdf_source)
+            return await super()._extract_shards(pdf_source, pages, ocr)
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings = get_settings().copy(update={
+            "RESULTS_DIR": Path(directory), "TEMP_DIR": Path(directory) / "temp", "PIPELINE_WORKERS": 2,
+            "OCR_ENGINE": "", "PDF_SHARD_THRESHOLD": 10, "PDF_SHARD_PAGES": 3,
+        })
+        pipeline = RecordingPipeline(settings)
+
+        async def run():
+            try:
+                return await pipeline.run(pdf)
+            finally:
+                pipeline.shutdown()
+
+        result = asyncio.run(run())
+        assert result["text"] == run_exam_pipeline(pdf)["text"]
+        assert len(sources) == 1 and isinstance(sources[0], str)
+        assert Path(sources[0]).parent == settings.TEMP_DIR
+        assert not list(settings.TEMP_DIR.iterdir())
+
+
+def test_sharded_pdf_without_text_layer():
+    pdf = generate_pdf(TEXT, lines_per_page=20, scanned_pages=range(100))
+    assert run_pipeline(pdf, PDF_SHARD_THRESHOLD=10, PDF_SHARD_PAGES=3) is None
+
+
+if __name__ == "__main__":
+    test_join_pages_offsets()
+    test_sharded_text_matches_sequential()
+    test_shard_tasks_read_a_single_spilled_copy()
+    test_sharded_pdf_without_text_layer()
+    print("OK")
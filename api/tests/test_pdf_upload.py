@@ -0,0 +1,161 @@
+# tests/test_pdf_upload.py
+# python -m pytest tests/test_pdf_upload.py  (o python tests/test_pdf_upload.py)
+import asyncio
+import base64
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import HTTPException, Request
+
+from utils.pdf_upload import (
+    Base64StreamDecoder, JSONContentStream, read_json_pdf_request, read_pdf_upload
+)
+
+PDF = bytes(range(256)) * 40 + b"%%EOF"
+ENCODED = base64.b64encode(PDF).decode()
+
+
+class FakeBody:
+    """Cuerpo de una solicitud por trozos; `pending` indica lo que no se llegó a leer."""
+
+    def __init__(self, body: bytes, chunk_size: int):
+        self.chunks: List[bytes] = [body[start:start + chunk_size] for start in range(0, len(body), chunk_size)]
+
+    @property
+    def pending(self) -> int:
+        return len(self.chunks)
+
+    async def receive(self):
+        chunk = self.chunks.pop(0) if self.chunks else b""
+        return {"type": "http.request", "body": chunk, "more_body": bool(self.chunks)}
+
+
+def make_request(body: FakeBody, headers: Dict[str, str]) -> Request:
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+    }
+    return Request(scope, body.receive)
+
+
+def status_of(coroutine) -> int:
+    try:
+        asyncio.run(coroutine)
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+def stream_json(body: bytes, chunk_size: int, max_size: int = len(PDF)):
+    decoder = Base64StreamDecoder(max_size)
+    stream = JSONContentStream(decoder)
+    for start in range(0, len(body), chunk_size):
+        stream.feed(body[start:start + chunk_size])
+    return stream.finish(), bytes(decoder.finish())
+
+
+def split_chunks(text: str, sizes: Iterable[int]):
+    for size in sizes:
+        decoder = Base64StreamDecoder(len(PDF))
+        for start in range(0, len(text), size):
+            decoder.feed(text[start:start + size])
+        yield bytes(decoder.finish())
+
+
+def test_base64_decoder_matches_b64decode_for_any_chunking():
+    wrapped = "\n".join(ENCODED[start:start + 76] for start in range(0, len(ENCODED), 76))
+    for decoded in split_chunks(wrapped, (1, 3, 7, 4096)):
+        assert decoded == PDF
+
+
+def test_json_stream_escapes_and_split_chunks():
+    # "\/" y "A" dentro del base64, claves y valores con escapes y UTF-8
+    content = ENCODED.replace("/", "\\/").replace("A", "\\u0041")
+    body = (
+        '{"pdf_da\\u0074a": {"name": "P\\u00e9rez \\"X\\"", "type": "lab", '
+        '"content": "' + content + '", "date": "2024-01-02", "tags": ["a", {"content": "x"}]}, '
+        '"nota": "Ñandú \\\\ fin"}'
+    ).encode("utf-8")
+    for chunk_size in (1, 2, 5, 333):
+        parsed, decoded = stream_json(body, chunk_size)
+        assert decoded == PDF
+        assert parsed == {
+            "pdf_data": {"name": 'Pérez "X"', "type": "lab", "content": "", "date": "2024-01-02",
+                         "tags": ["a", {"content": "x"}]},
+            "nota": "Ñandú \\ fin",
+        }
+
+
+def json_request(body: bytes, chunk_size: int = 1000, max_size: int = len(PDF)):
+    fake = FakeBody(body, chunk_size)
+    return fake, read_json_pdf_request(make_request(fake, {"content-type": "application/json"}), max_size)
+
+
+def test_json_request_errors():
+    # Resto que no completa un bloque base64
+    _, request = json_request(b'{"pdf_data": {"content": "QUJDR"}}')
+    assert status_of(request) == 400
+    _, request = json_request(b'{"pdf_data": {"content": "QUJD"}')
+    assert status_of(request) == 422
+
+    # 413 en cuanto el PDF supera el máximo, sin leer el resto del cuerpo
+    fake, request = json_request(json.dumps({"pdf_data": {"content": ENCODED}}).encode(), max_size=1024)
+    assert status_of(request) == 413
+    assert fake.pending > 0
+
+    # El resto del JSON también tiene un límite
+    fake, request = json_request(json.dumps({"pdf_data": {"name": "x" * 200_000, "content": ""}}).encode())
+    assert status_of(request) == 413
+    assert fake.pending > 0
+
+
+def multipart_body(parts: List[tuple], boundary: str = "limite123") -> bytes:
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += (f"--{boundary}\r\nContent-Disposition: {disposition}\r\n"
+                 f"Content-Type: application/octet-stream\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{boundary}--\r\n".encode()
+
+
+def multipart_request(body: bytes, max_size: int = len(PDF), chunk_size: int = 700):
+    fake = FakeBody(body, chunk_size)
+    # Sin Content-Length (transferencia por trozos)
+    headers = {"content-type": "multipart/form-data; boundary=limite123"}
+    return fake, read_pdf_upload(make_request(fake, headers), max_size)
+
+
+def test_multipart_is_parsed_incrementally():
+    body = multipart_body([("nota", None, b"hola"), ("file", "informe.pdf", PDF), ("otro", "b.pdf", b"x")])
+    for chunk_size in (1, 64, 700):
+        _, request = multipart_request(body, chunk_size=chunk_size)
+        content, filename = asyncio.run(request)
+        assert bytes(content) == PDF and filename == "informe.pdf"
+
+    _, request = multipart_request(multipart_body([("nota", None, b"hola")]))
+    assert status_of(request) == 400
+
+
+def test_multipart_without_content_length_stops_at_max_size():
+    fake, request = multipart_request(multipart_body([("file", "a.pdf", PDF * 20)]), max_size=len(PDF))
+    assert status_of(request) == 413
+    assert fake.pending > 0
+    # Campos descartados muy grandes también cortan la lectura
+    fake, request = multipart_request(multipart_body([("relleno", None, PDF * 40), ("file", "a.pdf", PDF)]))
+    assert status_of(request) == 413
+    assert fake.pending > 0
+
+
+if __name__ == "__main__":
+    test_base64_decoder_matches_b64decode_for_any_chunking()
+    test_json_stream_escapes_and_split_chunks()
+    test_json_request_errors()
+    test_multipart_is_parsed_incrementally()
+    test_multipart_without_content_length_stops_at_max_size()
+    print("OK")
@@ -0,0 +1,212 @@
+# tests/test_rate_limit_backends.py
+# python -m pytest tests/test_rate_limit_backends.py  (o python tests/test_rate_limit_backends.py)
+import asyncio
+import fcntl
+import multiprocessing
+import os
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import Request
+
+from config import Settings
+from middleware.rate_limit_backends import (
+    KeyValueBackend,
+    KeyValueStore,
+    MemoryBackend,
+    RateLimitBackend,
+    SharedMemoryBackend,
+)
+from middleware.rate_limiter import RateLimiter
+
+WINDOW = 3600
+LIMIT = 5
+
+
+class FakeKeyValueStore(KeyValueStore):
+    """Almacén en proceso con la semántica de INCRBY + EXPIRE y MGET de Redis."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.values: Dict[str, Tuple[int, Optional[float]]] = {}
+
+    def _alive(self, key: str) -> Optional[int]:
+        entry = self.values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self.now:
+            del self.values[key]
+            return None
+        return value
+
+    def incr(self, key: str, amount: int = 1, ttl: Optional[int] = None) -> int:
+        value = (self._alive(key) or 0) + amount
+        expires_at = self.now + ttl if ttl else self.values.get(key, (0, None))[1]
+        self.values[key] = (value, expires_at)
+        return value
+
+    def get_many(self, keys: List[str]) -> List[Optional[int]]:
+        return [self._alive(key) for key in keys]
+
+
+def check_backend(backend, clock=None):
+    now = 1000.0
+    set_clock = clock or (lambda value: None)
+    set_clock(now)
+
+    # Límite por minuto: LIMIT admitidas, la siguiente rechazada, otra IP independiente
+    assert all(backend.hit("10.0.0.1", now + i, LIMIT) for i in range(LIMIT))
+    assert not backend.hit("10.0.0.1", now + LIMIT, LIMIT)
+    assert backend.hit("10.0.0.2", now + LIMIT, LIMIT)
+    status = backend.client_status("10.0.0.1", now + LIMIT)
+    assert status == {"requests_last_minute": LIMIT, "requests_last_window": LIMIT}
+
+    # Pasado el minuto vuelve a admitir; la ventana larga conserva el historial
+    later = now + 61 + LIMIT
+    set_clock(later)
+    assert backend.hit("10.0.0.1", later, LIMIT)
+    status = backend.client_status("10.0.0.1", later)
+    assert status["requests_last_minute"] == 1
+    assert status["requests_last_window"] == LIMIT + 1
+
+    # Cupos en curso: se respetan y se liberan
+    assert backend.acquire(2) and backend.acquire(2)
+    assert not backend.acquire(2)
+    assert backend.in_flight() == 2
+    backend.release()
+    backend.release()
+    assert backend.in_flight() == 0
+    assert backend.acquire(2)
+    backend.release()
+
+
+def test_memory_backend():
+    check_backend(MemoryBackend(WINDOW))
+
+
+def test_key_value_backend_with_fake_store():
+    store = FakeKeyValueStore()
+    backend = KeyValueBackend(store, WINDOW)
+    check_backend(backend, clock=lambda value: setattr(store, "now", value))
+
+    # Las claves de cubeta y el contador en curso vencen solas por TTL
+    backend.acquire(2)
+    store.now += WINDOW * 3
+    assert all(store._alive(key) is None for key in list(store.values))
+    assert backend.in_flight() == 0
+
+
+def test_shared_memory_backend():
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "rate_limit.shm"
+        check_backend(SharedMemoryBackend(path, 64, WINDOW))
+
+        # Otro "worker" que abre el mismo archivo ve los mismos contadores
+        other = SharedMemoryBackend(path, 64, WINDOW)
+        assert other.client_status("10.0.0.1", 1066.0)["requests_last_window"] == LIMIT + 1
+        assert other.tracked_clients() == 2
+
+
+def test_shared_memory_table_reuses_slots():
+    with tempfile.TemporaryDirectory() as directory:
+        backend = SharedMemoryBackend(Path(directory) / "rate_limit.shm", 8, WINDOW)
+        # Más clientes que entradas: se reutiliza la más antigua sin romper la tabla
+        for client in range(50):
+            assert backend.hit(f"10.0.1.{client}", 1000.0 + client, LIMIT)
+        assert backend.tracked_clients() == 8
+        assert backend.client_status("10.0.1.49", 1050.0)["requests_last_minute"] == 1
+
+
+def _acquire_and_die(path: str):
+    backend = SharedMemoryBackend(Path(path), 64, WINDOW)
+    assert backend.acquire(10) and backend.acquire(10)
+    os._exit(0)  # sin release: como un worker que muere a mitad de una solicitud
+
+
+def test_shared_memory_drops_in_flight_of_dead_workers():
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "rate_limit.shm")
+        backend = SharedMemoryBackend(Path(path), 64, WINDOW)
+        worker = multiprocessing.get_context("spawn").Process(target=_acquire_and_die, args=(path,))
+        worker.start()
+        worker.join()
+        assert backend.in_flight() == 2
+        # Al llegar al límite se descartan los cupos del proceso muerto
+        assert backend.acquire(2)
+        assert backend.in_flight() == 1
+        backend.release()
+        assert backend.in_flight() == 0
+
+
+def test_shm_path_follows_temp_dir_override():
+    settings = Settings(TEMP_DIR=Path("/tmp/otro-temp"))
+    assert settings.rate_limit_shm_path == Path("/tmp/otro-temp/rate_limit.shm")
+    assert Settings(RATE_LIMIT_SHM_PATH=Path("/tmp/x.shm")).rate_limit_shm_path == Path("/tmp/x.shm")
+
+
+def test_interfaces_are_abstract():
+    for interface in (RateLimitBackend, KeyValueStore):
+        try:
+            interface()
+        except TypeError:
+            continue
+        raise AssertionError(f"{interface.__name__} no debería instanciarse")
+
+
+def make_request(ip: str) -> Request:
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (ip, 1234)})
+
+
+def test_shared_lock_is_taken_off_the_event_loop():
+    async def scenario(path: Path):
+        limiter = RateLimiter(SharedMemoryBackend(path, 64, WINDOW))
+        # Otro worker tiene el flock: la admisión espera en su hilo, el loop sigue libre
+        lock_fd = os.open(str(path), os.O_RDWR)
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        try:
+            admission = asyncio.ensure_future(limiter.check_rate_limit(make_request("10.0.0.7")))
+            ticks = 0
+            for _ in range(5):
+                await asyncio.sleep(0.01)
+                ticks += 1
+            assert ticks == 5 and not admission.done()
+        finally:
+            fcntl.flock(lock_fd, fcntl.LOCK_UN)
+            os.close(lock_fd)
+        request = make_request("10.0.0.7")
+        await admission
+        assert limiter.concurrent_requests == 1
+        await limiter.release(request)
+        assert limiter.concurrent_requests == 0
+        assert (await limiter.client_status("10.0.0.7"))["requests_last_minute"] == 1
+
+    with tempfile.TemporaryDirectory() as directory:
+        asyncio.run(scenario(Path(directory) / "rate_limit.shm"))
+
+
+def _hit_from_worker(args) -> int:
+    path, attempts = args
+    backend = SharedMemoryBackend(Path(path), 64, WINDOW)
+    return sum(backend.hit("10.0.0.9", 5000.0, LIMIT * 4) for _ in range(attempts))
+
+
+def test_shared_memory_limit_is_global_across_processes():
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / "rate_limit.shm")
+        SharedMemoryBackend(Path(path), 64, WINDOW)
+        with multiprocessing.get_context("spawn").Pool(4) as pool:
+            admitted = pool.map(_hit_from_worker, [(path, LIMIT * 4)] * 4)
+        # Con contadores por proceso se admitirían 4 veces más
+        assert sum(admitted) == LIMIT * 4
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name}: ok")
@@ -0,0 +1,37 @@
+# tests/test_resource_monitor.py
+# python -m pytest tests/test_resource_monitor.py  (o python tests/test_resource_monitor.py)
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import psutil
+from loguru import logger
+
+from config import Settings
+from services.resource_monitor import ResourceMonitor
+
+logger.remove()
+
+
+def test_admission_rss_excludes_child_processes():
+    # Un hijo con ~64 MB propios (como un proceso del pool)
+    child = subprocess.Popen(
+        [sys.executable, "-c", "import sys, time; data = bytearray(64 * 1024 * 1024); sys.stdout.write('ok\\n'); sys.stdout.flush(); time.sleep(30)"],
+        stdout=subprocess.PIPE,
+    )
+    try:
+        assert child.stdout.readline() == b"ok\n"
+        snapshot = ResourceMonitor(Settings())._sample(loop_lag=0.0)
+        own = psutil.Process().memory_info().rss
+        assert snapshot.children_rss >= 64 * 1024 * 1024
+        assert abs(snapshot.rss - own) < 32 * 1024 * 1024
+    finally:
+        child.kill()
+        child.wait()
+
+
+if __name__ == "__main__":
+    test_admission_rss_excludes_child_processes()
+    print("OK")
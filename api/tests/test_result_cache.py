@@ -0,0 +1,92 @@
+# tests/test_result_cache.py
+# python -m pytest tests/test_result_cache.py  (o python tests/test_result_cache.py)
+import asyncio
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from loguru import logger
+
+from config import Settings
+from services.result_cache import ResultCache, approximate_size, code_version
+
+logger.remove()
+
+PDF = b"%PDF-1.4 contenido"
+
+
+def response(text: str) -> dict:
+    return {"metadata": {}, "exams": [{"type": "HEMOGRAMA", "raw_text": text}], "total_exams": 1}
+
+
+def make_cache(results_dir: str, **overrides) -> ResultCache:
+    return ResultCache(Settings(RESULTS_DIR=Path(results_dir), **overrides))
+
+
+def test_memory_hits_and_eviction():
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = make_cache(tmp, RESULT_CACHE_SIZE=2, RESULT_CACHE_DISK=False)
+            for index in range(3):
+                cache.put(f"k{index}", response(str(index)))
+            assert await cache.get("k0") is None
+            assert await cache.get("k2") == response("2")
+            assert cache.stats()["memory_entries"] == 2
+            assert (cache.hits, cache.misses) == (1, 1)
+
+            # Límite por bytes: las respuestas con mucho texto desplazan a las anteriores
+            entry_size = approximate_size(response("x" * 10_000))
+            cache = make_cache(tmp, RESULT_CACHE_SIZE=100, RESULT_CACHE_BYTES=entry_size * 3, RESULT_CACHE_DISK=False)
+            for index in range(5):
+                cache.put(f"k{index}", response(str(index) * 10_000))
+            assert cache.stats()["memory_entries"] == 3
+            assert cache.memory_bytes <= entry_size * 3
+            assert await cache.get("k1") is None and await cache.get("k4") is not None
+            # Una respuesta más grande que el límite no entra en memoria
+            cache.put("grande", response("x" * entry_size * 4))
+            assert await cache.get("grande") is None
+
+    asyncio.run(scenario())
+
+
+def test_disk_fallback_shared_between_workers():
+    async def scenario():
+        with tempfile.TemporaryDirectory() as tmp:
+            writer = make_cache(tmp, RESULT_CACHE_DISK=True)
+            key = writer.key_for(PDF)
+            writer.put(key, response("texto"))
+            await writer.flush()
+
+            # Otro worker (sin la entrada en memoria) la lee del disco
+            reader = make_cache(tmp, RESULT_CACHE_DISK=True)
+            assert await reader.get(key) == response("texto")
+            assert reader.disk_hits == 1
+            assert await reader.get(key) == response("texto")
+            assert reader.disk_hits == 1
+
+    asyncio.run(scenario())
+
+
+def test_key_changes_with_patterns_code_and_output_options():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = make_cache(tmp)
+        options = {"medical_check_pages": 2, "ocr": ["tesseract", "spa", 300]}
+        key = cache.key_for(PDF, options)
+        assert key == cache.key_for(bytearray(PDF), dict(options))
+        assert key != cache.key_for(PDF, {**options, "medical_check_pages": 0})
+        assert key != cache.key_for(PDF, {**options, "ocr": None})
+        # Otro código de extracción (p. ej. tras un despliegue) no reutiliza respuestas
+        cache.code_version = "0" * 16
+        assert key != cache.key_for(PDF, options)
+        cache.code_version = code_version()
+        cache.pattern_version = "0" * 16
+        assert key != cache.key_for(PDF, options)
+
+
+if __name__ == "__main__":
+    test_memory_hits_and_eviction()
+    test_disk_fallback_shared_between_workers()
+    test_key_changes_with_patterns_code_and_output_options()
+    print("OK")
@@ -0,0 +1,162 @@
+# tests/test_result_store.py
+# python -m pytest tests/test_result_store.py  (o python tests/test_result_store.py)
+import asyncio
+import fcntl
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from loguru import logger
+
+from config import Settings
+from services.result_store import ResultStore, ResultWriter, normalize_date
+
+logger.remove()
+
+
+def make_store(results_dir: str, **overrides) -> ResultStore:
+    settings = Settings(RESULTS_DIR=Path(results_dir), RESULT_FSYNC=False, **overrides)
+    return ResultStore(settings)
+
+
+def record(index: int, rut: str = "11.111.111-1", value: str = "14.2") -> dict:
+    return {
+        "id": f"doc{index}",
+        "name": f"informe{index}",
+        "original": {},
+        "date": f"2024-01-{index + 1:02d}",
+        "saved_at": float(index),
+        "patient_data": {"rut": rut},
+        "text": "HEMOGLOBINA " * 20,
+        "exams": [{
+            "type": "HEMOGRAMA",
+            "confidence": "1.0",
+            "data": [{"componente": "HEMOGLOBINA", "valor": value, "unidad": "g/dL", "extra": "x"}],
+        }],
+    }
+
+
+def segments(store: ResultStore):
+    return sorted(path.name for path in store.directory.glob("*.jsonl"))
+
+
+def test_store_opens_on_demand_and_rotates_segments():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp, RESULT_SEGMENT_SIZE=1024)
+        # Nada se crea al construirlo (p. ej. al importar main)
+        assert not store.directory.exists()
+        assert store.stats()["documents"] == 0
+
+        for index in range(6):
+            store.append([record(index)])
+        assert len(segments(store)) > 1
+        assert all((store.directory / name).stat().st_size <= 1024 for name in segments(store))
+
+        history = store.history("11111111-1")
+        assert [row["document"] for row in history] == [f"doc{index}" for index in reversed(range(6))]
+        assert history[0]["components"] == [
+            {"componente": "HEMOGLOBINA", "valor": "14.2", "unidad": "g/dL", "rango_referencia": None, "metodo": None}
+        ]
+        assert history[0]["name"] == "informe5"
+        store.close()
+
+
+def test_compaction_is_guarded_by_flock_and_keeps_latest_versions():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp, RESULT_SEGMENT_SIZE=1024)
+        for index in range(4):
+            store.append([record(index)])
+        # Reprocesar deja espacio muerto en los segmentos anteriores
+        for index in range(4):
+            store.append([record(index, value="15.0")])
+        store.close()
+        before = store.stats()["bytes"]
+
+        # Otro proceso compactando: esta llamada no hace nada
+        lock_fd = os.open(str(store.directory / "compact.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            assert store.compact() == 0
+        finally:
+            os.close(lock_fd)
+
+        freed = store.compact()
+        assert freed > 0
+        assert store.stats()["bytes"] == before - freed
+        history = store.history("11111111-1")
+        assert len(history) == 4
+        assert {row["components"][0]["valor"] for row in history} == {"15.0"}
+
+        # Otra instancia (otro worker) lee lo mismo del índice compartido
+        other = make_store(tmp, RESULT_SEGMENT_SIZE=1024)
+        assert other.history("11111111-1") == history
+
+
+def test_document_dates_are_normalized_for_range_queries():
+    saved_at = time.mktime((2024, 6, 1, 12, 0, 0, 0, 0, -1))
+    assert normalize_date("2024-03-05", saved_at) == "2024-03-05"
+    assert normalize_date("2024-03-05T10:30:00", saved_at) == "2024-03-05"
+    assert normalize_date("2024/3/5", saved_at) == "2024-03-05"
+    assert normalize_date("05/03/2024", saved_at) == "2024-03-05"
+    assert normalize_date("5-3-24", saved_at) == "2024-03-05"
+    assert normalize_date("31/02/2024", saved_at) == "2024-06-01"
+    assert normalize_date("marzo", saved_at) == "2024-06-01"
+    assert normalize_date(None, saved_at) == "2024-06-01"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = make_store(tmp)
+        rows = []
+        for index, client_date in enumerate(["05/03/2024", "2024-04-10", "20/12/2023"]):
+            row = record(index)
+            row["date"] = normalize_date(client_date, row["saved_at"])
+            rows.append(row)
+        store.append(rows)
+        history = store.history("11111111-1", date_from="2024-01-01", date_to="2024-03-31")
+        assert [(row["document"], row["date"]) for row in history] == [("doc0", "2024-03-05")]
+        store.close()
+
+
+class BlockingStore:
+    """ResultStore de prueba cuyo append espera hasta que se libere `gate`."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.records = []
+
+    def append(self, records):
+        self.gate.wait(5)
+        self.records.extend(records)
+
+    def close(self):
+        pass
+
+
+def test_writer_applies_backpressure_instead_of_dropping():
+    async def scenario():
+        store = BlockingStore()
+        writer = ResultWriter(Settings(RESULT_WRITE_QUEUE_SIZE=2, RESULT_WRITE_BATCH=1, RESULT_COMPACT_INTERVAL=0), store)
+        writer.start()
+        submits = [asyncio.ensure_future(writer.submit(record(index))) for index in range(6)]
+        await asyncio.sleep(0.05)
+        # Uno en escritura, dos en la cola: el resto espera en `submit`
+        assert sum(submit.done() for submit in submits) == 3
+        store.gate.set()
+        await asyncio.gather(*submits)
+        await writer.close()
+        assert [item["id"] for item in store.records] == [f"doc{index}" for index in range(6)]
+        assert writer.stats() == {"pending": 0, "written": 6, "failed": 0}
+
+    asyncio.run(scenario())
+
+
+if __name__ == "__main__":
+    test_store_opens_on_demand_and_rotates_segments()
+    test_compaction_is_guarded_by_flock_and_keeps_latest_versions()
+    test_document_dates_are_normalized_for_range_queries()
+    test_writer_applies_backpressure_instead_of_dropping()
+    print("OK")
@@ -0,0 +1,86 @@
+# tests/test_text_mode.py
+# python -m pytest tests/test_text_mode.py  (o python tests/test_text_mode.py)
+import base64
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from loguru import logger
+
+from app_client import app_client, load_app
+from models.schemas import ExamResponse, SingleExam
+from synthetic_reports import generate_pdf, generate_report
+
+logger.remove()
+
+TEXT = "PACIENTE X\nHEMOGRAMA\nHEMOGLOBINA 14.2\nPERFIL LIPIDICO\nCOLESTEROL 180\n"
+SECTIONS = {"HEMOGRAMA": [11, 38], "PERFIL LIPIDICO": [38, len(TEXT)]}
+
+
+def full_response() -> ExamResponse:
+    # Como se arma y se cachea: cada examen lleva el texto completo
+    exams = [SingleExam(type=name, raw_text=TEXT) for name in (*SECTIONS, "ORINA")]
+    return ExamResponse(is_medical=True, exams=exams, total_exams=len(exams))
+
+
+def test_full_keeps_document_text_in_every_exam():
+    response = load_app().apply_text_mode(full_response(), "full", SECTIONS)
+    assert [exam.raw_text for exam in response.exams] == [TEXT] * 3
+    assert response.raw_text is None
+
+
+def test_once_moves_document_text_to_the_response():
+    response = load_app().apply_text_mode(full_response(), "once", SECTIONS)
+    assert [exam.raw_text for exam in response.exams] == [None] * 3
+    assert response.raw_text == TEXT
+
+
+def test_section_keeps_each_exam_span():
+    response = load_app().apply_text_mode(full_response(), "section", SECTIONS)
+    assert response.exams[0].raw_text == "HEMOGRAMA\nHEMOGLOBINA 14.2\n"
+    assert response.exams[1].raw_text == "PERFIL LIPIDICO\nCOLESTEROL 180\n"
+    # Sin tramo conocido se deja el texto completo
+    assert response.exams[2].raw_text == TEXT
+    assert response.raw_text is None
+
+
+def test_none_drops_all_text():
+    response = load_app().apply_text_mode(full_response(), "none", SECTIONS)
+    assert [exam.raw_text for exam in response.exams] == [None] * 3
+    assert response.raw_text is None
+
+
+def test_text_modes_on_endpoint_share_the_cached_response():
+    pdf = base64.b64encode(generate_pdf(generate_report(7))).decode()
+    body = {"pdf_data": {"name": "informe", "content": pdf}}
+    with app_client() as client:
+        logger.remove()
+        # La primera llamada llena la caché en modo "full"; las demás se sirven de ella
+        full = client.post("/classify-exam/?text_mode=full", json=body).json()
+        once = client.post("/classify-exam/?text_mode=once", json=body).json()
+        section = client.post("/classify-exam/?text_mode=section", json=body).json()
+        none = client.post("/classify-exam/?text_mode=none", json=body).json()
+        text = full["exams"][0]["raw_text"]
+        assert text and full["raw_text"] is None
+        assert {exam["raw_text"] for exam in full["exams"]} == {text}
+        assert once["raw_text"] == text and {exam["raw_text"] for exam in once["exams"]} == {None}
+        assert section["raw_text"] is None
+        for exam in section["exams"]:
+            assert exam["raw_text"] and exam["raw_text"] in text
+            assert exam["raw_text"] != text or len(section["exams"]) == 1
+        assert none["raw_text"] is None and {exam["raw_text"] for exam in none["exams"]} == {None}
+        # Fuera del texto los cuatro modos responden lo mismo
+        for response in (once, section, none):
+            assert [exam["data"] for exam in response["exams"]] == [exam["data"] for exam in full["exams"]]
+        assert client.post("/classify-exam/?text_mode=otro", json=body).status_code == 422
+
+
+if __name__ == "__main__":
+    test_full_keeps_document_text_in_every_exam()
+    test_once_moves_document_text_to_the_response()
+    test_section_keeps_each_exam_span()
+    test_none_drops_all_text()
+    test_text_modes_on_endpoint_share_the_cached_response()
+    print("OK")
@@ -0,0 +1,120 @@
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+from utils.pattern_artifact import get_patterns
+
+COMPILED_RESULT_PATTERNS = get_patterns().result_patterns
+COMPILED_REFERENCE_PATTERNS = get_patterns().reference_patterns
+
+# Versiones con lookahead: encuentran todos los inicios posibles en una sola pasada
+_START_PATTERNS = get_patterns().start_patterns
+
+# Unidades como subcadenas exactas (misma semántica que `unit in context`)
+UNIT_MATCHER = get_patterns().unit_matcher
+
+
+def _merge_spans(spans: Iterable[Tuple[int, int]], text_length: int) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        end = min(end, text_length)
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        elif start < end:
+            merged.append((start, end))
+    return merged
+
+
+class DocumentIndex:
+    """
+    Índice posicional de un documento: dónde empiezan resultados numéricos,
+    cualitativos, rangos de referencia y unidades.
+
+    Cada tipo se indexa una sola vez por documento y luego se responde si hay
+    un resultado en una ventana `texto[inicio:fin]` con búsquedas binarias,
+    sin volver a recorrer el texto. Equivale a `re.search(patron, texto[inicio:fin])`
+    porque los patrones no usan anclas ni lookaround. Un tipo solo se indexa
+    cuando las ventanas consultadas ya suman lo que costaría indexarlo.
+
+    Si se indican `spans`, solo se indexan esos tramos; las consultas deben
+    caer dentro de ellos (las ventanas de contexto tras cada componente).
+    """
+
+    def __init__(self, text: str, spans: Optional[Iterable[Tuple[int, int]]] = None):
+        self.text = text
+        self.spans = _merge_spans(spans if spans is not None else [(0, len(text))], len(text))
+        self.indexed_length = sum(end - start for start, end in self.spans)
+        self._starts: Dict[str, List[int]] = {}
+        self._direct_length: Dict[str, int] = {}
+        self._unit_starts: Optional[List[int]] = None
+        self._unit_ends: List[int] = []
+
+    def _pattern_starts(self, pattern: Pattern) -> List[int]:
+        """Todas las posiciones donde puede empezar una coincidencia del patrón."""
+        starts = self._starts.get(pattern.pattern)
+        if starts is None:
+            start_pattern = _START_PATTERNS[pattern.pattern]
+            starts = [
+                match.start()
+                for span_start, span_end in self.spans
+                for match in start_pattern.finditer(self.text, span_start, span_end)
+            ]
+            self._starts[pattern.pattern] = starts
+        return starts
+
+    def _index_units(self):
+        # Para cada inicio de unidad, el fin de la unidad más corta que empieza ahí
+        unit_ends: Dict[int, int] = {}
+        for span_start, span_end in self.spans:
+            for hits in UNIT_MATCHER.scan(self.text, span_start, span_end).values():
+                for start, end, _ in hits:
+                    if end < unit_ends.get(start, end + 1):
+                        unit_ends[start] = end
+        self._unit_starts = sorted(unit_ends)
+        self._unit_ends = [unit_ends[start] for start in self._unit_starts]
+
+    def _use_index(self, key: str, start: int, end: int) -> bool:
+        """
+        Mientras lo consultado sea menor que lo que habría que indexar, se busca
+        directamente en la ventana; al superarlo se indexa. Así el costo total
+        por tipo queda acotado por ~2x min(largo del documento, ventanas).
+        """
+        consulted = self._direct_length.get(key, 0) + (end - start)
+        self._direct_length[key] = consulted
+        return consulted >= self.indexed_length
+
+    def _pattern_in_window(self, pattern: Pattern, start: int, end: int) -> bool:
+        if pattern.pattern not in self._starts and not self._use_index(pattern.pattern, start, end):
+            return pattern.search(self.text, start, end) is not None
+        starts = self._pattern_starts(pattern)
+        index = bisect_left(starts, start)
+        while index < len(starts) and starts[index] < end:
+            if pattern.match(self.text, starts[index], end):
+                return True
+            index += 1
+        return False
+
+    def _unit_in_window(self, start: int, end: int) -> bool:
+        if self._unit_starts is None:
+            if not self._use_index("", start, end):
+                return bool(UNIT_MATCHER.scan(self.text, start, end))
+            self._index_units()
+        index = bisect_left(self._unit_starts, start)
+        while index < len(self._unit_starts) and self._unit_starts[index] < end:
+            if self._unit_ends[index] <= end:
+                return True
+            index += 1
+        return False
+
+    def find_result(self, start: int, end: int) -> Optional[str]:
+        """
+        Indica qué tipo de resultado aparece en `texto[start:end]`, en el mismo
+        orden que antes: RESULT_PATTERNS, luego REFERENCE_PATTERNS y luego unidades.
+        """
+        for name, pattern in COMPILED_RESULT_PATTERNS.items():
+            if self._pattern_in_window(pattern, start, end):
+                return name
+        for name, pattern in COMPILED_REFERENCE_PATTERNS.items():
+            if self._pattern_in_window(pattern, start, end):
+                return f"referencia {name}"
+        if self._unit_in_window(start, end):
+            return "unidad"
+        return None
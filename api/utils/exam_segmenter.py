@@ -0,0 +1,80 @@
+# utils/exam_segmenter.py
+import re
+from bisect import bisect_right
+from typing import Any, Dict, List, Optional, Tuple
+from exam_types.result_patterns import SECTION_BREAKS
+
+# (primera línea, última línea) de un tramo del documento, inclusive
+LineRange = Tuple[int, int]
+
+# De SECTION_BREAKS solo las palabras clave (RESULTADOS:, INFORME:, OBSERVACIONES:)
+# cierran la sección en curso: líneas vacías, separadores y títulos como
+# "PARAMETRO RESULTADO UNIDAD" aparecen dentro de las tablas
+SECTION_END_PATTERN = re.compile(SECTION_BREAKS[-1])
+
+DIGITS = re.compile(r"\d")
+
+
+def _is_header(line: str, name: str) -> bool:
+    """
+    Una línea con el nombre de un examen es su encabezado si empieza con el
+    nombre y no trae valores (sin dígitos ni "parámetro: valor"). Así
+    "PARAMETRO RESULTADO UNIDAD", "HEMATIES SIN RESULTADO" o "HEPATITIS C: NEGATIVO"
+    no abren secciones.
+    """
+    return line.startswith(name) and ":" not in line and not DIGITS.search(line)
+
+
+def segment_exams(text: str, detected_exams: List[Dict[str, Any]]) -> Dict[str, Optional[List[LineRange]]]:
+    """
+    Divide el documento en tramos por examen, en una pasada: cada encabezado
+    de un examen detectado (su nombre al inicio de la línea, con el nombre
+    más largo si hay varios) abre su sección, que termina antes del siguiente
+    encabezado de cualquier examen o de una línea de cierre de SECTION_BREAKS.
+    Un examen puede tener varios tramos si su nombre se repite como encabezado.
+    Los exámenes sin encabezado reconocible quedan en None (se extraen del
+    documento completo).
+    """
+    # Un mismo nombre puede ser de varios exámenes (p. ej. SEROLOGIA)
+    names: Dict[str, List[str]] = {}
+    for exam in detected_exams:
+        for name in exam["found"]["nombres"]:
+            exams = names.setdefault(name.upper(), [])
+            if exam["name"] not in exams:
+                exams.append(exam["name"])
+    spans: Dict[str, Optional[List[LineRange]]] = {exam["name"]: None for exam in detected_exams}
+    if not names:
+        return spans
+
+    text_upper = text.upper()
+    lines = text_upper.split("\n")
+    line_starts = [0]
+    position = text_upper.find("\n")
+    while position != -1:
+        line_starts.append(position + 1)
+        position = text_upper.find("\n", position + 1)
+
+    # Encabezados: línea -> exámenes que abren sección en ella
+    headers: Dict[int, List[str]] = {}
+    # Nombres más largos primero: "PERFIL HEPATICO" antes que "HEPATICO"
+    pattern = re.compile(
+        r"\b(?:" + "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True)) + r")\b"
+    )
+    for match in pattern.finditer(text_upper):
+        line_index = bisect_right(line_starts, match.start()) - 1
+        line = lines[line_index].strip()
+        if _is_header(line, match.group(0)):
+            exams = headers.setdefault(line_index, [])
+            exams.extend(name for name in names[match.group(0)] if name not in exams)
+
+    header_lines = sorted(headers)
+    for position, first in enumerate(header_lines):
+        limit = header_lines[position + 1] - 1 if position + 1 < len(header_lines) else len(lines) - 1
+        last = first
+        while last < limit and not SECTION_END_PATTERN.match(lines[last + 1].strip()):
+            last += 1
+        for exam_name in headers[first]:
+            exam_spans = spans[exam_name] or []
+            exam_spans.append((first, last))
+            spans[exam_name] = exam_spans
+    return spans
@@ -0,0 +1,79 @@
+from bisect import bisect_right
+from typing import Any, Dict, Iterator, List, Tuple
+from exam_types.component_aliases import COMPONENT_ALIASES
+from utils.pattern_matcher import LiteralMatcher
+
+# (índice de línea, componentes candidatos en orden, {literal: posición en la línea})
+LineMatch = Tuple[int, List[str], Dict[str, int]]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+class LineClassifier:
+    """
+    Clasificador precompilado de líneas para un tipo de examen.
+
+    Con una sola pasada sobre el texto en mayúsculas asigna a cada línea los
+    componentes del examen que aparecen en ella (por nombre o alias, con
+    límites de palabra) y la primera posición de cada literal en la línea,
+    que luego reutiliza `_find_complete_component_name`.
+    """
+
+    def __init__(self, components: Tuple[str, ...]):
+        self.components = list(components)
+        self.literal_components: Dict[str, List[int]] = {}
+        for index, component in enumerate(self.components):
+            for literal in [component, *COMPONENT_ALIASES.get(component, [])]:
+                # Un literal con minúsculas nunca aparece en una línea en mayúsculas
+                if literal and literal == literal.upper():
+                    indexes = self.literal_components.setdefault(literal, [])
+                    if index not in indexes:
+                        indexes.append(index)
+        self.matcher = LiteralMatcher(self.literal_components, word_boundary=False, uppercase=False)
+
+    def state(self) -> Dict[str, Any]:
+        return {
+            "components": self.components,
+            "literal_components": self.literal_components,
+            "matcher": self.matcher.state(),
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "LineClassifier":
+        classifier = cls.__new__(cls)
+        classifier.components = list(state["components"])
+        classifier.literal_components = {literal: list(indexes) for literal, indexes in state["literal_components"].items()}
+        classifier.matcher = LiteralMatcher.from_state(state["matcher"])
+        return classifier
+
+    def classify(self, text_upper: str) -> Iterator[LineMatch]:
+        """Recorre `text_upper` una vez y devuelve las líneas con algún componente."""
+        line_starts = [0]
+        position = text_upper.find("\n")
+        while position >= 0:
+            line_starts.append(position + 1)
+            position = text_upper.find("\n", position + 1)
+
+        offsets: Dict[int, Dict[str, int]] = {}
+        matched: Dict[int, set] = {}
+        text_length = len(text_upper)
+        for literal, hits in self.matcher.scan(text_upper).items():
+            starts_with_word = _is_word_char(literal[0])
+            ends_with_word = _is_word_char(literal[-1])
+            for start, end, _ in hits:
+                line_index = bisect_right(line_starts, start) - 1
+                line_offsets = offsets.setdefault(line_index, {})
+                offset = start - line_starts[line_index]
+                if offset < line_offsets.get(literal, offset + 1):
+                    line_offsets[literal] = offset
+
+                before_is_word = start > 0 and _is_word_char(text_upper[start - 1])
+                after_is_word = end < text_length and _is_word_char(text_upper[end])
+                if before_is_word != starts_with_word and after_is_word != ends_with_word:
+                    matched.setdefault(line_index, set()).update(self.literal_components[literal])
+
+        for line_index in sorted(matched):
+            candidates = [self.components[index] for index in sorted(matched[line_index])]
+            yield line_index, candidates, offsets[line_index]
@@ -0,0 +1,50 @@
+# utils/log_config.py
+# Configuración de loguru: niveles por módulo desde Settings y sink encolado
+import random
+from typing import Dict
+from loguru import logger
+from config import Settings
+
+LOG_FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+
+_text_sample_rate: float = 0.0
+
+
+def module_levels(settings: Settings) -> Dict[str, str]:
+    """Filtro por módulo de loguru: "" es el nivel por defecto (LOG_LEVEL)"""
+    levels = {"": settings.LOG_LEVEL.upper()}
+    levels.update({module: level.upper() for module, level in settings.LOG_MODULE_LEVELS.items()})
+    return levels
+
+
+def configure_logging(settings: Settings):
+    """
+    Un solo sink en LOG_FILE. El nivel mínimo del sink es el menor de los
+    configurados, así las llamadas bajo ese nivel retornan antes de formatear
+    (los mensajes usan argumentos `{}` en vez de f-strings). Con LOG_ENQUEUE la
+    escritura ocurre en un hilo aparte y los procesos del pool (fork) envían
+    sus mensajes por la misma cola.
+    """
+    global _text_sample_rate
+    _text_sample_rate = settings.LOG_TEXT_SAMPLE_RATE
+
+    levels = module_levels(settings)
+    logger.remove()
+    logger.add(
+        settings.LOG_FILE,
+        format=LOG_FORMAT,
+        level=min(logger.level(level).no for level in levels.values()),
+        filter=levels,
+        enqueue=settings.LOG_ENQUEUE,
+        serialize=settings.LOG_SERIALIZE,
+        rotation="500 MB",
+        retention="30 days"
+    )
+
+
+def sample_text_dump() -> bool:
+    """
+    Si este documento debe volcar su texto completo al log (LOG_TEXT_SAMPLE_RATE,
+    0 = nunca). Solo para depurar: el volcado se escribe a nivel DEBUG.
+    """
+    return _text_sample_rate > 0 and random.random() < _text_sample_rate
@@ -0,0 +1,195 @@
+# utils/ocr.py
+# OCR de las páginas sin capa de texto (PDFs escaneados)
+import hashlib
+import io
+import os
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+from loguru import logger
+from PyPDF2 import PdfReader, PdfWriter
+
+
+class OcrEngine(ABC):
+    """
+    Motor de OCR: `render` convierte un PDF de una página en una imagen PNG y
+    `recognize` obtiene el texto de esa imagen. `name` forma parte de la clave
+    del texto en caché (otro motor o idioma no reutiliza textos ajenos).
+    """
+
+    name = "base"
+
+    def __init__(self, language: str = "spa", dpi: int = 300):
+        self.language = language
+        self.dpi = dpi
+
+    @classmethod
+    def available(cls) -> bool:
+        return True
+
+    @abstractmethod
+    def render(self, page_pdf: bytes) -> bytes:
+        ...
+
+    @abstractmethod
+    def recognize(self, image: bytes) -> str:
+        ...
+
+
+class TesseractEngine(OcrEngine):
+    """Renderiza con Wand (ImageMagick + Ghostscript) y reconoce con pytesseract"""
+
+    name = "tesseract"
+
+    @classmethod
+    def available(cls) -> bool:
+        try:
+            import pytesseract
+            import wand.image  # noqa: F401
+            pytesseract.get_tesseract_version()
+            return True
+        except Exception:
+            return False
+
+    def render(self, page_pdf: bytes) -> bytes:
+        from wand.image import Image
+        with Image(blob=page_pdf, format="pdf", resolution=self.dpi) as image:
+            image.background_color = "white"
+            image.alpha_channel = "remove"
+            image.format = "png"
+            return image.make_blob()
+
+    def recognize(self, image: bytes) -> str:
+        import pytesseract
+        from PIL import Image
+        with Image.open(io.BytesIO(image)) as picture:
+            return pytesseract.image_to_string(picture, lang=self.language)
+
+
+# Motores por nombre (OCR_ENGINE); se registran antes de iniciar el pool para
+# que los procesos hijos (fork) los hereden
+OCR_ENGINES: Dict[str, Callable[..., OcrEngine]] = {
+    "tesseract": TesseractEngine,
+}
+
+
+def register_engine(name: str, factory: Callable[..., OcrEngine]):
+    OCR_ENGINES[name] = factory
+
+
+def engine_available(name: str) -> bool:
+    factory = OCR_ENGINES.get(name)
+    if factory is None:
+        return False
+    check = getattr(factory, "available", None)
+    return check() if check else True
+
+
+def _raw_data(stream) -> bytes:
+    # Bytes tal como están en el PDF, sin aplicar filtros: algunos (p. ej.
+    # /JBIG2Decode) no se pueden decodificar con PyPDF2 y la huella no lo necesita
+    return getattr(stream.get_object(), "_data", b"") or b""
+
+
+def page_hash(page) -> str:
+    """
+    Huella del contenido de una página: tamaño, flujo de contenido y datos de
+    sus XObjects (en un escaneo, la imagen), sin decodificar. La misma página
+    en otro PDF o en un reintento da la misma huella.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([float(value) for value in page.mediabox]).encode("ascii"))
+    contents = page.get("/Contents")
+    if contents is not None:
+        contents = contents.get_object()
+        for stream in contents if isinstance(contents, list) else [contents]:
+            digest.update(_raw_data(stream))
+    resources = page.get("/Resources")
+    xobjects = resources.get_object().get("/XObject") if resources is not None else None
+    if xobjects is not None:
+        xobjects = xobjects.get_object()
+        for name in sorted(xobjects):
+            digest.update(name.encode("utf-8"))
+            digest.update(_raw_data(xobjects[name]))
+    return digest.hexdigest()
+
+
+def single_page_pdf(pdf_source: Union[bytes, str, Path], page_index: int) -> bytes:
+    """PDF con solo la página `page_index` (lo que se renderiza, sin el resto del documento)"""
+    if isinstance(pdf_source, (bytes, bytearray, memoryview)):
+        pdf_source = io.BytesIO(pdf_source)
+    writer = PdfWriter()
+    writer.add_page(PdfReader(pdf_source).pages[page_index])
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+class OcrCache:
+    """
+    Imágenes renderizadas (`<hash>-<dpi>.png`) y textos reconocidos
+    (`<hash>-<motor>-<idioma>.txt`) por huella de página, en disco y
+    compartidos por los procesos del pool y los workers. Un escaneo reintentado
+    no se vuelve a renderizar ni a reconocer.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+
+    def image_path(self, key: str, dpi: int) -> Path:
+        return self.directory / f"{key}-{dpi}.png"
+
+    def text_path(self, key: str, engine: OcrEngine) -> Path:
+        return self.directory / f"{key}-{engine.name}-{engine.language}.txt"
+
+    @staticmethod
+    def read(path: Path) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Entrada de caché OCR ilegible {path}: {e}")
+            return None
+
+    def write(self, path: Path, data: bytes):
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            # Reemplazo atómico: otro proceso nunca lee un archivo a medio escribir
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error guardando caché OCR {path}: {e}")
+
+
+def ocr_page(pdf_source: Union[bytes, str, Path], page_index: int, key: Optional[str],
+             options: Dict[str, Any]) -> str:
+    """
+    Texto de una página por OCR. Se ejecuta en un proceso del pool (una tarea
+    por página). `options`: engine, language, dpi y cache_dir (None = sin caché).
+    Sin huella (`key` None) la página se reconoce sin caché.
+    """
+    engine = OCR_ENGINES[options["engine"]](language=options["language"], dpi=options["dpi"])
+    cache = OcrCache(options["cache_dir"]) if options.get("cache_dir") and key else None
+
+    if cache is not None:
+        text = cache.read(cache.text_path(key, engine))
+        if text is not None:
+            return text.decode("utf-8")
+        image = cache.read(cache.image_path(key, engine.dpi))
+    else:
+        image = None
+
+    if image is None:
+        image = engine.render(single_page_pdf(pdf_source, page_index))
+        if cache is not None:
+            cache.write(cache.image_path(key, engine.dpi), image)
+
+    text = engine.recognize(image)
+    if cache is not None:
+        cache.write(cache.text_path(key, engine), text.encode("utf-8"))
+    logger.debug("OCR página {}: {} caracteres", page_index + 1, len(text))
+    return text
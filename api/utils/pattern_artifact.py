@@ -0,0 +1,254 @@
+# utils/pattern_artifact.py
+# python -m utils.pattern_artifact [--output RUTA] [--check]  (desde api/)
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+from loguru import logger
+import exam_types
+from config import get_settings
+from exam_types import EXAM_PATTERNS, COMPONENT_ALIASES, COMMON_UNITS, ANALYSIS_METHODS, RESULT_PATTERNS, REFERENCE_PATTERNS
+from utils.pattern_matcher import LiteralMatcher
+from utils.line_classifier import LineClassifier
+from utils.unit_lookup import UnitTrie, FirstMatchLookup
+
+# Cambia si cambia la forma del artefacto (claves de `compile_patterns`)
+ARTIFACT_FORMAT = 3
+
+# Módulos cuyo estado va en el artefacto: si cambia su código, el artefacto
+# anterior deja de servir aunque los patrones sean los mismos
+BUILDER_MODULES = ("pattern_matcher.py", "line_classifier.py", "unit_lookup.py", "pattern_artifact.py")
+
+
+def patterns_version() -> str:
+    """
+    Versión de los patrones: hash del contenido de los diccionarios de
+    `exam_types`. Se expone en las respuestas y forma parte de la clave del
+    caché de resultados.
+    """
+    payload = {name: getattr(exam_types, name) for name in exam_types.__all__}
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+def builder_version() -> str:
+    digest = hashlib.sha256(str(ARTIFACT_FORMAT).encode())
+    utils_dir = Path(__file__).resolve().parent
+    for module in BUILDER_MODULES:
+        digest.update((utils_dir / module).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def _flatten(groups: Dict[str, List[str]]) -> List[str]:
+    return [value for values in groups.values() for value in values]
+
+
+def compile_patterns() -> Dict[str, Any]:
+    """
+    Deriva de `exam_types` todo lo que el detector y el extractor usan por
+    solicitud: autómatas de literales, clasificadores de línea por examen
+    (alias -> componente canónico), tablas de unidades y métodos y los
+    patrones de resultado del índice de documentos.
+    """
+    result_patterns = {name: re.compile(pattern) for name, pattern in RESULT_PATTERNS.items()}
+    reference_patterns = {name: re.compile(pattern) for name, pattern in REFERENCE_PATTERNS.items()}
+    return {
+        # Nombres de examen, componentes y aliases en un solo autómata
+        "exam_matcher": LiteralMatcher(
+            [name for patterns in EXAM_PATTERNS.values() for name in patterns['nombres']]
+            + [component for patterns in EXAM_PATTERNS.values() for component in patterns.get('componentes', [])]
+            + [alias for aliases in COMPONENT_ALIASES.values() for alias in aliases]
+        ),
+        # Unidades como subcadenas exactas (misma semántica que `unit in context`)
+        "unit_matcher": LiteralMatcher(_flatten(COMMON_UNITS), word_boundary=False, uppercase=False),
+        "unit_trie": UnitTrie(_flatten(COMMON_UNITS)),
+        "unit_lookup": FirstMatchLookup(_flatten(COMMON_UNITS)),
+        "method_lookup": FirstMatchLookup(_flatten(ANALYSIS_METHODS)),
+        "classifiers": {
+            tuple(patterns["componentes"]): LineClassifier(tuple(patterns["componentes"]))
+            for patterns in EXAM_PATTERNS.values()
+            if patterns.get("componentes")
+        },
+        # Nombre y aliases de cada componente
+        "component_literals": {
+            component: [component, *COMPONENT_ALIASES.get(component, [])]
+            for patterns in EXAM_PATTERNS.values()
+            for component in patterns.get("componentes", [])
+        },
+        "result_patterns": result_patterns,
+        "reference_patterns": reference_patterns,
+        # Con lookahead: todos los inicios posibles en una sola pasada (ver DocumentIndex)
+        "start_patterns": {
+            pattern.pattern: re.compile(f"(?=(?:{pattern.pattern}))")
+            for pattern in [*result_patterns.values(), *reference_patterns.values()]
+        },
+    }
+
+
+def _regex_state(regex: Pattern) -> List[Any]:
+    return [regex.pattern, regex.flags]
+
+
+def tables_to_json(tables: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Tablas de `compile_patterns` como datos planos: textos finales de las
+    regex (con sus flags), tries, literales y prefijos ya derivados. Al
+    cargarlas no se reconstruye nada: los patrones de resultados se compilan
+    con `re.compile` y los autómatas de literales en su primer uso.
+    """
+    return {
+        "exam_matcher": tables["exam_matcher"].state(),
+        "unit_matcher": tables["unit_matcher"].state(),
+        "unit_trie": tables["unit_trie"].state(),
+        "unit_lookup": tables["unit_lookup"].state(),
+        "method_lookup": tables["method_lookup"].state(),
+        "classifiers": [[list(components), classifier.state()] for components, classifier in tables["classifiers"].items()],
+        "component_literals": tables["component_literals"],
+        "result_patterns": {name: _regex_state(regex) for name, regex in tables["result_patterns"].items()},
+        "reference_patterns": {name: _regex_state(regex) for name, regex in tables["reference_patterns"].items()},
+        "start_patterns": {source: _regex_state(regex) for source, regex in tables["start_patterns"].items()},
+    }
+
+
+def tables_from_json(data: Dict[str, Any]) -> Dict[str, Any]:
+    def compile_all(patterns: Dict[str, List[Any]]) -> Dict[str, Pattern]:
+        return {name: re.compile(pattern, flags) for name, (pattern, flags) in patterns.items()}
+
+    return {
+        "exam_matcher": LiteralMatcher.from_state(data["exam_matcher"]),
+        "unit_matcher": LiteralMatcher.from_state(data["unit_matcher"]),
+        "unit_trie": UnitTrie.from_state(data["unit_trie"]),
+        "unit_lookup": FirstMatchLookup.from_state(data["unit_lookup"]),
+        "method_lookup": FirstMatchLookup.from_state(data["method_lookup"]),
+        "classifiers": {
+            tuple(components): LineClassifier.from_state(state) for components, state in data["classifiers"]
+        },
+        "component_literals": data["component_literals"],
+        "result_patterns": compile_all(data["result_patterns"]),
+        "reference_patterns": compile_all(data["reference_patterns"]),
+        "start_patterns": compile_all(data["start_patterns"]),
+    }
+
+
+class PatternSet:
+    """
+    Patrones compilados de una versión de `exam_types`, cargados del artefacto
+    o compilados al iniciar.
+    """
+
+    def __init__(self, version: str, tables: Dict[str, Any]):
+        self.version = version
+        self.exam_matcher: LiteralMatcher = tables["exam_matcher"]
+        self.unit_matcher: LiteralMatcher = tables["unit_matcher"]
+        self.unit_trie: UnitTrie = tables["unit_trie"]
+        self.unit_lookup: FirstMatchLookup = tables["unit_lookup"]
+        self.method_lookup: FirstMatchLookup = tables["method_lookup"]
+        self.classifiers: Dict[Tuple[str, ...], LineClassifier] = tables["classifiers"]
+        self.component_literals: Dict[str, List[str]] = tables["component_literals"]
+        self.result_patterns: Dict[str, Pattern] = tables["result_patterns"]
+        self.reference_patterns: Dict[str, Pattern] = tables["reference_patterns"]
+        self.start_patterns: Dict[str, Pattern] = tables["start_patterns"]
+
+    def line_classifier(self, components: Tuple[str, ...]) -> LineClassifier:
+        """Clasificador de los componentes de un examen (se compila si no es de EXAM_PATTERNS)"""
+        classifier = self.classifiers.get(components)
+        if classifier is None:
+            classifier = self.classifiers[components] = LineClassifier(components)
+        return classifier
+
+    def literals_of(self, component: str) -> List[str]:
+        literals = self.component_literals.get(component)
+        if literals is None:
+            literals = self.component_literals[component] = [component, *COMPONENT_ALIASES.get(component, [])]
+        return literals
+
+
+def save_artifact(path: Path, version: str, builder: str, tables: Dict[str, Any]):
+    """Escribe el artefacto; el reemplazo atómico evita que otro worker lea un archivo a medio escribir."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    artifact = {"format": ARTIFACT_FORMAT, "version": version, "builder": builder, "tables": tables_to_json(tables)}
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(artifact, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+
+def read_artifact(path: Path, version: str, builder: str) -> Tuple[Optional[Dict[str, Any]], str]:
+    """Tablas del artefacto si corresponde a estos patrones y este código; si no, (None, motivo)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            artifact = json.load(f)
+    except FileNotFoundError:
+        return None, "no existe"
+    except Exception as e:
+        return None, f"ilegible ({e})"
+    if not isinstance(artifact, dict) or artifact.get("format") != ARTIFACT_FORMAT:
+        return None, "formato distinto"
+    if artifact.get("version") != version:
+        return None, f"de otra versión de patrones ({artifact.get('version')})"
+    if artifact.get("builder") != builder:
+        return None, "compilado con otro código"
+    try:
+        return tables_from_json(artifact["tables"]), ""
+    except Exception as e:
+        return None, f"ilegible ({e})"
+
+
+def load_patterns(path: Path, write: bool = False) -> PatternSet:
+    """
+    Carga el artefacto de patrones. Si no existe, está desactualizado o no se
+    puede leer, se compila en memoria y (con `write`) se guarda para los
+    siguientes workers.
+    """
+    version, builder = patterns_version(), builder_version()
+    started = time.perf_counter()
+    tables, reason = read_artifact(path, version, builder)
+    if tables is not None:
+        return PatternSet(version, tables)
+
+    logger.info(f"Artefacto de patrones {path} {reason}: se compilan al iniciar")
+    tables = compile_patterns()
+    if write:
+        try:
+            save_artifact(path, version, builder, tables)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el artefacto de patrones {path}: {e}")
+    logger.info(f"Patrones {version} compilados en {(time.perf_counter() - started) * 1000:.1f} ms")
+    return PatternSet(version, tables)
+
+
+@lru_cache()
+def get_patterns() -> PatternSet:
+    settings = get_settings()
+    return load_patterns(settings.pattern_artifact_path, settings.PATTERN_ARTIFACT_WRITE)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compila exam_types en el artefacto de patrones")
+    parser.add_argument("--output", type=Path, default=get_settings().pattern_artifact_path)
+    parser.add_argument("--check", action="store_true",
+                        help="solo verifica que el artefacto esté al día (código de salida 1 si no)")
+    args = parser.parse_args(argv)
+
+    version, builder = patterns_version(), builder_version()
+    if args.check:
+        tables, reason = read_artifact(args.output, version, builder)
+        print(f"{args.output}: {'al día' if tables is not None else reason} (patrones {version})")
+        return 0 if tables is not None else 1
+
+    started = time.perf_counter()
+    tables = compile_patterns()
+    save_artifact(args.output, version, builder, tables)
+    print(f"{args.output}: patrones {version} compilados en {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"({args.output.stat().st_size // 1024} KiB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Tuple
+import re
+
+# Una ocurrencia: (inicio, fin, hay_limite_de_palabra_al_final)
+Hit = Tuple[int, int, bool]
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == "_"
+
+
+def _build_trie(literals: Iterable[str]) -> Dict[str, dict]:
+    trie: Dict[str, dict] = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}  # marca de fin de literal
+    return trie
+
+
+def _trie_to_regex(node: Dict[str, dict]) -> str:
+    """
+    Convierte el trie en una alternancia anidada. Las ramas más largas se
+    prueban primero, por lo que el match es siempre el literal más largo.
+    """
+    branches = [
+        re.escape(char) + _trie_to_regex(child)
+        for char, child in sorted(node.items())
+        if char
+    ]
+    if not branches:
+        return ""
+    alternation = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        return "(?:" + alternation + ")?"
+    return alternation
+
+
+class LiteralMatcher:
+    """
+    Busca todas las ocurrencias de un conjunto de literales en una sola pasada.
+
+    El texto se recorre una vez con una expresión compilada a partir de un trie
+    de los literales (equivalente a un autómata Aho-Corasick para este caso).
+    En cada posición con límite de palabra se obtiene el literal más largo y,
+    a partir de él, todos los literales que son prefijo suyo.
+
+    Con `word_boundary=False` se buscan como subcadenas (como `literal in texto`)
+    y con `uppercase=False` los literales se mantienen tal cual.
+
+    La expresión se compila en el primer `scan`: compilar la alternancia de
+    un trie grande es lo más caro de construir el matcher, y un proceso que
+    no usa un matcher (p. ej. el clasificador de un examen que nunca aparece)
+    no lo paga.
+    """
+
+    def __init__(self, literals: Iterable[str], word_boundary: bool = True, uppercase: bool = True):
+        self.literals = sorted({literal.upper() if uppercase else literal for literal in literals if literal})
+        boundary = r"\b" if word_boundary else ""
+        self._source = r"(?=" + boundary + "(" + _trie_to_regex(_build_trie(self.literals)) + r"))"
+        self._compiled: Optional[Pattern] = None
+
+        # Para cada literal: los literales que son prefijo propio suyo, junto con
+        # si terminan en límite de palabra (se decide dentro del propio literal).
+        literal_set = set(self.literals)
+        self._prefixes: Dict[str, List[Tuple[str, bool]]] = {}
+        for literal in self.literals:
+            prefixes = []
+            for size in range(1, len(literal)):
+                prefix = literal[:size]
+                if prefix in literal_set:
+                    bounded = _is_word_char(prefix[-1]) != _is_word_char(literal[size])
+                    prefixes.append((prefix, bounded))
+            self._prefixes[literal] = prefixes
+
+    def state(self) -> Dict[str, Any]:
+        """Estado ya derivado (solo strings, listas y dicts) para el artefacto de patrones."""
+        return {
+            "literals": self.literals,
+            "pattern": self._source,
+            "prefixes": self._prefixes,
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "LiteralMatcher":
+        """Reconstruye el matcher de `state()` sin derivar nada; la regex se compila al usarla."""
+        matcher = cls.__new__(cls)
+        matcher.literals = list(state["literals"])
+        matcher._source = state["pattern"]
+        matcher._compiled = None
+        matcher._prefixes = {
+            literal: [(prefix, bool(bounded)) for prefix, bounded in prefixes]
+            for literal, prefixes in state["prefixes"].items()
+        }
+        return matcher
+
+    @property
+    def _regex(self) -> Pattern:
+        if self._compiled is None:
+            self._compiled = re.compile(self._source)
+        return self._compiled
+
+    def scan(self, text: str, start: int = 0, end: Optional[int] = None) -> Dict[str, List[Hit]]:
+        """
+        Recorre el texto (ya en mayúsculas) y devuelve {literal: [(inicio, fin, limite)]}.
+        `limite` indica si `\\b` se cumple al final, igual que `\\bLITERAL\\b`.
+        Con `start`/`end` solo se buscan literales contenidos en ese tramo.
+        """
+        hits: Dict[str, List[Hit]] = {}
+        text_length = len(text)
+        for match in self._regex.finditer(text, start, text_length if end is None else end):
+            start = match.start()
+            longest = match.group(1)
+            for literal, bounded in self._prefixes[longest]:
+                hits.setdefault(literal, []).append((start, start + len(literal), bounded))
+
+            end = start + len(longest)
+            after_is_word = end < text_length and _is_word_char(text[end])
+            bounded = _is_word_char(longest[-1]) != after_is_word
+            hits.setdefault(longest, []).append((start, end, bounded))
+        return hits
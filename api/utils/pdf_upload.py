@@ -0,0 +1,571 @@
+# utils/pdf_upload.py
+# Lectura por trozos de PDFs subidos (JSON con base64, cuerpo binario o multipart)
+import binascii
+import codecs
+import json
+import re
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+from multipart.exceptions import MultipartParseError
+
+READ_CHUNK_SIZE = 64 * 1024
+# Bytes máximos del JSON sin el string del PDF (nombre, tipo, fecha, ...) y de
+# las cabeceras de cada parte multipart
+MAX_SKELETON_SIZE = 64 * 1024
+
+_NON_BASE64 = re.compile(r"[^A-Za-z0-9+/=]")
+_STRING_STOP = re.compile(r'["\\]')
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"El PDF supera el tamaño máximo de {max_size} bytes")
+
+
+class Base64StreamDecoder:
+    """
+    Decodificador base64 incremental: acepta el texto por trozos y escribe los
+    bytes en un único buffer. Igual que `base64.b64decode` sin validación,
+    descarta los caracteres fuera del alfabeto.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.output = bytearray()
+        self.elapsed = 0.0  # segundos decodificando (sin contar la espera de red)
+        self._pending = ""
+
+    def feed(self, text: str):
+        start = time.perf_counter()
+        self._pending += _NON_BASE64.sub("", text)
+        complete = len(self._pending) - len(self._pending) % 4
+        if complete:
+            self.output += binascii.a2b_base64(self._pending[:complete])
+            self._pending = self._pending[complete:]
+        self.elapsed += time.perf_counter() - start
+        if len(self.output) > self.max_size:
+            raise _too_large(self.max_size)
+
+    def finish(self) -> bytearray:
+        if self._pending:
+            # Igual que b64decode: un resto que no completa un bloque es un error de padding
+            self.output += binascii.a2b_base64(self._pending)
+            self._pending = ""
+        return self.output
+
+
+class JSONContentStream:
+    """
+    Recorre un cuerpo JSON por trozos sin cargarlo entero. El string ubicado en
+    `path` (por defecto pdf_data.content) se entrega al decodificador base64 a
+    medida que llega; el resto del documento se acumula (hasta `max_skeleton`
+    bytes, si no 413) y se devuelve con ese string reemplazado por "".
+    """
+
+    def __init__(self, decoder: Base64StreamDecoder, path: Tuple[str, ...] = ("pdf_data", "content"),
+                 max_skeleton: int = MAX_SKELETON_SIZE):
+        self.decoder = decoder
+        self.path = list(path)
+        self.skeleton: List[str] = []
+        self.max_skeleton = max_skeleton
+        self._skeleton_size = 0
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        # Pila de contenedores abiertos: [tipo, clave actual, esperando clave]
+        self._stack: List[List[Any]] = []
+        self._in_string = False
+        self._streaming = False
+        self._string_is_key = False
+        self._string: List[str] = []
+        self._escape: Optional[str] = None
+
+    def feed(self, chunk: bytes):
+        self._consume(self._text_decoder.decode(chunk))
+
+    def finish(self) -> Dict[str, Any]:
+        self._consume(self._text_decoder.decode(b"", final=True))
+        return json.loads("".join(self.skeleton))
+
+    def _keep(self, piece: str):
+        self._skeleton_size += len(piece)
+        if self._skeleton_size > self.max_skeleton:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El JSON sin el contenido del PDF supera {self.max_skeleton} bytes"
+            )
+        self.skeleton.append(piece)
+
+    def _current_path(self) -> List[Optional[str]]:
+        return [entry[1] if entry[0] == "{" else None for entry in self._stack]
+
+    def _consume(self, text: str):
+        position = 0
+        while position < len(text):
+            if self._streaming:
+                position = self._consume_streamed(text, position)
+            elif self._in_string:
+                position = self._consume_string(text, position)
+            else:
+                self._consume_structure(text[position])
+                position += 1
+
+    def _consume_structure(self, char: str):
+        top = self._stack[-1] if self._stack else None
+        if char == '"':
+            self._string_is_key = bool(top and top[0] == "{" and top[2])
+            if not self._string_is_key and self._current_path() == self.path:
+                self._streaming = True
+                self._keep('""')
+                return
+            self._in_string = True
+            self._string = []
+        elif char in "{[":
+            self._stack.append([char, None, char == "{"])
+        elif char in "}]":
+            if self._stack:
+                self._stack.pop()
+        elif char == "," and top and top[0] == "{":
+            top[2] = True
+        elif char == ":" and top and top[0] == "{":
+            top[2] = False
+        self._keep(char)
+
+    def _consume_string(self, text: str, position: int) -> int:
+        # Strings normales (claves y valores cortos): se copian al esqueleto
+        match = _STRING_STOP.search(text, position)
+        end = match.start() if match else len(text)
+        if self._escape is not None:
+            end = position + 1
+        piece = text[position:end]
+        self._keep(piece)
+        self._string.append(piece)
+        if self._escape is not None:
+            self._escape = None
+            return end
+        if not match:
+            return end
+
+        char = text[end]
+        self._keep(char)
+        if char == "\\":
+            self._escape = char
+            self._string.append(char)
+            return end + 1
+
+        self._in_string = False
+        if self._string_is_key:
+            self._stack[-1][1] = json.loads('"' + "".join(self._string) + '"')
+        return end + 1
+
+    def _consume_streamed(self, text: str, position: int) -> int:
+        # String con el PDF: va directo al decodificador, sin copiarse al esqueleto
+        if self._escape is not None:
+            self._escape += text[position]
+            position += 1
+            if self._escape[1] == "u" and len(self._escape) < 6:
+                return position
+            if self._escape[1] == "u":
+                self.decoder.feed(chr(int(self._escape[2:], 16)))
+            else:
+                self.decoder.feed(_JSON_ESCAPES.get(self._escape[1], ""))
+            self._escape = None
+            return position
+
+        match = _STRING_STOP.search(text, position)
+        end = match.start() if match else len(text)
+        self.decoder.feed(text[position:end])
+        if not match:
+            return end
+        if text[end] == "\\":
+            self._escape = "\\"
+            return end + 1
+        self._streaming = False
+        return end + 1
+
+
+class ItemDecoder(Base64StreamDecoder):
+    """
+    Decodificador de un documento de un lote: un error (413 o base64 inválido)
+    queda en `error` y el resto del string se descarta sin cortar la lectura
+    del lote.
+    """
+
+    def __init__(self, max_size: int):
+        super().__init__(max_size)
+        self.error: Optional[HTTPException] = None
+
+    def feed(self, text: str):
+        if self.error is None:
+            try:
+                super().feed(text)
+            except HTTPException as e:
+                self._fail(e)
+
+    def finish(self) -> bytearray:
+        if self.error is None:
+            try:
+                return super().finish()
+            except binascii.Error:
+                self._fail(HTTPException(status_code=400, detail="Invalid base64 content"))
+        return bytearray()
+
+    def _fail(self, error: HTTPException):
+        self.error = error
+        self.output = bytearray()
+        self._pending = ""
+
+
+# (índice en el lote, JSON del documento con content vacío, bytes del PDF, error)
+BatchItem = Tuple[int, Optional[Dict[str, Any]], bytearray, Optional[HTTPException]]
+
+
+class JSONBatchStream(JSONContentStream):
+    """
+    Cuerpo {"pdf_data": [{..., "content": "<base64>"}, ...]} por trozos: cada
+    documento queda en `items` en cuanto se cierra su objeto, decodificado con
+    su propio `ItemDecoder`. Del esqueleto se quita cada documento emitido, así
+    que la memoria queda acotada al documento en curso aunque el lote sea grande.
+    """
+
+    ITEM_PATH = ["pdf_data", None]
+
+    def __init__(self, max_size: int, max_items: int):
+        super().__init__(ItemDecoder(max_size), path=("pdf_data", None, "content"))
+        self.max_size = max_size
+        self.max_items = max_items
+        self.count = 0
+        self.items: List[BatchItem] = []
+        self._item_start: Optional[int] = None
+
+    def _consume_structure(self, char: str):
+        if char == "{" and self._item_start is None and self._current_path() == self.ITEM_PATH:
+            if self.max_items and self.count >= self.max_items:
+                raise HTTPException(status_code=413, detail=f"El lote supera {self.max_items} documentos")
+            self.decoder = ItemDecoder(self.max_size)
+            self._item_start = len(self.skeleton)
+            super()._consume_structure(char)
+        elif char == "}" and self._item_start is not None and len(self._stack) == len(self.ITEM_PATH) + 1:
+            super()._consume_structure(char)
+            self._emit_item()
+        else:
+            super()._consume_structure(char)
+
+    def _emit_item(self):
+        text = "".join(self.skeleton[self._item_start:])
+        del self.skeleton[self._item_start:]
+        self._skeleton_size -= len(text)
+        self._keep("null")
+        self._item_start = None
+
+        content = self.decoder.finish()
+        error = self.decoder.error
+        try:
+            metadata = json.loads(text)
+        except ValueError as e:
+            metadata, error = None, HTTPException(status_code=422, detail=f"Invalid JSON item: {e}")
+        self.items.append((self.count, metadata, content, error))
+        self.count += 1
+
+
+async def read_json_batch(request: Request, max_size: int, max_items: int) -> AsyncIterator[BatchItem]:
+    """
+    Documentos de un lote a medida que llegan. El cuerpo se sigue leyendo solo
+    cuando se pide el siguiente documento, así quien consume controla cuántos
+    hay decodificados en memoria. Un error del JSON envolvente o más de
+    `max_items` documentos lanza HTTPException tras los documentos ya leídos.
+    """
+    stream = JSONBatchStream(max_size, max_items)
+    body, error = None, None
+    try:
+        async for chunk in request.stream():
+            stream.feed(chunk)
+            while stream.items:
+                yield stream.items.pop(0)
+        body = stream.finish()
+    except ValueError as e:
+        error = HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    except HTTPException as e:
+        error = e
+    for item in stream.items:
+        yield item
+    if error is not None:
+        raise error
+    if not isinstance(body, dict) or not isinstance(body.get("pdf_data"), list):
+        raise HTTPException(status_code=422, detail="pdf_data debe ser una lista de documentos")
+
+
+class MultipartPDFStream:
+    """
+    Cuerpo multipart/form-data por trozos (con el parser de python-multipart,
+    como Starlette, pero sin `request.form()`, que guarda todo el cuerpo antes
+    de devolverlo). Solo se conservan los bytes del campo `field`, cortando en
+    cuanto superan `max_size`; los demás campos se descartan.
+    """
+
+    def __init__(self, content_type: str, max_size: int, field: str = "file"):
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise HTTPException(status_code=400, detail="Multipart sin boundary")
+        self.max_size = max_size
+        self.field = field.encode("latin-1")
+        self.content = bytearray()
+        self.filename: Optional[str] = None
+        self.found = False
+        self._headers_size = 0
+        self._header_field = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_field = False
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def feed(self, chunk: bytes):
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as e:
+            raise HTTPException(status_code=400, detail=f"Multipart inválido: {e}")
+
+    def finish(self) -> bytearray:
+        self._parser.finalize()
+        return self.content
+
+    def _count_header(self, size: int):
+        self._headers_size += size
+        if self._headers_size > MAX_SKELETON_SIZE:
+            raise HTTPException(status_code=413, detail="Cabeceras multipart demasiado grandes")
+
+    def _on_part_begin(self):
+        self._disposition = b""
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._count_header(end - start)
+        self._header_field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._count_header(end - start)
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_field.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # Solo la primera parte con ese nombre
+        self._in_field = options.get(b"name") == self.field and not self.found
+        if self._in_field:
+            self.found = True
+            filename = options.get(b"filename")
+            self.filename = filename.decode("utf-8", errors="replace") if filename else None
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_field:
+            self.content += data[start:end]
+            if len(self.content) > self.max_size:
+                raise _too_large(self.max_size)
+
+    def _on_part_end(self):
+        self._in_field = False
+
+
+async def read_json_pdf_request(request: Request, max_size: int) -> Tuple[Dict[str, Any], bytearray]:
+    """
+    Lee un cuerpo {"pdf_data": {..., "content": "<base64>"}} por trozos.
+    Devuelve el JSON (con content vacío) y los bytes del PDF decodificados una sola vez.
+    El tiempo de decodificación queda en `request.state.decode_seconds`.
+    """
+    decoder = Base64StreamDecoder(max_size)
+    stream = JSONContentStream(decoder)
+    try:
+        async for chunk in request.stream():
+            stream.feed(chunk)
+        body = stream.finish()
+        content = decoder.finish()
+        request.state.decode_seconds = decoder.elapsed
+    except HTTPException:
+        raise
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="Invalid base64 content")
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON body: {e}")
+    return body, content
+
+
+async def read_pdf_upload(request: Request, max_size: int) -> Tuple[bytearray, Optional[str]]:
+    """
+    Lee un PDF enviado como cuerpo binario (application/pdf) o como multipart
+    (campo `file`), cortando en cuanto supera `max_size`.
+    Devuelve los bytes y el nombre de archivo, si viene.
+    """
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_size + READ_CHUNK_SIZE:
+        raise _too_large(max_size)
+
+    content = bytearray()
+    filename = None
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        multipart = MultipartPDFStream(content_type, max_size)
+        # Los demás campos y separadores tienen la misma holgura que Content-Length
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > max_size + READ_CHUNK_SIZE:
+                raise _too_large(max_size)
+            multipart.feed(chunk)
+        content = multipart.finish()
+        if not multipart.found:
+            raise HTTPException(status_code=400, detail="No PDF file provided")
+        filename = multipart.filename
+    else:
+        async for chunk in request.stream():
+            content += chunk
+            if len(content) > max_size:
+                raise _too_large(max_size)
+
+    if not content:
+        raise HTTPException(status_code=400, detail="No PDF content provided")
+    return content, filename
+
+
+# Verificación estructural previa: los lectores de PDF buscan la cabecera en
+# los primeros 1024 bytes y la marca de fin (y startxref) en los últimos 1024.
+# Solo se leen el trailer y los objetos a los que apunta la tabla xref, nunca
+# el documento completo: corre en el event loop antes de la consulta al caché.
+PDF_HEADER = b"%PDF-"
+PDF_EOF = b"%%EOF"
+MARKER_WINDOW = 1024
+# Bytes que se leen de un trailer u objeto (catálogo, raíz del árbol de páginas)
+OBJECT_WINDOW = 64 * 1024
+# Secciones xref encadenadas con /Prev (actualizaciones incrementales) que se recorren
+MAX_XREF_SECTIONS = 32
+# Cada entrada de una tabla xref clásica mide exactamente 20 bytes
+XREF_ENTRY_SIZE = 20
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_XREF_SUBSECTION = re.compile(rb"\s*(\d+)[ \t]+(\d+)[ \t]*\r?\n")
+_TRAILER = re.compile(rb"\s*trailer")
+_ROOT = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+_PAGES_ROOT = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_PAGE_COUNT = re.compile(rb"/Count\s+(\d+)")
+
+
+def _last_xref_offset(content: bytes) -> Optional[int]:
+    """Posición de la última sección xref según el startxref final."""
+    matches = list(_STARTXREF.finditer(content, max(0, len(content) - MARKER_WINDOW)))
+    if not matches:
+        return None
+    offset = int(matches[-1].group(1))
+    return offset if offset < len(content) else None
+
+
+def _xref_section(content: bytes, offset: int) -> Tuple[Optional[List[Tuple[int, int, int]]], Optional[bytes]]:
+    """
+    Subsecciones (primer objeto, cantidad, posición de sus entradas) y
+    diccionario del trailer de la sección xref en `offset`. Un xref stream
+    (PDF 1.5+) no tiene subsecciones legibles sin descomprimir (None): su
+    diccionario hace de trailer.
+    """
+    if not content.startswith(b"xref", offset):
+        end = content.find(b"stream", offset, offset + OBJECT_WINDOW)
+        dictionary = content[offset:end] if end != -1 else None
+        return None, dictionary if dictionary and b"/XRef" in dictionary else None
+    subsections = []
+    position = offset + len(b"xref")
+    while True:
+        header = _XREF_SUBSECTION.match(content, position)
+        if not header:
+            break
+        first, count = int(header.group(1)), int(header.group(2))
+        subsections.append((first, count, header.end()))
+        position = header.end() + count * XREF_ENTRY_SIZE
+    trailer = _TRAILER.match(content, position)
+    if not trailer:
+        return subsections, None
+    window = content[trailer.end():trailer.end() + OBJECT_WINDOW]
+    end = window.find(b"startxref")
+    return subsections, window[:end] if end != -1 else window
+
+
+def _object_offset(content: bytes, offset: int, number: int) -> Optional[int]:
+    """
+    Posición del objeto `number` según las tablas xref, de la más reciente a
+    las anteriores (/Prev). None si está en un xref stream o no aparece.
+    """
+    for _ in range(MAX_XREF_SECTIONS):
+        subsections, trailer = _xref_section(content, offset)
+        if subsections is None:
+            # Un xref stream puede redefinir el objeto: las secciones anteriores no sirven
+            return None
+        for first, count, entries in subsections:
+            if first <= number < first + count:
+                entry = content[entries + (number - first) * XREF_ENTRY_SIZE:][:XREF_ENTRY_SIZE]
+                # "nnnnnnnnnn ggggg n": en uso; "f": libre
+                return int(entry[:10]) if entry[17:18] == b"n" and entry[:10].isdigit() else None
+        previous = _PREV.search(trailer) if trailer else None
+        if not previous:
+            return None
+        offset = int(previous.group(1))
+    return None
+
+
+def _read_object(content: bytes, offset: int, number: int) -> Optional[bytes]:
+    """Cuerpo del objeto `number` (hasta endobj o OBJECT_WINDOW bytes)."""
+    position = _object_offset(content, offset, number)
+    if position is None or not re.match(rb"\s*%d\s+\d+\s+obj\b" % number, content[position:position + 64]):
+        return None
+    body = content[position:position + OBJECT_WINDOW]
+    end = body.find(b"endobj")
+    return body[:end] if end != -1 else body
+
+
+def _root_page_count(content: bytes, offset: int, trailer: bytes) -> Optional[int]:
+    """/Count del nodo raíz del árbol de páginas: trailer -> /Root -> /Pages."""
+    root = _ROOT.search(trailer)
+    catalog = _read_object(content, offset, int(root.group(1))) if root else None
+    pages = _PAGES_ROOT.search(catalog) if catalog else None
+    tree = _read_object(content, offset, int(pages.group(1))) if pages else None
+    count = _PAGE_COUNT.search(tree) if tree else None
+    return int(count.group(1)) if count else None
+
+
+def declared_pages(content: bytes) -> Optional[int]:
+    """
+    Páginas declaradas en el nodo raíz del árbol de páginas, ubicado con el
+    trailer y la tabla xref. None si no se ve en los bytes, p. ej. si la
+    tabla es un xref stream o el árbol está en un object stream comprimido.
+    """
+    offset = _last_xref_offset(content)
+    if offset is None:
+        return None
+    _, trailer = _xref_section(content, offset)
+    return _root_page_count(content, offset, trailer) if trailer is not None else None
+
+
+def check_pdf_structure(content: bytes, max_pages: int = 0):
+    """
+    Rechaza con 400, sin abrir el PDF, lo que no se podría procesar: sin
+    cabecera %PDF-, truncado (sin %%EOF) o con más de `max_pages` páginas
+    declaradas (0 = sin límite). Los PDF cifrados no se rechazan aquí: los que
+    solo tienen contraseña de propietario se leen con la contraseña vacía.
+    """
+    if PDF_HEADER not in content[:MARKER_WINDOW]:
+        raise HTTPException(status_code=400, detail="El archivo no es un PDF")
+    if PDF_EOF not in content[-MARKER_WINDOW:]:
+        raise HTTPException(status_code=400, detail="El PDF está incompleto o dañado")
+    if max_pages:
+        # Sin trailer legible el lector intenta reconstruir la tabla; no se rechaza aquí
+        pages = declared_pages(content)
+        if pages is not None and pages > max_pages:
+            raise HTTPException(status_code=400, detail=f"El PDF tiene {pages} páginas (máximo {max_pages})")
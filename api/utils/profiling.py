@@ -0,0 +1,73 @@
+# utils/profiling.py
+# Perfilado de una ejecución del pipeline dentro del proceso del pool
+import cProfile
+import io
+import marshal
+import pstats
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class PatternTimer:
+    """
+    Acumula llamadas y segundos por entrada de patrones, p. ej.
+    ("EXAM_PATTERNS", "HEMOGRAMA:HEMOGLOBINA") o ("COMPONENT_ALIASES", "HEMOGLOBINA:HB").
+    """
+
+    def __init__(self):
+        self.entries: Dict[Tuple[str, str], List[float]] = {}
+
+    def add(self, source: str, key: str, seconds: float):
+        entry = self.entries.get((source, key))
+        if entry is None:
+            self.entries[(source, key)] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        ranked = sorted(self.entries.items(), key=lambda item: item[1][1], reverse=True)
+        return [
+            {"source": source, "key": key, "calls": int(calls), "seconds": seconds}
+            for (source, key), (calls, seconds) in ranked[:limit]
+        ]
+
+
+# Temporizador activo en este proceso; None fuera de una ejecución perfilada
+# (los servicios solo miden cuando hay uno, así el camino normal no paga nada)
+_active: Optional[PatternTimer] = None
+
+
+def active_timer() -> Optional[PatternTimer]:
+    return _active
+
+
+def profile_call(func: Callable, *args, top: int = 30) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Ejecuta `func(*args)` bajo cProfile y con un PatternTimer activo.
+    Devuelve el resultado y el perfil: estadísticas crudas (formato .prof,
+    legible con pstats/snakeviz), resumen de texto y patrones más costosos.
+    """
+    global _active
+    timer = PatternTimer()
+    profiler = cProfile.Profile()
+    _active = timer
+    started = time.perf_counter()
+    profiler.enable()
+    try:
+        result = func(*args)
+    finally:
+        profiler.disable()
+        _active = None
+    elapsed = time.perf_counter() - started
+
+    summary = io.StringIO()
+    stats = pstats.Stats(profiler, stream=summary)
+    stats.sort_stats("cumulative").print_stats(top)
+    profiler.create_stats()
+    return result, {
+        "seconds": elapsed,
+        "stats": marshal.dumps(profiler.stats),
+        "summary": summary.getvalue(),
+        "patterns": timer.top(top),
+    }
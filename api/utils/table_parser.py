@@ -0,0 +1,123 @@
+# utils/table_parser.py
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Pattern, Tuple
+from exam_types.result_patterns import TABLE_FORMATS, TABLE_COLUMNS
+
+# Orden en que se prueban los formatos sobre la fila de encabezado: primero los
+# de separador explícito; "mixed" acepta cualquiera y queda al final
+FORMAT_ORDER = ("lined", "csv", "simple", "mixed")
+FORMAT_SPLITTERS: Dict[str, Pattern] = {name: re.compile(TABLE_FORMATS[name]) for name in FORMAT_ORDER}
+# En csv con ";" la coma suele ser el separador decimal: se separa solo por ";"
+SEMICOLON_SPLITTER = re.compile(r";")
+
+# (título, rol) con los títulos más largos primero: "VALORES DE REFERENCIA"
+# es referencia aunque contenga "VALOR"
+COLUMN_TITLES: List[Tuple[str, str]] = sorted(
+    ((title, role) for role, titles in TABLE_COLUMNS.items() for title in titles),
+    key=lambda item: len(item[0]),
+    reverse=True
+)
+HEADER_HINT = re.compile(
+    r"\b(?:" + "|".join(re.escape(title) for title, _ in COLUMN_TITLES if title) + r")"
+)
+
+# Columnas que toda tabla de resultados debe tener
+REQUIRED_ROLES = ("componente", "valor")
+
+# (índice de línea dentro del tramo, formato) de cada fila de encabezado
+LayoutAt = Tuple[int, "TableLayout"]
+
+
+class TableLayout:
+    """
+    Formato de una tabla de resultados, obtenido una vez de su fila de
+    encabezado: el separador de TABLE_FORMATS y el rol de cada columna
+    (componente, valor, unidad, referencia, metodo).
+    """
+
+    def __init__(self, format_name: str, splitter: Pattern, roles: List[str]):
+        self.format_name = format_name
+        self.splitter = splitter
+        self.roles = roles
+        # Con separador explícito una celda vacía es una columna sin dato; con
+        # espacios ("simple"/"mixed") las celdas vacías son solo relleno
+        self.positional = format_name in ("lined", "csv")
+
+    def split(self, line: str) -> List[str]:
+        cells = [cell.strip() for cell in self.splitter.split(line.strip())]
+        if not self.positional:
+            return [cell for cell in cells if cell]
+        # "| A | B |": los bordes de la fila no son columnas
+        while cells and not cells[0]:
+            cells.pop(0)
+        while cells and not cells[-1]:
+            cells.pop()
+        return cells
+
+    def row(self, line: str) -> Optional[Dict[str, str]]:
+        """
+        Celdas de una fila por rol, o None si no tiene forma de fila de esta
+        tabla. Las celdas sobrantes a la derecha quedan juntas en "extra".
+        """
+        cells = self.split(line)
+        if len(cells) < len(REQUIRED_ROLES):
+            return None
+        fields = dict(zip(self.roles, cells))
+        if len(cells) > len(self.roles):
+            fields["extra"] = " ".join(cells[len(self.roles):])
+        return fields
+
+
+def column_role(title: str) -> Optional[str]:
+    for keyword, role in COLUMN_TITLES:
+        if keyword in title:
+            return role
+    return None
+
+
+@lru_cache(maxsize=256)
+def parse_header(line_upper: str) -> Optional[TableLayout]:
+    """
+    Formato de tabla si `line_upper` es una fila de encabezado: con algún
+    formato de TABLE_FORMATS se separa en dos o más títulos, todos con rol,
+    sin repetir y con al menos componente y valor. Las cabeceras se repiten
+    en cada sección, por eso se guardan en caché.
+    """
+    for format_name in FORMAT_ORDER:
+        splitter = FORMAT_SPLITTERS[format_name]
+        if format_name == "csv" and ";" in line_upper:
+            splitter = SEMICOLON_SPLITTER
+        titles = [title.strip() for title in splitter.split(line_upper.strip()) if title.strip()]
+        if len(titles) < 2:
+            continue
+        roles = [column_role(title) for title in titles]
+        if None in roles or len(set(roles)) != len(roles):
+            continue
+        if all(role in roles for role in REQUIRED_ROLES):
+            return TableLayout(format_name, splitter, roles)
+    return None
+
+
+def find_layouts(section_upper: str) -> List[LayoutAt]:
+    """
+    Filas de encabezado de un tramo, en una pasada: solo se analizan las
+    líneas que contienen algún título de columna. Cada formato rige para las
+    filas que siguen hasta el próximo encabezado.
+    """
+    layouts: List[LayoutAt] = []
+    line_index = 0
+    counted = 0
+    last_start = -1
+    for match in HEADER_HINT.finditer(section_upper):
+        start = section_upper.rfind("\n", 0, match.start()) + 1
+        if start == last_start:
+            continue
+        last_start = start
+        end = section_upper.find("\n", match.end())
+        layout = parse_header(section_upper[start:end if end != -1 else len(section_upper)].strip())
+        if layout is not None:
+            line_index += section_upper.count("\n", counted, start)
+            counted = start
+            layouts.append((line_index, layout))
+    return layouts
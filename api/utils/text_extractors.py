@@ -1,54 +1,130 @@
 from loguru import logger
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Iterator, List, Tuple, Union, BinaryIO
+from pathlib import Path
 from fastapi import UploadFile
+import io
 import re
 from PyPDF2 import PdfReader
 from datetime import datetime
 from utils.text_normalizer import TextNormalizer  
+from utils.log_config import sample_text_dump
+from utils.ocr import page_hash
 
 async def extract_text_from_pdf(file: UploadFile) -> Optional[str]:
-    """Extrae texto de un archivo PDF utilizando PyPDF2."""
+    """Extrae texto de un archivo PDF utilizando PyPDF2, directamente desde memoria."""
     try:
         content = await file.read()
-        with open("temp.pdf", "wb") as temp_file:
-            temp_file.write(content)
+        return read_pdf_text(content)
+    except Exception as e:
+        logger.error(f"Error al extraer texto del PDF: {e}")
+        return None
+
 
-        reader = PdfReader("temp.pdf")
-        full_text = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                full_text.append(text)
+def read_pdf_text(source: Union[bytes, str, Path, BinaryIO], stats: Optional[Dict[str, Any]] = None,
+                  hash_empty: bool = False) -> Optional[str]:
+    """
+    Extrae texto de un PDF con PyPDF2. Acepta los bytes del PDF (se leen en
+    memoria, sin archivos temporales), una ruta o un archivo binario.
+    Es síncrona: corre en el pipeline. Si se pasa `stats`, anota lo mismo que
+    `read_pdf_pages` más "page_offsets" (ver `join_pages`).
+    """
+    page_texts = read_pdf_pages(source, stats, hash_empty=hash_empty)
+    if page_texts is None:
+        return None
+    extracted_text, page_offsets = join_pages(page_texts)
+    if stats is not None:
+        stats["page_offsets"] = page_offsets
+
+    if not extracted_text.strip():
+        logger.warning("El PDF no contiene texto extraíble.")
+        return None
 
-        extracted_text = "\n".join(full_text)
+    logger.info("Texto extraído del PDF exitosamente.")
+    return extracted_text
 
-        if not extracted_text.strip():
-            logger.warning("El PDF no contiene texto extraíble.")
-            return None
 
-        logger.info("Texto extraído del PDF exitosamente.")
-        return extracted_text
+def read_pdf_pages(source: Union[bytes, str, Path, BinaryIO], stats: Optional[Dict[str, Any]] = None,
+                   first: int = 0, last: Optional[int] = None, hash_empty: bool = False) -> Optional[List[str]]:
+    """
+    Texto de cada página en [first, last) ("" si no tiene capa de texto), o None
+    si el PDF no se puede leer. `stats` y `hash_empty` como en `iter_pdf_pages`.
+    """
+    try:
+        return list(iter_pdf_pages(source, stats, first, last, hash_empty))
     except Exception as e:
         logger.error(f"Error al extraer texto del PDF: {e}")
         return None
 
 
+def iter_pdf_pages(source: Union[bytes, str, Path, BinaryIO], stats: Optional[Dict[str, Any]] = None,
+                   first: int = 0, last: Optional[int] = None, hash_empty: bool = False) -> Iterator[str]:
+    """
+    Texto de las páginas en [first, last), una a la vez: cada página se extrae
+    solo cuando se pide, así quien consume puede detenerse antes (p. ej. al
+    descartar un documento no médico). Con `stats` anota "pages" (total del
+    PDF) y, en "empty_pages", cada página sin capa de texto con su huella
+    (`utils.ocr.page_hash`, solo con `hash_empty`, es decir, con OCR; si no,
+    o si no se pudo calcular, None). Los errores de lectura se propagan al iterar.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    reader = PdfReader(source)
+    total = len(reader.pages)
+    if stats is not None:
+        stats["pages"] = total
+        stats["empty_pages"] = {}
+    for index in range(first, total if last is None else min(last, total)):
+        page = reader.pages[index]
+        text = page.extract_text() or ""
+        if not text.strip() and stats is not None:
+            stats["empty_pages"][index] = _empty_page_key(page, index) if hash_empty else None
+        yield text
+
+
+def _empty_page_key(page, index: int) -> Optional[str]:
+    # Una página con datos raros no debe impedir leer el resto del documento
+    try:
+        return page_hash(page)
+    except Exception as e:
+        logger.warning(f"No se pudo calcular la huella de la página {index + 1}: {e}")
+        return None
+
+
+def join_pages(page_texts: List[str]) -> Tuple[str, List[int]]:
+    """
+    Une el texto de las páginas en orden (una página sin texto no aporta
+    líneas) y retorna además la tabla de desplazamientos: `offsets[i]` es la
+    posición en el texto donde empieza la página i.
+    """
+    parts = []
+    offsets = []
+    position = 0
+    for text in page_texts:
+        if text and parts:
+            position += 1  # separador "\n"
+        offsets.append(position)
+        if text:
+            parts.append(text)
+            position += len(text)
+    return "\n".join(parts), offsets
+
+
 def extract_patient_data(text: str) -> Dict[str, Any]:
     """Extrae datos personales del texto del PDF."""
     try:
         patient_data = {}
         lines = text.split('\n')
 
-        # Debug: Mostrar todo el texto para identificar problemas
-        logger.debug("Texto completo a procesar:")
-        logger.debug(text)
+        # Volcado del texto completo solo por muestreo (LOG_TEXT_SAMPLE_RATE)
+        if sample_text_dump():
+            logger.debug("Texto completo a procesar ({} caracteres):\n{}", len(text), text)
 
         # Buscar RUT: Adaptar patrón según formato del país
         rut_pattern = r'\b(\d{7,8}-[\dkK])\b'
         rut_match = re.search(rut_pattern, text)
         if rut_match:
             patient_data['rut'] = rut_match.group(1)
-            logger.debug(f"RUT encontrado: {patient_data['rut']}")
+            logger.debug("RUT encontrado: {}", patient_data['rut'])
         else:
             logger.warning("No se encontró RUT en el texto.")
 
@@ -60,7 +136,7 @@ def extract_patient_data(text: str) -> Dict[str, Any]:
                     name = line.split(':', 1)[1].strip()
                     if name and not any(x in name.upper() for x in ['OBSERVACION', 'NO INDICADO']):
                         patient_data['nombre'] = TextNormalizer.normalize_name(name)
-                        logger.debug(f"Nombre encontrado: {patient_data['nombre']}")
+                        logger.debug("Nombre encontrado: {}", patient_data['nombre'])
                         found_name = True
                         break
         if not found_name:
@@ -71,7 +147,7 @@ def extract_patient_data(text: str) -> Dict[str, Any]:
         age_match = re.search(age_pattern, text, re.IGNORECASE)
         if age_match:
             patient_data['edad'] = age_match.group(1)
-            logger.debug(f"Edad encontrada: {patient_data['edad']}")
+            logger.debug("Edad encontrada: {}", patient_data['edad'])
         else:
             logger.warning("No se encontró la edad del paciente.")
 
@@ -82,7 +158,7 @@ def extract_patient_data(text: str) -> Dict[str, Any]:
             "campos_encontrados": list(k for k in patient_data.keys() if k != "metadata"),
         }
 
-        logger.debug(f"Datos extraídos finales: {patient_data}")
+        logger.debug("Datos extraídos finales: {}", patient_data)
         return patient_data
 
     except Exception as e:
@@ -115,6 +191,6 @@ def extract_exam_results(text: str, components: List[str]) -> Dict[str, Any]:
     if not results:
         logger.warning("No se encontraron resultados de exámenes en el texto.")
     else:
-        logger.info(f"Resultados extraídos: {results}")
+        logger.debug("Resultados extraídos: {}", results)
 
     return results
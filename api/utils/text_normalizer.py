@@ -249,7 +249,7 @@ class TextNormalizer:
 
             # Limpieza y normalización inicial
             text = age_text.upper().strip()
-            logger.debug(f"Procesando edad: {text}")
+            logger.debug("Procesando edad: {}", text)
 
             # Lista de patrones por prioridad
             patterns = [
@@ -279,7 +279,7 @@ class TextNormalizer:
                         break
 
             if best_match:
-                logger.debug(f"Patrón encontrado con confianza {best_confidence}")
+                logger.debug("Patrón encontrado con confianza {}", best_confidence)
                 
                 # Extraer valores, usar 0 si no existe el grupo
                 years = int(best_match.group(1)) if best_match.group(1) else 0
@@ -307,7 +307,7 @@ class TextNormalizer:
                 if years == 0 and months == 0 and days == 0:
                     logger.warning(f"Se encontró el patrón pero todos los valores son 0: {text}")
                 else:
-                    logger.debug(f"Edad extraída exitosamente: {result}")
+                    logger.debug("Edad extraída exitosamente: {}", result)
 
             else:
                 logger.warning(f"No se pudo extraer la edad del texto: {text}")
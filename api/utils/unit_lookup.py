@@ -0,0 +1,85 @@
+from typing import Any, Dict, Iterable, List, Optional
+from utils.pattern_matcher import LiteralMatcher
+
+
+def _normalize_key(value: str) -> str:
+    """Clave insensible a mayúsculas y espacios: 'mg / dl' -> 'MG/DL'."""
+    return "".join(value.upper().split())
+
+
+class UnitTrie:
+    """
+    Trie de unidades con claves normalizadas (sin espacios, en mayúsculas).
+
+    Recorre las palabras de la línea de izquierda a derecha y devuelve la
+    unidad canónica del primer tramo de palabras consecutivas que coincide.
+    Ante claves repetidas gana la primera unidad según el orden de COMMON_UNITS.
+    """
+
+    def __init__(self, units: Iterable[str]):
+        self.root: Dict[str, Any] = {}
+        for unit in units:
+            key = _normalize_key(unit)
+            if not key:
+                continue
+            node = self.root
+            for char in key:
+                node = node.setdefault(char, {})
+            node.setdefault("", unit)  # marca de fin con la unidad canónica
+
+    def state(self) -> Dict[str, Any]:
+        return {"root": self.root}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "UnitTrie":
+        trie = cls.__new__(cls)
+        trie.root = state["root"]
+        return trie
+
+    def find(self, text: str) -> Optional[str]:
+        # Mismas palabras que antes: los "/" se separan como palabra propia
+        words = [word.upper() for word in text.replace('/', ' / ').split()]
+        for start in range(len(words)):
+            node = self.root
+            for word in words[start:]:
+                for char in word:
+                    node = node.get(char)
+                    if node is None:
+                        break
+                if node is None:
+                    break
+                unit = node.get("")
+                if unit is not None:
+                    return unit
+        return None
+
+
+class FirstMatchLookup:
+    """
+    Busca, en una sola pasada, cuál de los literales aparece en el texto y
+    devuelve el primero según el orden de definición (como los bucles
+    `for ...: if literal in texto: return literal`).
+    """
+
+    def __init__(self, literals: Iterable[str]):
+        self.rank: Dict[str, int] = {}
+        for literal in literals:
+            self.rank.setdefault(literal, len(self.rank))
+        self.matcher = LiteralMatcher(self.rank, word_boundary=False, uppercase=False)
+
+    def state(self) -> Dict[str, Any]:
+        return {"rank": self.rank, "matcher": self.matcher.state()}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "FirstMatchLookup":
+        lookup = cls.__new__(cls)
+        lookup.rank = dict(state["rank"])
+        lookup.matcher = LiteralMatcher.from_state(state["matcher"])
+        return lookup
+
+    def find(self, text: str) -> Optional[str]:
+        found = self.matcher.scan(text)
+        if not found:
+            return None
+        return min(found, key=self.rank.__getitem__)
+
@@ -10,6 +10,8 @@ class Settings(BaseSettings):
     CONNECTION_TIMEOUT: int = 600
     RATE_LIMIT_PER_MIN: int = 60
     CHAT_WORKERS: int = 4
+    # Fracción de solicitudes (0-1) que registran el prompt completo a nivel DEBUG
+    LOG_PROMPT_SAMPLE_RATE: float = 0.0
 
     class Config:
         env_file = ".env"
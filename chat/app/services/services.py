@@ -1,5 +1,6 @@
 import httpx
 import json
+import random
 from loguru import logger
 import time
 from core.monitoring import ResourceMonitor
@@ -33,14 +34,11 @@ class OllamaService:
                 return "Has excedido el límite de solicitudes por minuto. Por favor, espera un momento."
 
             prompt = f"""Responde basándote en el siguiente contexto. Se breve y conciso: Contexto: {context} Pregunta: {question}"""
-            # Logging detallado
-            logger.info("=== INICIO PROMPT ===")
-            logger.info(f"Pregunta original: {question}")
-            logger.info("Contexto completo:")
-            logger.info(context if context else "Sin contexto")
-            logger.info("Prompt final:")
-            logger.info(prompt)
-            logger.info("=== FIN PROMPT ===")
+            logger.debug("Prompt: pregunta de {} caracteres, contexto de {} caracteres",
+                         len(question), len(context) if context else 0)
+            # El prompt completo solo por muestreo (LOG_PROMPT_SAMPLE_RATE)
+            if self.settings.LOG_PROMPT_SAMPLE_RATE > 0 and random.random() < self.settings.LOG_PROMPT_SAMPLE_RATE:
+                logger.debug("Prompt completo:\n{}", prompt)
 
             try:
                 response = await self.client.post(
@@ -88,7 +86,7 @@ class OllamaService:
         
         finally:
             duration = time.time() - start_time
-            logger.info(f"Tiempo de respuesta: {duration:.2f}s")
+            logger.info("Tiempo de respuesta: {:.2f}s", duration)
 
     async def cleanup(self):
         await self.client.aclose()